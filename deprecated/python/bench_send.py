@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the Python send path.
+
+Generates synthetic recall lists (statuses, timestamp formats, duplicates and
+malformed phones mixed like real Dentrix/Sheets exports), then times each piece in
+isolation and the whole script end to end against the local fake Twilio server.
+
+Usage:
+    python3 bench_send.py                                  # 1k,10k,100k,1m rows
+    python3 bench_send.py --sizes 1k,10k --save bench_baseline.json
+    python3 bench_send.py --sizes 1k,10k --compare bench_baseline.json --fail-on-regression
+
+Each benchmark reports the best of --repeat runs as seconds and rows/sec. --save
+writes the results as a baseline JSON; --compare prints the change against one and
+flags anything slower than --threshold percent. Generated CSVs are cached in
+--workdir so repeat runs compare like with like.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import twilio_send_script
+from fake_twilio_server import serve
+from send_pipeline import CsvStats, evaluate, normalize, normalize_e164, read_rows, render, write_plan
+from templates import render_message
+from timestamps import parse_ts
+
+try:
+    import numpy  # noqa: F401  (only to decide whether the columnar benchmark runs)
+    from eligibility import evaluate_columns, load_columns
+    from list_cache import ListCache, candidates_for
+except ImportError:  # pragma: no cover - optional dependency
+    evaluate_columns = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SEND_SCRIPT = os.path.join(HERE, "twilio_send_script.py")
+
+DEFAULT_SIZES = "1k,10k,100k,1m"
+DEFAULT_SEED = 20240601
+TS_COLUMNS = ("responded_at", "booked_at", "t1_sent_at", "t2_sent_at")
+
+HEADERS = [
+    "e164_phone", "list_tag", "FName", "LName", "do_not_text", "responded_at", "booked_at",
+    "t1_sent_at", "t2_sent_at", "sent_status", "status", "mode", "sent_at",
+]
+
+# (value, weight) mixes, roughly what the recall lists look like in practice.
+STATUS_MIX = [("", 30), ("new", 25), ("texted", 12), ("lvm", 8), ("calling", 5), ("booked", 8),
+              ("closed", 3), ("dnd", 2), ("wrong_number", 2), ("Booked", 2), ("unknown", 3)]
+LIST_TAG_MIX = [("past_due", 45), ("due_soon", 45), ("", 7), ("PAST_DUE", 3)]
+DNT_MIX = [("FALSE", 80), ("", 14), ("TRUE", 4), ("yes", 1), ("0", 1)]
+FIRST_NAMES = ["Ann", "Bo", "Carlos", "Dana", "Eve", "Farah", "Gus", "Hana", "  Ian ", ""]
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    mult = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if mult > 1 else text) * mult)
+
+
+def _pick(rng: random.Random, mix):
+    return rng.choices([v for v, _ in mix], weights=[w for _, w in mix])[0]
+
+
+def generate_csv(path: str, rows: int, seed: int = DEFAULT_SEED,
+                 now: Optional[datetime] = None) -> str:
+    """Writes a synthetic recall CSV with `rows` rows; deterministic for a given seed."""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    pool = max(1, int(rows * 0.97))  # ~3% of rows repeat an earlier phone
+
+    def ts(p_blank: float, max_hours: int = 4000) -> str:
+        if rng.random() < p_blank:
+            return ""
+        d = now - timedelta(minutes=rng.randint(0, max_hours * 60))
+        r = rng.random()
+        if r < 0.55:
+            return f"{d.month}/{d.day}/{d.year} {d:%H:%M:%S}"  # Sheets export
+        if r < 0.9:
+            return d.strftime("%Y-%m-%dT%H:%M:%SZ")
+        if r < 0.98:
+            return d.isoformat()
+        return "n/a"
+
+    def phone() -> str:
+        r = rng.random()
+        if r < 0.02:
+            return rng.choice(["", "555-0100", "12345", "TBD"])
+        n = rng.randrange(pool)
+        digits = f"{2000000000 + n * 7919 % 7999999999:010d}"
+        if r < 0.6:
+            return "+1" + digits
+        if r < 0.8:
+            return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+        return f"1{digits}"
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(HEADERS)
+        for _ in range(rows):
+            t1 = ts(0.6, 2000)
+            w.writerow([
+                phone(),
+                _pick(rng, LIST_TAG_MIX),
+                rng.choice(FIRST_NAMES),
+                "Patient",
+                _pick(rng, DNT_MIX),
+                ts(0.8),
+                ts(0.9),
+                t1,
+                ts(0.9, 1000) if t1 else "",
+                "sent" if rng.random() < 0.08 else "",
+                _pick(rng, STATUS_MIX),
+                "manual" if rng.random() < 0.15 else "",
+                "",
+            ])
+    return path
+
+
+def _best_of(repeat: int, fn: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _drain(it) -> None:
+    for _ in it:
+        pass
+
+
+def run_isolated(csv_path: str, rows: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Times each stage on data already in memory (except validate/plan, which include CSV I/O)."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        data = list(csv.DictReader(f))
+    phones = [r["e164_phone"] for r in data]
+    cells = [r[c] for r in data for c in TS_COLUMNS]
+    indexed = list(enumerate(data, start=1))
+    cands = list(normalize(indexed, "link"))
+    now = datetime.now(timezone.utc)
+    evaluated = list(evaluate(cands, "t1", False, now))
+    to_render = [c for c, reasons in evaluated if not reasons] or cands[:1]
+    quiet = io.StringIO()
+
+    def validate():
+        quiet.seek(0)
+        quiet.truncate()
+        with contextlib.redirect_stdout(quiet):
+            twilio_send_script.validate_csv(csv_path)
+
+    def renders():
+        for c in to_render:
+            render_message(mode=c.mode, list_tag=c.list_tag, first=c.fname, office_phone="301-656-7872",
+                           short_url="https://example.test/s?lt=x", touch="t1")
+
+    def plan():
+        stats = CsvStats()
+        stages = render(evaluate(normalize(read_rows(csv_path, stats), "link", stats.timestamps), "t1", False, now),
+                        "t1", "https://example.test/s", "301-656-7872")
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            write_plan(out, stages)
+
+    benches = {
+        "validate_csv": (rows, validate),
+        "normalize_e164": (len(phones), lambda: [normalize_e164(p) for p in phones]),
+        "parse_ts": (len(cells), lambda: [parse_ts(v) for v in cells]),
+        "normalize_rows": (rows, lambda: _drain(normalize(indexed, "link"))),
+        "eligibility_t1": (rows, lambda: _drain(evaluate(cands, "t1", False, now))),
+        "eligibility_t2": (rows, lambda: _drain(evaluate(cands, "t2", False, now))),
+        "render_message": (len(to_render), renders),
+        "plan_single_pass": (rows, plan),
+    }
+    if evaluate_columns is not None:
+        benches["eligibility_columnar_t1"] = (rows, lambda: evaluate_columns(load_columns(csv_path), "t1", False, now))
+        cache = ListCache(csv_path)
+        if cache.load() is None:
+            _drain(candidates_for(csv_path, CsvStats(), "link", cache))
+        benches["normalize_list_cache"] = (rows, lambda: _drain(candidates_for(csv_path, CsvStats(), "link", cache)))
+
+    results = {}
+    for name, (n, fn) in benches.items():
+        secs = _best_of(repeat, fn)
+        results[name] = {"items": n, "seconds": round(secs, 6), "per_sec": round(n / secs, 1) if secs else 0.0}
+    return results
+
+
+def run_end_to_end(csv_path: str, rows: int, workers: int, latency_ms: float) -> Dict[str, float]:
+    """Runs twilio_send_script.py as a subprocess against an in-process fake Twilio server."""
+    server = serve(port=0, latency_ms=latency_ms)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    env = dict(os.environ, TWILIO_ACCOUNT_SID="ACbench", TWILIO_AUTH_TOKEN="bench")
+    cmd = [sys.executable, SEND_SCRIPT, csv_path, "--force", "--no-ledger", "--workers", str(workers),
+           "--rate", "0", "--api-base", f"http://127.0.0.1:{server.server_address[1]}"]
+    try:
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        secs = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    if proc.returncode != 0:
+        raise RuntimeError(f"send script exited {proc.returncode}: {proc.stderr.strip()[-500:]}")
+    sent = len(server.state.messages)
+    return {"items": rows, "seconds": round(secs, 6), "per_sec": round(rows / secs, 1) if secs else 0.0,
+            "sent": sent, "sends_per_sec": round(sent / secs, 1) if secs else 0.0}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Prints per-benchmark change vs baseline; returns the names that regressed beyond threshold%."""
+    regressions = []
+    print(f"\n{'size':>6}  {'benchmark':<26} {'baseline/s':>14} {'now/s':>14} {'change':>8}")
+    for size, benches in current["results"].items():
+        for name, res in benches.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base or not base.get("per_sec"):
+                print(f"{size:>6}  {name:<26} {'-':>14} {res['per_sec']:>14,.0f} {'new':>8}")
+                continue
+            change = (res["per_sec"] - base["per_sec"]) / base["per_sec"] * 100.0
+            flag = ""
+            if change < -threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{size}/{name}")
+            print(f"{size:>6}  {name:<26} {base['per_sec']:>14,.0f} {res['per_sec']:>14,.0f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Python send path on synthetic recall lists.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated row counts (e.g. 1k,10k,100k,1m)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per isolated benchmark (best is kept)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "recallbridge-bench"),
+                        help="Where generated CSVs are cached")
+    parser.add_argument("--e2e-max-rows", type=int, default=100000,
+                        help="Skip the end-to-end run for lists larger than this (0 = never run it)")
+    parser.add_argument("--workers", type=int, default=8, help="--workers passed to the send script end to end")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake Twilio latency per request")
+    parser.add_argument("--save", metavar="PATH", help="Write results as a baseline JSON")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline JSON")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent slowdown counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if any benchmark regressed")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "workers": args.workers,
+            "latency_ms": args.latency_ms,
+        },
+        "results": {},
+    }
+    for label in [s.strip() for s in args.sizes.split(",") if s.strip()]:
+        rows = parse_size(label)
+        path = os.path.join(args.workdir, f"recall_{rows}_{args.seed}.csv")
+        if not os.path.exists(path):
+            print(f"Generating {rows:,} rows -> {path}")
+            generate_csv(path, rows, args.seed)
+        print(f"\n=== {label} ({rows:,} rows) ===")
+        results = run_isolated(path, rows, args.repeat)
+        if args.e2e_max_rows and rows <= args.e2e_max_rows:
+            results["end_to_end"] = run_end_to_end(path, rows, args.workers, args.latency_ms)
+        for name, res in results.items():
+            extra = f"  ({res['sent']} sent, {res['sends_per_sec']:,.0f} sends/s)" if "sent" in res else ""
+            print(f"  {name:<26} {res['seconds']:>10.4f}s {res['per_sec']:>14,.0f}/s{extra}")
+        report["results"][label] = results
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:g}%: "
+                  f"{', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("\nNo regressions beyond threshold.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# dedupe_store.py
+"""
+Time-windowed idempotency keys for webhook callbacks and sends.
+
+WebApp.js isDuplicateEvent_ re-reads 70_EventLog and scans the last 500 rows for the
+dedupe key on every callback: the cost grows with the log and a retry that arrives after
+500 newer events slips through. DedupeStore replaces that with:
+
+- a hash index (key -> bucket) for O(1) lookups;
+- an expiry ring of time buckets (`bucket_s` wide, oldest first); buckets older than
+  `window_s` are dropped together with their keys, so retention is measured in time;
+- an optional `max_keys` ceiling that drops the oldest buckets early, bounding memory
+  regardless of traffic (counted as `evicted` in stats());
+- an optional SQLite journal (`path`) so the window survives restarts; it is loaded once
+  on open and written through on add, like send_ledger.py.
+
+A key is remembered from the first time it is added; seeing it again does not extend it.
+
+    store = DedupeStore(window_s=72 * 3600)
+    if store.check_and_add("status:SM123:delivered:"):
+        return  # duplicate
+"""
+
+import sqlite3
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_WINDOW_S = 72 * 3600
+DEFAULT_BUCKET_S = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dedupe (
+    key     TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dedupe_seen_at ON dedupe (seen_at);
+"""
+
+
+class DedupeStore:
+    """Exact dedupe over a sliding time window. Use from one thread (or under the caller's lock)."""
+
+    def __init__(self, window_s: float = DEFAULT_WINDOW_S, bucket_s: float = DEFAULT_BUCKET_S,
+                 max_keys: Optional[int] = None, path: Optional[str] = None):
+        if window_s <= 0 or bucket_s <= 0:
+            raise ValueError("window_s and bucket_s must be positive")
+        self.window_s = float(window_s)
+        self.bucket_s = float(min(bucket_s, window_s))
+        self.max_keys = max_keys
+        self.path = path
+        self._index: Dict[str, int] = {}
+        self._ring: Deque[Tuple[int, List[str]]] = deque()
+        self.lookups = 0
+        self.hits = 0
+        self.expired = 0
+        self.evicted = 0
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            with self._db:
+                self._db.execute("DELETE FROM dedupe WHERE seen_at < ?", (time.time() - self.window_s,))
+            rows = self._db.execute("SELECT key, seen_at FROM dedupe ORDER BY seen_at")
+            self.load(rows, persist=False)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return self.seen(key)
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        """True when `key` was added within the window ending at `now`."""
+        now = time.time() if now is None else now
+        self._expire(now)
+        self.lookups += 1
+        if key in self._index:
+            self.hits += 1
+            return True
+        return False
+
+    def add(self, key: str, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        self._add(key, now, persist=True)
+
+    def check_and_add(self, key: str, now: Optional[float] = None) -> bool:
+        """Returns True for a duplicate; otherwise records `key` and returns False."""
+        now = time.time() if now is None else now
+        if self.seen(key, now):
+            return True
+        self._add(key, now, persist=True)
+        return False
+
+    def load(self, items: Iterable[Tuple[str, float]], persist: bool = True) -> int:
+        """Bulk-adds (key, seen_at) pairs, e.g. from an EventLog export; returns how many were kept."""
+        now = time.time()
+        kept = 0
+        for key, seen_at in sorted(items, key=lambda kv: kv[1]):
+            if key and seen_at >= now - self.window_s and key not in self._index:
+                self._add(key, seen_at, persist=persist)
+                kept += 1
+        self._expire(now)
+        return kept
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "keys": len(self._index),
+            "buckets": len(self._ring),
+            "window_s": self.window_s,
+            "bucket_s": self.bucket_s,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _add(self, key: str, seen_at: float, persist: bool) -> None:
+        if key in self._index:
+            return
+        bucket = int(seen_at // self.bucket_s)
+        if self._ring and bucket <= self._ring[-1][0]:
+            # Late or same-bucket arrival: join the newest bucket so the ring stays ordered.
+            bucket = self._ring[-1][0]
+            self._ring[-1][1].append(key)
+        else:
+            self._ring.append((bucket, [key]))
+        self._index[key] = bucket
+        if persist and self._db is not None:
+            with self._db:
+                self._db.execute("INSERT OR IGNORE INTO dedupe (key, seen_at) VALUES (?, ?)", (key, seen_at))
+        if self.max_keys is not None:
+            while len(self._index) > self.max_keys and len(self._ring) > 1:
+                self.evicted += self._drop_oldest()
+
+    def _expire(self, now: float) -> None:
+        cutoff = int((now - self.window_s) // self.bucket_s)
+        dropped = 0
+        while self._ring and self._ring[0][0] < cutoff:
+            dropped += self._drop_oldest()
+        if dropped:
+            self.expired += dropped
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM dedupe WHERE seen_at < ?", (cutoff * self.bucket_s,))
+
+    def _drop_oldest(self) -> int:
+        bucket, keys = self._ring.popleft()
+        for key in keys:
+            if self._index.get(key) == bucket:
+                del self._index[key]
+        return len(keys)
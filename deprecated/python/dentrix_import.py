@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Streaming Dentrix import: export (.out) -> keyed patient store -> recall send list.
+
+DentrixImport.js ImportDentrixFromRaw holds all of 20_Import_Raw and 30_Patients in
+memory, looks every patient column up with pHeader.indexOf() per field per row, and
+rewrites the whole sheet. This stage applies the same rules to the export file
+directly:
+
+  - DENTRIX_MAPPING (Schema.js) is resolved once into a column plan: one itemgetter
+    from export columns to 30_Patients positions. Mapped columns missing from the
+    export read as "" (and so clear the stored value, as in the JS).
+  - patient_key = sha256(practice_id + ":" + external_patient_id), hashed per chunk
+    from a pre-fed "practice_id:" digest; rows with no Chart are skipped.
+  - Rows are merged chunk by chunk into a SQLite patient store keyed by
+    (practice_id, patient_key): one SELECT and one executemany per chunk. Sticky
+    do_not_text / complaint_flag stay TRUE, patients missing from the export are
+    kept, and a Chart repeated in the export merges onto its earlier row.
+  - RefreshPatients' derived fields are filled in on the way (phone_e164 from the
+    first valid mobile/home/work/other phone, has_sms_contact, recall_status), and
+    again for every stored row as it is streamed out, so patients this export did
+    not touch are judged against --today too.
+
+Memory is bounded by --chunk rows. After the merge the store is streamed out as a
+twilio_send_script.py list containing the patients BuildQueue would mark eligible:
+a phone, no do_not_text/complaint, and recall_status DUE or OVERDUE. The list_tag is
+due_soon or past_due. Send-state columns (t1_sent_at, responded_at, ...) come from
+--previous when given.
+
+Usage:
+    python3 dentrix_import.py export.out --practice-id p1 --out recall_list.csv
+    python3 dentrix_import.py export.out --practice-id p1 --patients 30_Patients.csv   # seed the store
+    python3 dentrix_import.py export.out --practice-id p1 --previous last_list.csv --patients-out 30_Patients.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from patient_index import normalize_e164, normalize_phone
+from queue_engine import DEFAULT_WINDOW_DAYS, compute_recall_status, parse_due_date
+from sheet_schema import header_map, load_schema
+
+DEFAULT_CHUNK = 8192
+SQLITE_MAX_PARAMS = 900
+STICKY_FLAGS = ("do_not_text", "complaint_flag")
+PHONE_FIELDS = ("phone_mobile_raw", "phone_home_raw", "phone_work_raw", "phone_other_raw")
+LIST_TAGS = {"OVERDUE": "past_due", "DUE": "due_soon"}
+LIST_HEADERS = ["e164_phone", "list_tag", "FName", "LName", "do_not_text", "responded_at", "booked_at",
+                "t1_sent_at", "t2_sent_at", "sent_status", "status", "mode", "recall_due_date"]
+CARRY_FIELDS = ("responded_at", "booked_at", "t1_sent_at", "t2_sent_at", "sent_status", "status", "mode")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    seq         INTEGER PRIMARY KEY,
+    practice_id TEXT NOT NULL,
+    patient_key TEXT NOT NULL,
+    row         TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS patients_key ON patients (practice_id, patient_key);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def sheet_value(value) -> str:
+    """Cell text as a CSV export of the sheet would show it."""
+    if value is True:
+        return "TRUE"
+    if value is False:
+        return "FALSE"
+    return "" if value is None else str(value)
+
+
+class ColumnPlan:
+    """DENTRIX_MAPPING resolved against one export header, plus the 30_Patients positions used per row."""
+
+    def __init__(self, export_header: List[str], mapping: Dict[str, str], patient_headers: List[str]):
+        hmap = header_map(export_header)
+        pmap = header_map(patient_headers)
+        self.width = len(export_header)
+        pairs = [(hmap.get(src, self.width), pmap.get(dest)) for src, dest in mapping.items()]
+        # mapping dests that are not sheet columns are dropped, like setField's indexOf == -1
+        pairs = [(src, dest) for src, dest in pairs if dest is not None]
+        self.take = itemgetter(*[src for src, _ in pairs]) if len(pairs) > 1 else (lambda r, i=pairs[0][0]: (r[i],))
+        self.dest = [dest for _, dest in pairs]
+        self.missing = sorted(src for src in mapping if src not in hmap)
+        self.ext_pos = self.dest.index(pmap["external_patient_id"])
+        self.pmap = pmap
+        self.n_cols = len(patient_headers)
+
+    def record(self, row: List[str]) -> Tuple[str, ...]:
+        """Mapped values in plan order; short rows are padded, and the pad cell is the "" for missing columns."""
+        if len(row) <= self.width:
+            row = row + [""] * (self.width + 1 - len(row))
+        return self.take(row)
+
+
+class PatientStore:
+    """30_Patients rows keyed by (practice_id, patient_key), in sheet order (seq)."""
+
+    def __init__(self, path: str, practice_id: str, headers: List[str]):
+        self.path = path
+        self.practice_id = practice_id
+        self.headers = headers
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA cache_size=-8192")
+        self._db.executescript(SCHEMA)
+        stored = self._db.execute("SELECT value FROM meta WHERE key='headers'").fetchone()
+        self._remap = None
+        if stored and json.loads(stored[0]) != headers:
+            old = header_map(json.loads(stored[0]))
+            self._remap = [old.get(h) for h in headers]
+
+    def _decode(self, text: str) -> list:
+        row = json.loads(text)
+        if self._remap is not None:
+            row = [row[i] if i is not None and i < len(row) else "" for i in self._remap]
+        return row
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, list]:
+        keys = list(keys)
+        out: Dict[str, list] = {}
+        for i in range(0, len(keys), SQLITE_MAX_PARAMS):
+            batch = keys[i:i + SQLITE_MAX_PARAMS]
+            marks = ",".join("?" * len(batch))
+            for pk, text in self._db.execute(
+                f"SELECT patient_key, row FROM patients WHERE practice_id=? AND patient_key IN ({marks})",
+                [self.practice_id] + batch,
+            ):
+                out[pk] = self._decode(text)
+        return out
+
+    def put_many(self, rows: Dict[str, list], existing: Iterable[str]) -> None:
+        """Upserts rows; keys not in `existing` are appended after every stored row, like new sheet rows."""
+        existing = set(existing)
+        updates, inserts = [], []
+        for pk, row in rows.items():
+            text = json.dumps(row, separators=(",", ":"))
+            if pk in existing:
+                updates.append((text, self.practice_id, pk))
+            else:
+                inserts.append((self.practice_id, pk, text))
+        with self._db:
+            self._db.executemany("UPDATE patients SET row=? WHERE practice_id=? AND patient_key=?", updates)
+            self._db.executemany("INSERT INTO patients (practice_id, patient_key, row) VALUES (?, ?, ?)", inserts)
+
+    def replace_all(self, rows: Iterator[Tuple[str, list]], chunk: int = DEFAULT_CHUNK) -> int:
+        """Drops this practice's rows and loads `rows` (patient_key, row) in order."""
+        with self._db:
+            self._db.execute("DELETE FROM patients WHERE practice_id=?", (self.practice_id,))
+        n = 0
+        while True:
+            batch = dict(islice(rows, chunk))
+            if not batch:
+                return n
+            self.put_many(batch, ())
+            n += len(batch)
+
+    def rows(self) -> Iterator[list]:
+        for (text,) in self._db.execute("SELECT row FROM patients WHERE practice_id=? ORDER BY seq",
+                                        (self.practice_id,)):
+            yield self._decode(text)
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM patients WHERE practice_id=?", (self.practice_id,)).fetchone()[0]
+
+    def set_meta(self, **values) -> None:
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                 [(k, json.dumps(v)) for k, v in values.items()])
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def default_store_path(out_path: str, practice_id: str) -> str:
+    """One store per practice, next to the list it feeds."""
+    return os.path.join(os.path.dirname(os.path.abspath(out_path)), f"{practice_id}.patients.sqlite")
+
+
+def read_export(path: str, delimiter: str = "\t", encoding: str = "utf-8") -> Iterator[List[str]]:
+    """Header first, then data rows; blank lines and empty rows are dropped (DriveImport + row.join("") check)."""
+    with open(path, newline="", encoding=encoding, errors="replace") as f:
+        for row in csv.reader(f, delimiter=delimiter, quotechar='"'):
+            if any(row):
+                yield row
+
+
+def patient_keys(practice_id: str, external_ids: Iterable[str]) -> List[str]:
+    """sha256Hex(practiceId + ":" + id) for a batch of ids, continuing one pre-fed prefix digest."""
+    prefix = hashlib.sha256(f"{practice_id}:".encode("utf-8"))
+    out = []
+    for ext in external_ids:
+        h = prefix.copy()
+        h.update(ext.encode("utf-8"))
+        out.append(h.hexdigest())
+    return out
+
+
+class DentrixImporter:
+    """One ImportDentrixFromRaw + RefreshPatients pass into a PatientStore."""
+
+    def __init__(self, store: PatientStore, practice_id: str, mapping: Dict[str, str], today: Optional[date] = None,
+                 window_days: int = DEFAULT_WINDOW_DAYS, source_file_id: str = "", archived_file_id: str = "",
+                 imported_at: str = ""):
+        self.store = store
+        self.practice_id = practice_id
+        self.mapping = mapping
+        self.today = today or date.today()
+        self.window_days = window_days
+        self.source_file_id = source_file_id
+        self.archived_file_id = archived_file_id
+        self.imported_at = imported_at
+        self.plan: Optional[ColumnPlan] = None
+        self._status: Dict[str, str] = {}  # recall_due_date text -> recall_status (dates repeat a lot)
+        p = header_map(store.headers)
+        self._phones = [p[f] for f in PHONE_FIELDS if f in p]
+        self._derived = (p.get("phone_e164"), p.get("has_sms_contact"), p.get("recall_status"),
+                         p.get("recall_due_date"))
+        self.counts = dict.fromkeys(["parsed", "no_external_id", "inserts", "updates"], 0)
+
+    def run(self, rows: Iterator[List[str]], chunk: int = DEFAULT_CHUNK) -> None:
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Import_Raw empty")
+        self.plan = plan = ColumnPlan(header, self.mapping, self.store.headers)
+        p = plan.pmap
+        self._sticky = [p[f] for f in STICKY_FLAGS if f in p]
+        while True:
+            batch = list(islice(rows, chunk))
+            if not batch:
+                break
+            self._merge(batch)
+
+    def _merge(self, batch: List[List[str]]) -> None:
+        plan, counts = self.plan, self.counts
+        records = []
+        for row in batch:
+            counts["parsed"] += 1
+            rec = plan.record(row)
+            if rec[plan.ext_pos]:
+                records.append(rec)
+            else:
+                counts["no_external_id"] += 1
+        keys = patient_keys(self.practice_id, [rec[plan.ext_pos] for rec in records])
+        existing = self.store.get_many(set(keys))
+        merged: Dict[str, list] = {}
+        p = plan.pmap
+        now = now_iso()
+        meta = [(p.get("source_last_imported_at"), self.imported_at or now),
+                (p.get("source_last_import_source_file_id"), self.source_file_id),
+                (p.get("source_last_import_archived_file_id"), self.archived_file_id),
+                (p.get("updated_at"), now)]
+        sticky = self._sticky
+        pk_pos = p.get("patient_key")
+        for pk, rec in zip(keys, records):
+            prev = merged.get(pk) or existing.get(pk)
+            out = list(prev) if prev is not None else [""] * plan.n_cols
+            if pk_pos is not None:
+                out[pk_pos] = pk
+            for dest, value in zip(plan.dest, rec):
+                out[dest] = value
+            for idx, value in meta:
+                if idx is not None:
+                    out[idx] = value
+            if prev is not None:
+                for idx in sticky:
+                    if str(prev[idx]).upper() == "TRUE":
+                        out[idx] = True
+            self.refresh(out)
+            counts["updates" if prev is not None else "inserts"] += 1
+            merged[pk] = out
+        self.store.put_many(merged, existing)
+
+    def refresh(self, row: list) -> None:
+        """RefreshPatients for one row (in place): phone_e164, has_sms_contact and recall_status as of `today`."""
+        phone_pos, sms_pos, status_pos, due_pos = self._derived
+        phone = ""
+        for i in self._phones:
+            if row[i]:
+                phone = normalize_phone(row[i]) or ""
+                if phone:
+                    break
+        if phone_pos is not None:
+            row[phone_pos] = phone
+        if sms_pos is not None:
+            row[sms_pos] = bool(phone)
+        if status_pos is not None and due_pos is not None:
+            raw = row[due_pos]
+            status = self._status.get(raw)
+            if status is None:
+                status = compute_recall_status(parse_due_date(raw), self.today, self.window_days)[0]
+                self._status[raw] = status
+            row[status_pos] = status
+
+
+def read_previous(path: str) -> Dict[str, Dict[str, str]]:
+    """e164 -> send-state columns from an earlier send list."""
+    out: Dict[str, Dict[str, str]] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            e164 = normalize_e164(row.get("e164_phone"))
+            if e164 and e164 not in out:
+                out[e164] = {k: row.get(k) or "" for k in CARRY_FIELDS}
+    return out
+
+
+def recall_list(store: PatientStore, previous: Dict[str, Dict[str, str]], counts: Dict[str, int],
+                refresh: Callable[[list], None]) -> Iterator[List[str]]:
+    """Send-list rows for the patients BuildQueue would mark eligible, in store order.
+
+    Every stored row goes through `refresh` first: rows this export did not touch (seeded,
+    or merged on an earlier run) still carry the phone and recall_status of their last import.
+    """
+    p = header_map(store.headers)
+    for row in store.rows():
+        refresh(row)
+        phone = row[p["phone_e164"]]
+        status = row[p["recall_status"]]
+        if not phone:
+            reason = "NO_PHONE"
+        elif str(row[p["do_not_text"]]).upper() == "TRUE":
+            reason = "DO_NOT_TEXT"
+        elif "complaint_flag" in p and str(row[p["complaint_flag"]]).upper() == "TRUE":
+            reason = "COMPLAINT"
+        elif status not in LIST_TAGS:
+            reason = "NOT_IN_WINDOW"
+        else:
+            reason = ""
+        if reason:
+            counts[reason] = counts.get(reason, 0) + 1
+            continue
+        tag = LIST_TAGS[status]
+        counts[tag] = counts.get(tag, 0) + 1
+        carry = previous.get(phone, {})
+        yield ([phone, tag, row[p["first_name"]], row[p["last_name"]], "FALSE"] + [carry.get(k, "") for k in CARRY_FIELDS]
+               + [sheet_value(row[p["recall_due_date"]])])
+
+
+@contextmanager
+def atomic_csv(path: str):
+    """csv.writer over a temp file that replaces `path` only if the block completes."""
+    fd, tmp = tempfile.mkstemp(prefix=".dentrix_import.", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            yield csv.writer(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a Dentrix export into the patient store and a send list.")
+    parser.add_argument("export", help="Dentrix export (.out)")
+    parser.add_argument("--practice-id", required=True)
+    parser.add_argument("--out", help="Send list CSV for twilio_send_script.py (default: <export>.recall.csv)")
+    parser.add_argument("--store", help="Patient store (default: <out dir>/<practice_id>.patients.sqlite)")
+    parser.add_argument("--patients", help="Seed the store from a 30_Patients export first (replaces its rows)")
+    parser.add_argument("--patients-out", help="Also write the store as a 30_Patients CSV")
+    parser.add_argument("--previous", help="Earlier send list; its t1/t2_sent_at, status, ... carry over by phone")
+    parser.add_argument("--delimiter", default="TAB", help="import_delimiter (TAB or a character)")
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS, help="recall_due_window_days")
+    parser.add_argument("--today", type=date.fromisoformat, help="Run date (YYYY-MM-DD); default today")
+    parser.add_argument("--source-file-id", default="", help="last_import_source_file_id")
+    parser.add_argument("--archived-file-id", default="", help="last_import_archived_file_id")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Rows per merge batch")
+    args = parser.parse_args()
+
+    schema = load_schema()
+    out = args.out or os.path.splitext(os.path.abspath(args.export))[0] + ".recall.csv"
+    delimiter = "\t" if args.delimiter.upper() == "TAB" else args.delimiter
+    store = PatientStore(args.store or default_store_path(out, args.practice_id), args.practice_id,
+                         schema.headers["30_Patients"])
+    start = time.perf_counter()
+    try:
+        if args.patients:
+            pk_header = "patient_key"
+            with open(args.patients, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                hmap = header_map(next(reader, []))
+                if pk_header not in hmap:
+                    print(f"ERROR: {args.patients} has no patient_key column.")
+                    sys.exit(1)
+                cols = [hmap.get(h) for h in store.headers]
+                seeded = store.replace_all(
+                    (r[hmap[pk_header]], [r[i] if i is not None and i < len(r) else "" for i in cols])
+                    for r in reader if r and r[hmap[pk_header]])
+            print(f"Seeded {seeded} patients from {args.patients}")
+
+        importer = DentrixImporter(store, args.practice_id, schema.dentrix_mapping, args.today, args.window_days,
+                                   args.source_file_id, args.archived_file_id)
+        importer.run(read_export(args.export, delimiter, args.encoding), args.chunk)
+        store.set_meta(headers=store.headers, last_imported_at=now_iso(), last_import_file=os.path.abspath(args.export))
+        imported = time.perf_counter() - start
+
+        previous = read_previous(args.previous) if args.previous else {}
+        listed: Dict[str, int] = {}
+        with atomic_csv(out) as w:
+            w.writerow(LIST_HEADERS)
+            w.writerows(recall_list(store, previous, listed, importer.refresh))
+        print(f"Send list written to {out}")
+        if args.patients_out:
+            with atomic_csv(args.patients_out) as w:
+                w.writerow(store.headers)
+                for row in store.rows():
+                    importer.refresh(row)
+                    w.writerow([sheet_value(v) for v in row])
+            print(f"Patients written to {args.patients_out}")
+        total = len(store)
+    finally:
+        store.close()
+
+    print("\n=== IMPORT SUMMARY ===")
+    for key, value in importer.counts.items():
+        print(f"  {key}: {value}")
+    print(f"  rows: {total}")
+    if importer.plan.missing:
+        print(f"  export columns missing (imported as blank): {', '.join(importer.plan.missing)}")
+    print(f"  import: {imported:.2f}s, total: {time.perf_counter() - start:.2f}s")
+    print("Send list:")
+    for key in ("past_due", "due_soon", "NO_PHONE", "DO_NOT_TEXT", "COMPLAINT", "NOT_IN_WINDOW"):
+        if listed.get(key):
+            print(f"  {key}: {listed[key]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Batch (columnar) T1/T2 eligibility for recall lists.
+
+Loads the CSV once into NumPy columns, parses each distinct timestamp/phone string
+once into int64 epoch-microsecond / code arrays, and evaluates every skip rule for
+the whole file as array expressions. Each row gets a bitmask of reason codes; the
+histogram of those masks reproduces `skipped_reasons` from twilio_send_script.py
+(same keys, same counts) without a per-row Python rules loop.
+
+Usage:
+    python3 eligibility.py /path/to/file.csv --touch t1
+    python3 eligibility.py /path/to/file.csv --touch t2 --force
+
+NumPy is optional for the rest of the send path but required here.
+"""
+
+import argparse
+import csv
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+from send_pipeline import (
+    MIN_T2_HOURS,
+    RECENT_REPLY_DAYS,
+    STRONG_STATUSES,
+    TRUEY,
+    WORKABLE_STATUSES,
+    normalize_e164,
+)
+from timestamps import parse_ts
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NO_TS = -(2 ** 63)  # sentinel for blank/unparseable timestamps
+US_PER_HOUR = 3600 * 1000000
+US_PER_DAY = 24 * US_PER_HOUR
+
+COLUMNS = (
+    "FName",
+    "LName",
+    "e164_phone",
+    "do_not_text",
+    "list_tag",
+    "sent_status",
+    "mode",
+    "status",
+    "responded_at",
+    "booked_at",
+    "t1_sent_at",
+    "sent_at",
+    "t2_sent_at",
+)
+
+# Reason bits, declared in the order twilio_send_script.py appends reasons.
+R_DO_NOT_TEXT = 1 << 0
+R_BAD_PHONE = 1 << 1
+R_STRONG_STATUS = 1 << 2
+R_BOOKED = 1 << 3
+R_RECENT_REPLY = 1 << 4
+R_ALREADY_SENT = 1 << 5
+R_DUPLICATE = 1 << 6
+R_NOT_WORKABLE = 1 << 7
+R_T1_SET = 1 << 8
+R_NO_T1 = 1 << 9
+R_T2_SET = 1 << 10
+R_T1_TOO_RECENT = 1 << 11
+R_REPLY_AFTER_T1 = 1 << 12
+
+REASON_TEXT = [
+    (R_DO_NOT_TEXT, "do_not_text is true"),
+    (R_BAD_PHONE, "missing/invalid e164_phone"),
+    (R_STRONG_STATUS, "status={status} (strong)"),
+    (R_BOOKED, "booked_at present"),
+    (R_RECENT_REPLY, f"responded within {RECENT_REPLY_DAYS}d"),
+    (R_ALREADY_SENT, "sent_status=sent (use --force to override)"),
+    (R_DUPLICATE, "duplicate phone already processed in this file"),
+    (R_NOT_WORKABLE, "status not workable ({status})"),
+    (R_T1_SET, "t1_sent_at already set"),
+    (R_NO_T1, "no t1_sent_at (not eligible for T2)"),
+    (R_T2_SET, "t2_sent_at already set"),
+    (R_T1_TOO_RECENT, f"T1 age < {MIN_T2_HOURS}h"),
+    (R_REPLY_AFTER_T1, "reply received after T1"),
+]
+STATUS_BITS = R_STRONG_STATUS | R_NOT_WORKABLE
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("numpy is required for batch eligibility (pip install numpy)")
+
+
+def load_columns(csv_path: str, columns: Sequence[str] = COLUMNS) -> Dict[str, "np.ndarray"]:
+    """Reads the CSV once into one string array per column (absent columns become blanks)."""
+    _require_numpy()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        pos = {name: i for i, name in enumerate(header)}
+        raw: Dict[str, List[str]] = {name: [] for name in columns}
+        picks = [(raw[name], pos.get(name)) for name in columns]
+        for rec in reader:
+            n = len(rec)
+            for values, i in picks:
+                values.append(rec[i] if i is not None and i < n else "")
+    return {name: np.array(values, dtype=object) for name, values in raw.items()}
+
+
+def _map_unique(values: "np.ndarray", fn, dtype) -> "np.ndarray":
+    """Applies fn once per distinct value and broadcasts the results back to every row."""
+    uniq, inverse = np.unique(values, return_inverse=True)
+    mapped = np.array([fn(v) for v in uniq], dtype=dtype)
+    return mapped[inverse] if len(values) else np.array([], dtype=dtype)
+
+
+def _epoch_us(val: str) -> int:
+    dt = parse_ts(val)
+    if dt is None:
+        return NO_TS
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def epoch_column(values: "np.ndarray") -> "np.ndarray":
+    """Timestamp strings -> int64 epoch microseconds (NO_TS when blank/unparseable)."""
+    return _map_unique(values, _epoch_us, np.int64)
+
+
+def _clean(values: "np.ndarray", lower: bool = False) -> "np.ndarray":
+    fn = (lambda v: v.strip().lower()) if lower else (lambda v: v.strip())
+    return _map_unique(values, fn, object)
+
+
+class BatchResult:
+    """Per-row reason masks plus the lowercase status needed to spell status-bearing reasons."""
+
+    def __init__(self, masks: "np.ndarray", status: "np.ndarray"):
+        self.masks = masks
+        self.status = status
+
+    @property
+    def eligible(self) -> "np.ndarray":
+        return self.masks == 0
+
+    def reasons(self, row: int) -> List[str]:
+        return decode(int(self.masks[row]), self.status[row])
+
+    def histogram(self) -> Dict[str, int]:
+        """Equivalent of `skipped_reasons`: {"reason;reason": count} for every skipped row."""
+        skipped = self.masks != 0
+        masks = self.masks[skipped]
+        if not len(masks):
+            return {}
+        status_codes, status_inverse = np.unique(self.status[skipped], return_inverse=True)
+        # Status only participates in the key when a status-bearing reason fired.
+        status_part = np.where(masks & STATUS_BITS, status_inverse + 1, 0)
+        combined = masks.astype(np.int64) * (len(status_codes) + 1) + status_part
+        keys, counts = np.unique(combined, return_counts=True)
+        out: Dict[str, int] = {}
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            mask, part = divmod(key, len(status_codes) + 1)
+            status = status_codes[part - 1] if part else ""
+            out[";".join(decode(mask, status))] = count
+        return out
+
+
+def decode(mask: int, status: str) -> List[str]:
+    return [text.format(status=status) for bit, text in REASON_TEXT if mask & bit]
+
+
+def evaluate_columns(cols: Dict[str, "np.ndarray"], touch: str = "t1", force: bool = False,
+                     now: Optional[datetime] = None) -> BatchResult:
+    """Computes every skip rule over whole columns; mirrors send_pipeline.skip_reasons row for row."""
+    _require_numpy()
+    now = now or datetime.now(timezone.utc)
+    now_us = (now - EPOCH) // timedelta(microseconds=1)
+    n = len(cols["e164_phone"])
+
+    e164 = _map_unique(cols["e164_phone"], lambda v: normalize_e164(v.strip()), object)
+    status = _clean(cols["status"], lower=True)
+    responded = epoch_column(cols["responded_at"])
+    booked = epoch_column(cols["booked_at"])
+    t1_raw = np.where(cols["t1_sent_at"] != "", cols["t1_sent_at"], cols["sent_at"])
+    t1 = epoch_column(t1_raw)
+    t2 = epoch_column(cols["t2_sent_at"])
+    has_phone = e164 != ""
+    has_resp = responded != NO_TS
+    has_t1 = t1 != NO_TS
+
+    masks = np.zeros(n, dtype=np.int64)
+
+    def flag(cond, bit):
+        masks[cond] |= bit
+
+    flag(np.isin(_clean(cols["do_not_text"], lower=True), list(TRUEY)), R_DO_NOT_TEXT)
+    flag(~has_phone, R_BAD_PHONE)
+    flag(np.isin(status, list(STRONG_STATUSES)), R_STRONG_STATUS)
+    flag(booked != NO_TS, R_BOOKED)
+    flag(has_resp & (now_us - responded < RECENT_REPLY_DAYS * US_PER_DAY), R_RECENT_REPLY)
+    if not force:
+        flag(_clean(cols["sent_status"], lower=True) == "sent", R_ALREADY_SENT)
+
+    if touch == "t1":
+        flag(~np.isin(status, list(WORKABLE_STATUSES)), R_NOT_WORKABLE)
+        flag(has_t1, R_T1_SET)
+    else:  # T2
+        flag(~has_t1, R_NO_T1)
+        flag(t2 != NO_TS, R_T2_SET)
+        flag(has_t1 & (now_us - t1 < MIN_T2_HOURS * US_PER_HOUR), R_T1_TOO_RECENT)
+        flag(has_resp & has_t1 & (responded > t1), R_REPLY_AFTER_T1)
+
+    # A phone is a duplicate once an earlier row with the same number was eligible.
+    if n:
+        phone_codes, phone_idx = np.unique(e164, return_inverse=True)
+        rows = np.arange(n)
+        first_ok = np.full(len(phone_codes), n, dtype=np.int64)
+        np.minimum.at(first_ok, phone_idx, np.where((masks == 0) & has_phone, rows, n))
+        flag(has_phone & (rows > first_ok[phone_idx]), R_DUPLICATE)
+
+    return BatchResult(masks, status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch T1/T2 eligibility histogram for a recall CSV.")
+    parser.add_argument("csv_path", help="Path to CSV file")
+    parser.add_argument("--touch", choices=["t1", "t2"], default="t1")
+    parser.add_argument("--force", action="store_true", help="Ignore sent_status=sent, as the send script does")
+    args = parser.parse_args()
+
+    try:
+        result = evaluate_columns(load_columns(args.csv_path), args.touch, args.force)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    print(f"Rows: {len(result.masks)}")
+    print(f"Eligible: {int(result.eligible.sum())}")
+    hist = result.histogram()
+    if hist:
+        print("Skipped by reason:")
+        for reason, count in sorted(hist.items(), key=lambda x: x[1], reverse=True):
+            print(f"  {count} -> {reason}")
+
+
+if __name__ == "__main__":
+    main()
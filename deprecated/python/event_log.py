@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Write-behind 70_EventLog with group commit, for the send script and the webhook stand-in.
+
+EventLog.js logEvent re-reads the header and does one appendRow per event. EventLog
+builds the same EVENT_HEADERS row (event_id uuid, occurred_at ISO-8601,
+payload_json), but only appends it to an in-memory buffer. A background writer
+commits the buffer as one batch when `flush_events` rows are waiting or
+`flush_interval` seconds have passed since the last commit, whichever comes first:
+
+    JSONL  (*.jsonl, default): one JSON object per row; one write() + fsync per batch
+    SQLite (*.sqlite / *.db):  table `events` (EVENT_HEADERS columns); one transaction
+                               per batch, synchronous=FULL (one WAL fsync per commit)
+
+So the cost of a durable log is one fsync per batch rather than one write per event.
+flush() blocks until every event logged so far is on disk, and close() flushes and
+stops the writer. If the buffer reaches `max_pending` rows (the disk is stalling),
+log() waits for the writer instead of growing without bound. A sink error is raised
+from the next log()/flush()/close() call.
+
+read_events() streams a log back from either format. dedupe_items() yields the
+(dedupe_key, epoch) pairs that DedupeStore.load() takes.
+
+    with EventLog("events.jsonl") as log:
+        log.log("RUN_SEND_PASS", run_id, "p1", "Twilio sent", {...}, {"twilio_message_sid": sid})
+
+Usage:
+    python3 event_log.py events.jsonl                  # counts by event_type
+    python3 event_log.py events.sqlite --tail 20       # last 20 events
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from sheet_schema import load_schema
+from transport import LatencyHistogram
+
+DEFAULT_FLUSH_EVENTS = 512
+DEFAULT_FLUSH_INTERVAL_S = 1.0
+DEFAULT_MAX_PENDING = 65536
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+_second = [-1, ""]
+
+
+def now_iso() -> str:
+    """new Date().toISOString(); the date/time part is formatted once per second."""
+    now = time.time()
+    sec = int(now)
+    if sec != _second[0]:
+        _second[:] = [sec, datetime.fromtimestamp(sec, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")]
+    return f"{_second[1]}.{int((now - sec) * 1000):03d}Z"
+
+
+def new_event_id() -> str:
+    """Random (version 4) UUID string, like Utilities.getUuid(), without building a uuid.UUID."""
+    h = os.urandom(16).hex()
+    return f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{'89ab'[int(h[16], 16) & 3]}{h[17:20]}-{h[20:]}"
+
+
+def event_headers() -> List[str]:
+    return load_schema().headers["70_EventLog"]
+
+
+def _epoch(value) -> float:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class JsonlSink:
+    """Append-only JSON lines; each batch is one write() followed by one fsync."""
+
+    def __init__(self, path: str, headers: List[str], durable: bool = True):
+        self.path = path
+        self.durable = durable
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, object]]) -> int:
+        self._f.write("".join(json.dumps(r, separators=(",", ":"), ensure_ascii=False) + "\n" for r in rows))
+        self._f.flush()
+        if self.durable:
+            os.fsync(self._f.fileno())
+            return 1
+        return 0
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class SqliteSink:
+    """`events` table with the EVENT_HEADERS columns; one transaction per batch."""
+
+    def __init__(self, path: str, headers: List[str], durable: bool = True):
+        self.path = path
+        self.headers = headers
+        self.durable = durable
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+        cols = ", ".join(f'"{h}" TEXT' for h in headers)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY, {cols})")
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_dedupe ON events (dedupe_key)")
+        names = ", ".join(f'"{h}"' for h in headers)
+        self._insert = f"INSERT INTO events ({names}) VALUES ({', '.join('?' for _ in headers)})"
+
+    def write(self, rows: List[Dict[str, object]]) -> int:
+        with self._db:
+            self._db.executemany(self._insert, [[_cell(r.get(h)) for h in self.headers] for r in rows])
+        return 1 if self.durable else 0
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _cell(value) -> Optional[str]:
+    if value is None or value == "":
+        return ""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def open_sink(path: str, headers: List[str], durable: bool = True):
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        return SqliteSink(path, headers, durable)
+    return JsonlSink(path, headers, durable)
+
+
+class EventLog:
+    """Buffered 70_EventLog writer; log() is safe to call from any thread."""
+
+    def __init__(self, path: str, flush_events: int = DEFAULT_FLUSH_EVENTS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL_S, durable: bool = True,
+                 max_pending: int = DEFAULT_MAX_PENDING, headers: Optional[List[str]] = None):
+        self.path = path
+        self.headers = headers or event_headers()
+        self.flush_events = max(1, flush_events)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.flush_events, max_pending)
+        self._sink = open_sink(path, self.headers, durable)
+        self._buf: List[Dict[str, object]] = []
+        self._cond = threading.Condition()
+        self._logged = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self.batches = 0
+        self.fsyncs = 0
+        self.max_batch = 0
+        self.stalls = 0
+        self.commit_latency = LatencyHistogram()
+        self._writer = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._writer.start()
+
+    def __enter__(self) -> "EventLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def log(self, event_type: str, run_id: str, practice_id: str = "", notes: str = "",
+            payload: Optional[Dict] = None, extras: Optional[Dict] = None) -> Dict[str, object]:
+        """logEvent(): builds the row, queues it and returns it."""
+        row: Dict[str, object] = dict.fromkeys(self.headers, "")
+        row["event_id"] = new_event_id()
+        row["event_type"] = event_type
+        row["run_id"] = run_id
+        row["occurred_at"] = now_iso()
+        if "practice_id" in row:
+            row["practice_id"] = practice_id or ""
+        if "notes" in row:
+            row["notes"] = notes or ""
+        if "payload_json" in row:
+            row["payload_json"] = json.dumps(payload, separators=(",", ":"), ensure_ascii=False) if payload else ""
+        for key, value in (extras or {}).items():
+            if key in row:
+                row[key] = value
+        self.append(row)
+        return row
+
+    def append(self, row: Dict[str, object]) -> None:
+        """Queues an already-built row (keys are EVENT_HEADERS names)."""
+        with self._cond:
+            self._raise_error()
+            if self._closed:
+                raise ValueError("event log is closed")
+            if len(self._buf) >= self.max_pending:
+                self.stalls += 1
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: len(self._buf) < self.max_pending or self._error is not None)
+                self._raise_error()
+            self._buf.append(row)
+            self._logged += 1
+            if len(self._buf) >= self.flush_events:
+                self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Blocks until every event logged so far is committed."""
+        with self._cond:
+            target = self._logged
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._written >= target or self._error is not None)
+            self._raise_error()
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._sink.close()
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"event log {self.path}: {self._error}") from self._error
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._flush_requested or len(self._buf) >= self.flush_events):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._buf = self._buf, []
+                self._flush_requested = False
+                closing = self._closed
+            if batch:
+                start = time.perf_counter()
+                try:
+                    fsyncs = self._sink.write(batch)
+                except Exception as e:  # surfaced to the next caller; drop nothing silently
+                    with self._cond:
+                        self._error = e
+                        self._cond.notify_all()
+                    return
+                self.commit_latency.observe((time.perf_counter() - start) * 1000.0)
+                with self._cond:
+                    self._written += len(batch)
+                    self.batches += 1
+                    self.fsyncs += fsyncs
+                    self.max_batch = max(self.max_batch, len(batch))
+                    self._cond.notify_all()
+            if closing:
+                return
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {"path": self.path, "events": self._written, "pending": len(self._buf), "batches": self.batches,
+                    "fsyncs": self.fsyncs, "max_batch": self.max_batch, "stalls": self.stalls,
+                    "commit_ms": self.commit_latency.snapshot()}
+
+
+def read_events(path: str) -> Iterator[Dict[str, object]]:
+    """Every event in an EventLog file, oldest first (a torn last JSONL line is ignored)."""
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            cur = db.execute("SELECT * FROM events ORDER BY seq")
+            names = [d[0] for d in cur.description][1:]
+            for row in cur:
+                yield dict(zip(names, row[1:]))
+        finally:
+            db.close()
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def dedupe_items(path: str, practice_id: Optional[str] = None) -> Iterator[Tuple[str, float]]:
+    """(dedupe_key, occurred_at epoch) for DedupeStore.load(), optionally for one practice."""
+    for event in read_events(path):
+        key = event.get("dedupe_key")
+        if key and (practice_id is None or event.get("practice_id") == practice_id):
+            yield key, _epoch(event.get("occurred_at"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize an event log written by EventLog.")
+    parser.add_argument("path", help="events.jsonl or events.sqlite")
+    parser.add_argument("--tail", type=int, default=0, help="Also print the last N events")
+    args = parser.parse_args()
+
+    counts: Counter = Counter()
+    runs = set()
+    tail: Deque[Dict[str, object]] = deque(maxlen=max(args.tail, 0) or None)
+    first = last = ""
+    for event in read_events(args.path):
+        counts[event.get("event_type", "")] += 1
+        runs.add(event.get("run_id"))
+        first = first or str(event.get("occurred_at", ""))
+        last = str(event.get("occurred_at", ""))
+        if args.tail:
+            tail.append(event)
+    print(f"{sum(counts.values())} events in {len(runs)} runs, {first or '-'} .. {last or '-'}")
+    for event_type, n in counts.most_common():
+        print(f"  {n:8d}  {event_type}")
+    for event in tail:
+        print(json.dumps(event, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Twilio Messages API for exercising the send path offline.
+
+Usage:
+    python3 fake_twilio_server.py --port 8765 --latency-ms 300
+    python3 twilio_send_script.py list.csv --api-base http://127.0.0.1:8765 --workers 8 --rate 20
+
+Accepts POST /2010-04-01/Accounts/<sid>/Messages.json (form-encoded) and answers with a
+queued message JSON. GET on the same path lists messages newest first in pages
+(PageSize, PageToken, To and DateSent / DateSent> / DateSent< filters, next_page_uri), and
+GET .../Messages/<sid>.json fetches one. A message reads as "queued" with no date_sent
+for --queue-ms (a backed-up Messaging Service: DateSent listings do not return it), then
+as "sent" until --settle-ms more has passed, then as "delivered" (or "undelivered" with error 30003 for --undelivered-rate of
+them), so reconcile.py has statuses to pull. Nothing leaves the machine; stdlib only.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+MAX_PAGE_SIZE = 1000
+
+
+def _rfc2822(ts):
+    return time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime(ts))
+
+
+class FakeTwilioState:
+    def __init__(self, latency_ms=0.0, fail_rate=0.0, throttle_rate=0.0, server_error_rate=0.0, retry_after=1,
+                 settle_ms=0.0, undelivered_rate=0.0, queue_ms=0.0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.throttle_rate = throttle_rate
+        self.server_error_rate = server_error_rate
+        self.retry_after = retry_after
+        self.settle_ms = settle_ms
+        self.undelivered_rate = undelivered_rate
+        self.queue_ms = queue_ms
+        self.messages = {}
+        self.order = []  # sids in creation order
+        self.lock = threading.Lock()
+
+    def record(self, form):
+        sid = "SM" + uuid.uuid4().hex
+        now = time.time()
+        msg = {
+            "sid": sid,
+            "status": "queued",
+            "to": form.get("To", ""),
+            "body": form.get("Body", ""),
+            "messaging_service_sid": form.get("MessagingServiceSid", ""),
+            "date_created": _rfc2822(now),
+            "error_code": None,
+            "_created": now,
+            "_final": "undelivered" if self.undelivered_rate and random.random() < self.undelivered_rate else "delivered",
+        }
+        with self.lock:
+            self.messages[sid] = msg
+            self.order.append(sid)
+        return {k: v for k, v in msg.items() if not k.startswith("_")}
+
+    def view(self, msg, now):
+        """The message as Twilio would report it `now`."""
+        out = {k: v for k, v in msg.items() if not k.startswith("_")}
+        sent_at = msg["_created"] + self.queue_ms / 1000.0
+        if now < sent_at:
+            out["status"] = "queued"
+            out["date_sent"] = None
+            out["date_updated"] = msg["date_created"]
+            return out
+        out["date_sent"] = _rfc2822(sent_at)
+        if (now - sent_at) * 1000.0 < self.settle_ms:
+            out["status"] = "sent"
+            out["date_updated"] = out["date_sent"]
+        else:
+            out["status"] = msg["_final"]
+            out["date_updated"] = _rfc2822(sent_at + self.settle_ms / 1000.0)
+            if out["status"] == "undelivered":
+                out["error_code"] = 30003
+        return out
+
+    def page(self, path, query):
+        """One page of the newest-first listing, filtered on To and the UTC date part of date_sent."""
+        size = min(int(query.get("PageSize", 50)), MAX_PAGE_SIZE)
+        start = int(query.get("PageToken", 0) or 0)
+        day_eq, day_ge, day_le = query.get("DateSent"), query.get("DateSent>"), query.get("DateSent<")
+        to = query.get("To")
+        now = time.time()
+        with self.lock:
+            sids = list(reversed(self.order))
+        out = []
+        pos = start
+        while pos < len(sids) and len(out) < size:
+            msg = self.messages[sids[pos]]
+            pos += 1
+            if to and msg["to"] != to:
+                continue
+            if day_eq or day_ge or day_le:
+                sent_at = msg["_created"] + self.queue_ms / 1000.0
+                if now < sent_at:
+                    continue  # not sent yet: no date_sent to match
+                day = datetime.fromtimestamp(sent_at, timezone.utc).date().isoformat()
+                if (day_eq and day != day_eq) or (day_ge and day < day_ge) or (day_le and day > day_le):
+                    continue
+            out.append(self.view(msg, now))
+        next_uri = None
+        if pos < len(sids):
+            next_uri = path + "?" + urlencode({**query, "Page": int(query.get("Page", 0) or 0) + 1, "PageToken": pos})
+        return {"messages": out, "page": int(query.get("Page", 0) or 0), "page_size": size,
+                "next_page_uri": next_uri, "uri": path + "?" + urlencode(query)}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes; without TCP_NODELAY every keep-alive
+        # response stalls ~40ms on Nagle + delayed ACK, which would swamp any benchmark.
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _reply(self, code, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+            if state.latency_ms:
+                time.sleep(state.latency_ms / 1000.0)
+            if state.throttle_rate and random.random() < state.throttle_rate:
+                self._reply(429, {"code": 20429, "message": "Too Many Requests"},
+                            {"Retry-After": str(state.retry_after)})
+                return
+            if parts.path.endswith("/Messages.json"):
+                self._reply(200, state.page(parts.path, query))
+                return
+            head, _, name = parts.path.rpartition("/")
+            if head.endswith("/Messages") and name.endswith(".json"):
+                msg = state.messages.get(name[:-5])
+                if msg is None:
+                    self._reply(404, {"code": 20404, "message": f"The requested resource {parts.path} was not found"})
+                else:
+                    self._reply(200, state.view(msg, time.time()))
+                return
+            self._reply(404, {"code": 20404, "message": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length).decode("utf-8") if length else ""
+            if not self.path.endswith("/Messages.json"):
+                self._reply(404, {"code": 20404, "message": "not found"})
+                return
+            if state.latency_ms:
+                time.sleep(state.latency_ms / 1000.0)
+            if state.throttle_rate and random.random() < state.throttle_rate:
+                self._reply(429, {"code": 20429, "message": "Too Many Requests"},
+                            {"Retry-After": str(state.retry_after)})
+                return
+            if state.server_error_rate and random.random() < state.server_error_rate:
+                self._reply(503, {"code": 20503, "message": "Service Unavailable"})
+                return
+            form = {k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()}
+            if not form.get("To") or not form.get("Body"):
+                self._reply(400, {"code": 21604, "message": "A 'To' phone number and 'Body' are required."})
+                return
+            if state.fail_rate and random.random() < state.fail_rate:
+                self._reply(400, {"code": 21211, "message": f"The 'To' number {form['To']} is not valid."})
+                return
+            self._reply(201, state.record(form))
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8765, latency_ms=0.0, fail_rate=0.0, throttle_rate=0.0, server_error_rate=0.0,
+          retry_after=1, settle_ms=0.0, undelivered_rate=0.0, queue_ms=0.0):
+    """Builds (but does not start) a fake server; call serve_forever() or run it in a thread."""
+    state = FakeTwilioState(latency_ms=latency_ms, fail_rate=fail_rate, throttle_rate=throttle_rate,
+                            server_error_rate=server_error_rate, retry_after=retry_after, settle_ms=settle_ms,
+                            undelivered_rate=undelivered_rate, queue_ms=queue_ms)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Twilio Messages API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial delay per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of sends answered with a 400")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with 429 + Retry-After")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--queue-ms", type=float, default=0.0,
+                        help="Time a message stays 'queued' with no date_sent (backed-up Messaging Service)")
+    parser.add_argument("--settle-ms", type=float, default=0.0, help="Time a message reads as 'sent' before its final status")
+    parser.add_argument("--undelivered-rate", type=float, default=0.0,
+                        help="Fraction of messages that end 'undelivered' (30003) instead of 'delivered'")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency_ms, args.fail_rate, args.throttle_rate,
+                   args.server_error_rate, args.retry_after, args.settle_ms, args.undelivered_rate, args.queue_ms)
+    print(f"Fake Twilio listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Messages accepted: {len(server.state.messages)}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
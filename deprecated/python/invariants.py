@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""
+computeStatsFromSheets + AssertInvariants (Invariants.js) over sheet exports.
+
+Invariants.js reads 20_Import_Raw, 30_Patients, 50_Queue and 60_Touches with one full
+getValues() each and walks them again for every dry-run pass. Here each table is one
+streaming pass that reduces every row to a small contribution tuple (the normalizeBool /
+trim / upper-case results the stats depend on) and counts those tuples:
+
+    30_Patients  (has patient_key, has external_patient_id, has phone_e164, has_sms_contact,
+                  do_not_text, complaint_flag, has recall_due_date, recall_status UNKNOWN)
+    50_Queue     (eligible, ineligible_reason or "(blank)")
+    60_Touches   (SEND_STATUS,)
+    20_Import_Raw non-blank rows
+
+The dry_run_harness_v1 stats object is derived from those few distinct tuples, so it is
+identical to the Apps Script one (same keys, same rules) whatever the table sizes.
+
+With --state the per-key contribution (patient_key, or touch_id for 60_Touches) is kept in
+SQLite next to the counts. A later pass can then apply a queue_engine.py change file
+(insert / update row / update set / delete ops) instead of re-reading the tables: each
+changed key swaps its old tuple for the new one, so the cost is proportional to the diff.
+Rows without a key (blank patient_key, raw rows) count in the totals but cannot be diffed.
+
+30_Patients can also be read straight from a dentrix_import.py patient store (*.sqlite).
+
+Usage:
+    python3 invariants.py --config 10_Config.csv --raw 20_Import_Raw.csv --patients 30_Patients.csv \\
+        --queue 50_Queue.csv --touches 60_Touches.csv --state p1.stats.sqlite --json-out stats.json
+    python3 invariants.py --patients p1.patients.sqlite --practice-id p1 --queue 50_Queue.csv ...
+    python3 invariants.py --state p1.stats.sqlite --changes changes.jsonl   # incremental
+    python3 invariants.py ... --event-log events.jsonl   # RUN_SUMMARY + RUN_INVARIANTS_PASS/FAIL rows
+
+Exits 1 when an invariant fails (AssertInvariants throws).
+"""
+
+import argparse
+import csv
+import json
+import math
+import sqlite3
+import sys
+import uuid
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from event_log import EventLog, now_iso
+from sheet_schema import header_map, load_schema
+
+SCHEMA_VERSION = "dry_run_harness_v1"
+RAW, PATIENTS, QUEUE, TOUCHES = "20_Import_Raw", "30_Patients", "50_Queue", "60_Touches"
+BATCH_SIZE = 5000
+
+# contribution fields per table; the key column (if any) comes first
+PATIENT_FIELDS = ("patient_key", "external_patient_id", "phone_e164", "has_sms_contact", "do_not_text",
+                  "complaint_flag", "recall_due_date", "recall_status")
+QUEUE_FIELDS = ("patient_key", "eligible", "ineligible_reason")
+TOUCH_FIELDS = ("touch_id", "send_status")
+# header-line keys of a change file that name each sheet's row layout (all written by queue_engine.py)
+CHANGE_HEADERS = {PATIENTS: "patient_headers", QUEUE: "queue_headers", TOUCHES: "touch_headers"}
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contributions (
+    sheet   TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    contrib TEXT NOT NULL,
+    PRIMARY KEY (sheet, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counts (
+    sheet   TEXT NOT NULL,
+    contrib TEXT NOT NULL,
+    n       INTEGER NOT NULL,
+    PRIMARY KEY (sheet, contrib)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+"""
+
+
+_BOOLS: Dict[str, bool] = {}
+
+
+def normalize_bool(v) -> bool:
+    """normalizeBool(): true/1/"1" exactly, or "true"/"yes"/"y"/"t" (any case, trimmed)."""
+    if v is True or v is False:
+        return v
+    if v == 1 or v == 0:
+        return v == 1
+    if not isinstance(v, str):
+        v = "" if v is None else str(v)
+    b = _BOOLS.get(v)
+    if b is None:
+        # " 1 " is false in JS: only the exact string "1" is checked before trimming
+        b = _BOOLS[v] = v == "1" or v.strip().lower() in ("true", "yes", "y", "t")
+    return b
+
+
+def _blank(v) -> bool:
+    """!(v || "") in a sheet row: empty, absent, false or 0."""
+    return v is None or v == "" or v is False or v == 0
+
+
+def _text(v) -> str:
+    return "" if _blank(v) else str(v)
+
+
+def patient_contrib(values) -> tuple:
+    pk, ext, phone, sms, dnt, complaint, due, status = values
+    return (not _blank(pk), not _blank(ext), not _blank(phone), normalize_bool(sms), normalize_bool(dnt),
+            normalize_bool(complaint), not _blank(due), _text(status).upper() == "UNKNOWN")
+
+
+def queue_contrib(values) -> tuple:
+    _, eligible, reason = values
+    return normalize_bool(eligible), _text(reason).strip() or "(blank)"
+
+
+def touch_contrib(values) -> tuple:
+    return (_text(values[1]).upper(),)
+
+
+CONTRIB = {PATIENTS: (PATIENT_FIELDS, patient_contrib), QUEUE: (QUEUE_FIELDS, queue_contrib),
+           TOUCHES: (TOUCH_FIELDS, touch_contrib)}
+
+
+def _cell(c) -> bool:
+    """A cell that is not blank: String(c || "").trim() !== ""."""
+    return not _blank(c) and bool(str(c).strip())
+
+
+def _getter(hmap: Dict[str, int], fields: Iterable[str]):
+    """Row -> tuple of the named cells; missing columns and short rows read as ""."""
+    idx = [hmap.get(f) for f in fields]
+    if None in idx:
+        return lambda row: tuple(row[i] if i is not None and i < len(row) else "" for i in idx)
+    take = itemgetter(*idx)
+    need = max(idx) + 1
+
+    def get(row):
+        return take(row) if len(row) >= need else take(list(row) + [""] * (need - len(row)))
+    return get
+
+
+class StatsEngine:
+    """Counters of contribution tuples per table, optionally mirrored per key in a state file."""
+
+    def __init__(self, config: Optional[Dict[str, object]] = None, state: Optional[str] = None):
+        self.config = dict(config or {})
+        self.counts: Dict[str, Counter] = {PATIENTS: Counter(), QUEUE: Counter(), TOUCHES: Counter()}
+        self.raw_rows = 0
+        self.applied = Counter()
+        self._db = None
+        if state:
+            self._db = sqlite3.connect(state)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(STATE_SCHEMA)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+
+    def __enter__(self) -> "StatsEngine":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -- full passes ---------------------------------------------------
+
+    def scan_raw(self, rows: Iterable[List[object]]) -> None:
+        """Non-blank 20_Import_Raw data rows (header already consumed)."""
+        self.raw_rows = sum(1 for r in rows if any(_cell(c) for c in r))
+
+    def scan(self, sheet: str, header: List[str], rows: Iterable[List[object]]) -> None:
+        """One pass over a 30_Patients / 50_Queue / 60_Touches table (data rows only)."""
+        fields, contrib = CONTRIB[sheet]
+        get = _getter(header_map(header), fields)
+        width = len(header)
+        counts = self.counts[sheet] = Counter()
+        keyed: List[Tuple[str, str]] = []
+        encoded: Dict[tuple, str] = {}
+        db = self._db
+        if db is not None:
+            # keys arrive in sheet order (hashes: random); stage them unindexed and insert
+            # them sorted in one transaction so the B-tree is built append-only
+            db.execute("CREATE TEMP TABLE IF NOT EXISTS staging (key TEXT, contrib TEXT)")
+            db.execute("DELETE FROM staging")
+        for row in rows:
+            values = get(row)
+            key = values[0]
+            if _blank(key):
+                # A patient row without a key still counts (missing_patient_key) unless the
+                # row is blank; queue rows and touches without a key are skipped.
+                if sheet == PATIENTS and any(_cell(c) for c in row[:width]):
+                    counts[contrib(values)] += 1
+                continue
+            c = contrib(values)
+            counts[c] += 1
+            if db is not None:
+                text = encoded.get(c)
+                if text is None:
+                    text = encoded[c] = json.dumps(c)
+                keyed.append((str(key), text))
+                if len(keyed) >= BATCH_SIZE:
+                    db.executemany("INSERT INTO staging VALUES (?, ?)", keyed)
+                    keyed = []
+        if db is not None:
+            with db:
+                db.executemany("INSERT INTO staging VALUES (?, ?)", keyed)
+                db.execute("DELETE FROM contributions WHERE sheet=?", (sheet,))
+                # a repeated key keeps its last row, as a later apply() would see it
+                db.execute("INSERT OR REPLACE INTO contributions SELECT ?, key, contrib FROM staging "
+                           "ORDER BY key, rowid", (sheet,))
+                db.execute("DELETE FROM staging")
+
+    # -- incremental ---------------------------------------------------
+
+    def load(self) -> None:
+        """Counters and raw/config values saved by an earlier save()."""
+        if self._db is None:
+            raise ValueError("incremental updates need --state")
+        for sheet in self.counts:
+            self.counts[sheet] = Counter({tuple(json.loads(c)): n for c, n in self._db.execute(
+                "SELECT contrib, n FROM counts WHERE sheet=?", (sheet,))})
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if "raw_rows" not in meta:
+            raise ValueError("state file has no full pass yet; run once with the table exports")
+        self.raw_rows = json.loads(meta["raw_rows"])
+        saved = json.loads(meta.get("config", "{}"))
+        self.config = {**saved, **self.config}
+
+    def save(self) -> None:
+        if self._db is None:
+            return
+        with self._db:
+            self._db.execute("DELETE FROM counts")
+            self._db.executemany("INSERT INTO counts VALUES (?, ?, ?)",
+                                 [(sheet, json.dumps(c), n) for sheet, counter in self.counts.items()
+                                  for c, n in counter.items() if n])
+            self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                 [("raw_rows", json.dumps(self.raw_rows)), ("config", json.dumps(self.config))])
+
+    def apply(self, header: Dict[str, object], ops: Iterable[Dict[str, object]]) -> None:
+        """Applies queue_engine change ops (any of the three keyed sheets) in batches."""
+        schema_headers = load_schema().headers
+        getters = {}
+        for sheet, (fields, _) in CONTRIB.items():
+            names = header.get(CHANGE_HEADERS[sheet]) or schema_headers[sheet]
+            getters[sheet] = _getter(header_map(names), fields)
+        batch: List[Dict[str, object]] = []
+        for op in ops:
+            if op.get("sheet") not in CONTRIB:
+                self.applied["ignored"] += 1
+                continue
+            batch.append(op)
+            if len(batch) >= BATCH_SIZE:
+                self._apply_batch(batch, getters)
+                batch = []
+        self._apply_batch(batch, getters)
+
+    def _apply_batch(self, ops: List[Dict[str, object]], getters) -> None:
+        if not ops:
+            return
+        db = self._db
+        current: Dict[Tuple[str, str], Optional[tuple]] = {}
+        for sheet in {op["sheet"] for op in ops}:
+            keys = list({str(op["key"]) for op in ops if op["sheet"] == sheet})
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                for key, c in db.execute(
+                        f"SELECT key, contrib FROM contributions WHERE sheet=? AND key IN ({','.join('?' * len(chunk))})",
+                        [sheet, *chunk]):
+                    current[(sheet, key)] = tuple(json.loads(c))
+        for op in ops:
+            sheet, key = op["sheet"], str(op["key"])
+            fields, contrib = CONTRIB[sheet]
+            old = current.get((sheet, key))
+            kind = op.get("op")
+            if kind == "delete":
+                new = None
+            elif "row" in op:
+                values = getters[sheet](op["row"])
+                new = contrib(values) if not _blank(values[0]) else None
+            elif old is not None:
+                new = self._set(sheet, old, op.get("set") or {})
+            else:
+                self.applied["unknown_key"] += 1
+                continue
+            if old is not None:
+                self.counts[sheet][old] -= 1
+            if new is not None:
+                self.counts[sheet][new] += 1
+            current[(sheet, key)] = new
+            self.applied[f"{sheet}.{kind}"] += 1
+        with db:
+            db.executemany("DELETE FROM contributions WHERE sheet=? AND key=?",
+                           [k for k, c in current.items() if c is None])
+            db.executemany("INSERT OR REPLACE INTO contributions VALUES (?, ?, ?)",
+                           [(s, k, json.dumps(c)) for (s, k), c in current.items() if c is not None])
+
+    @staticmethod
+    def _set(sheet: str, old: tuple, changes: Dict[str, object]) -> tuple:
+        """New contribution after an update that only sets some columns."""
+        if sheet == TOUCHES:
+            return touch_contrib(("", changes["send_status"])) if "send_status" in changes else old
+        if sheet == QUEUE:
+            eligible = normalize_bool(changes["eligible"]) if "eligible" in changes else old[0]
+            reason = queue_contrib(("", "", changes["ineligible_reason"]))[1] if "ineligible_reason" in changes \
+                else old[1]
+            return eligible, reason
+        new = list(old)
+        for i, f in enumerate(PATIENT_FIELDS):
+            if f in changes and f != "patient_key":
+                new[i] = patient_contrib(tuple(changes.get(g, "") for g in PATIENT_FIELDS))[i]
+        return tuple(new)
+
+    # -- results -------------------------------------------------------
+
+    def stats(self) -> Dict[str, object]:
+        """The dry_run_harness_v1 object computeStatsFromSheets returns."""
+        cfg = self.config
+        s: Dict[str, object] = {
+            "schema_version": SCHEMA_VERSION,
+            "practice_id": _text(cfg.get("practice_id")),
+            "raw_rows": self.raw_rows,
+            "patients_total": 0,
+            "patients_with_phone_e164": 0,
+            "patients_has_sms_contact_true": 0,
+            "patients_do_not_text_true": 0,
+            "patients_complaint_flag_true": 0,
+            "recall_due_date_parse_fail_count": 0,
+            "missing_patient_key_count": 0,
+            "missing_external_patient_id_count": 0,
+            "queue_total": 0,
+            "queue_eligible": 0,
+            "queue_ineligible": 0,
+            "queue_ineligible_by_reason": {},
+            "touches_total": 0,
+            "touches_ready": 0,
+            "touches_skipped": 0,
+            "touches_would_send": 0,
+            "touches_by_status": {},
+            "import_source_file_id": cfg.get("last_import_source_file_id") or None,
+            "import_archived_file_id": cfg.get("last_import_archived_file_id") or None,
+            "import_timestamp": cfg.get("last_imported_at") or None,
+            "computed_at": now_iso(),
+        }
+        for (pk, ext, phone, sms, dnt, complaint, due, unknown), n in self.counts[PATIENTS].items():
+            s["missing_patient_key_count"] += 0 if pk else n
+            s["missing_external_patient_id_count"] += 0 if ext else n
+            s["patients_total"] += n if pk else 0
+            s["patients_with_phone_e164"] += n if phone else 0
+            s["patients_has_sms_contact_true"] += n if sms else 0
+            s["patients_do_not_text_true"] += n if dnt else 0
+            s["patients_complaint_flag_true"] += n if complaint else 0
+            s["recall_due_date_parse_fail_count"] += n if due and unknown else 0
+        reasons = s["queue_ineligible_by_reason"]
+        for (eligible, reason), n in self.counts[QUEUE].items():
+            if not n:
+                continue
+            s["queue_total"] += n
+            if eligible:
+                s["queue_eligible"] += n
+            else:
+                s["queue_ineligible"] += n
+                reasons[reason] = reasons.get(reason, 0) + n
+        by_status = s["touches_by_status"]
+        for (status,), n in self.counts[TOUCHES].items():
+            if not n:
+                continue
+            s["touches_total"] += n
+            by_status[status] = by_status.get(status, 0) + n
+        s["touches_ready"] = by_status.get("READY", 0)
+        s["touches_skipped"] = by_status.get("SKIPPED", 0)
+        s["touches_would_send"] = by_status.get("WOULD_SEND", 0)
+        return s
+
+
+def _float(v, default: float) -> float:
+    """parseFloat(v || default): leading number, else NaN."""
+    if _blank(v):
+        return default
+    text = str(v).strip()
+    for end in range(len(text), 0, -1):
+        try:
+            return float(text[:end])
+        except ValueError:
+            continue
+    return math.nan
+
+
+def assert_invariants(stats: Dict[str, object], config: Dict[str, object]) -> List[Dict[str, object]]:
+    """AssertInvariants' checks; returns the failures (empty list means pass)."""
+    min_sms_rate = _float(config.get("invariant_min_sms_contact_rate"), 0.30)
+    max_invalid_recall_rate = _float(config.get("invariant_max_invalid_recall_date_rate"), 0.10)
+    allow_zero_eligible = normalize_bool(config.get("invariant_allow_zero_eligible") or False)
+    queue_mode = _text(config.get("invariant_queue_mode") or "ALL_PATIENTS").upper()
+    active_campaign = _text(config.get("active_campaign_id"))
+    failures: List[Dict[str, object]] = []
+
+    def fail(code, message, details=None):
+        failures.append({"code": code, "message": message, "details": details or {}})
+
+    s = stats
+    if s["patients_total"] <= 0:
+        fail("I1", "patients_total must be > 0", {"patients_total": s["patients_total"]})
+    if queue_mode == "ALL_PATIENTS":
+        if s["queue_total"] <= 0:
+            fail("I2", "queue_total must be > 0", {"queue_total": s["queue_total"]})
+        if s["queue_total"] != s["patients_total"]:
+            fail("I3", "queue_total must equal patients_total",
+                 {"queue_total": s["queue_total"], "patients_total": s["patients_total"]})
+    elif queue_mode == "ELIGIBLE_ONLY":
+        if s["queue_total"] < s["queue_eligible"]:
+            fail("I3", "queue_total must be >= queue_eligible for ELIGIBLE_ONLY",
+                 {"queue_total": s["queue_total"], "queue_eligible": s["queue_eligible"]})
+    if not allow_zero_eligible and s["queue_eligible"] <= 0:
+        fail("I4", "queue_eligible must be > 0", {"queue_eligible": s["queue_eligible"]})
+    sms_rate = s["patients_has_sms_contact_true"] / s["patients_total"] if s["patients_total"] > 0 else 0
+    if sms_rate < min_sms_rate:
+        fail("I5", "sms_contact_rate below threshold", {"sms_rate": sms_rate, "min_sms_rate": min_sms_rate})
+    invalid_rate = s["recall_due_date_parse_fail_count"] / s["patients_total"] if s["patients_total"] > 0 else 0
+    if invalid_rate > max_invalid_recall_rate:
+        fail("I6", "invalid recall date rate above threshold",
+             {"invalid_rate": invalid_rate, "max_invalid_rate": max_invalid_recall_rate})
+    if s["missing_patient_key_count"] > 0:
+        fail("I7a", "missing patient_key rows", {"missing_patient_key_count": s["missing_patient_key_count"]})
+    if s["missing_external_patient_id_count"] > 0:
+        fail("I7b", "missing external_patient_id rows",
+             {"missing_external_patient_id_count": s["missing_external_patient_id_count"]})
+    if active_campaign and s["queue_eligible"] > 0 and s["touches_ready"] != s["queue_eligible"]:
+        fail("I8", "touches_ready must equal queue_eligible for active campaign",
+             {"touches_ready": s["touches_ready"], "queue_eligible": s["queue_eligible"], "campaign": active_campaign})
+    return failures
+
+
+# ---------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------
+
+def read_config(path: str) -> Dict[str, str]:
+    """getConfig(): a key,value 10_Config export; duplicate keys are an error."""
+    out: Dict[str, str] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if header[:2] != ["key", "value"]:
+            raise ValueError("Config header must be key,value")
+        for row in reader:
+            if row and row[0]:
+                if row[0] in out:
+                    raise ValueError(f"Duplicate config key: {row[0]}")
+                out[row[0]] = row[1] if len(row) > 1 else ""
+    return out
+
+
+def read_table(path: str, practice_id: str = "") -> Tuple[List[str], Iterator[List[object]]]:
+    """(header, data rows) from a CSV export, or from a dentrix_import.py patient store."""
+    if path.lower().endswith((".sqlite", ".sqlite3", ".db")):
+        from dentrix_import import PatientStore
+
+        if not practice_id:
+            raise ValueError(f"{path}: a patient store needs --practice-id (or practice_id in --config)")
+        store = PatientStore(path, practice_id, load_schema().headers[PATIENTS])
+
+        def _rows():
+            try:
+                yield from store.rows()
+            finally:
+                store.close()
+        return store.headers, _rows()
+    f = open(path, newline="", encoding="utf-8")
+    reader = csv.reader(f)
+    header = next(reader, [])
+
+    def _rows():
+        with f:
+            yield from reader
+    return header, _rows()
+
+
+def read_changes(path: str) -> Tuple[Dict[str, object], Iterator[Dict[str, object]]]:
+    """(header, ops) from a queue_engine.py change file."""
+    f = open(path, encoding="utf-8")
+    header = json.loads(f.readline() or "{}")
+
+    def _ops():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return header, _ops()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dry-run harness stats and invariants over sheet exports.")
+    parser.add_argument("--config", help="10_Config CSV export (key,value)")
+    parser.add_argument("--practice-id", default="", help="Overrides practice_id from --config")
+    parser.add_argument("--raw", help="20_Import_Raw CSV export")
+    parser.add_argument("--patients", help="30_Patients CSV export, or a dentrix_import.py patient store")
+    parser.add_argument("--queue", help="50_Queue CSV export")
+    parser.add_argument("--touches", help="60_Touches CSV export")
+    parser.add_argument("--state", help="Keep per-key contributions here so --changes can update the stats later")
+    parser.add_argument("--changes", nargs="*", default=[], help="queue_engine.py change files to apply to --state")
+    parser.add_argument("--json-out", metavar="PATH", help="Write {stats, failures} as JSON")
+    parser.add_argument("--event-log", metavar="PATH", help="Append RUN_SUMMARY and RUN_INVARIANTS_* events here")
+    parser.add_argument("--no-assert", action="store_true", help="Compute stats only")
+    args = parser.parse_args()
+
+    tables = {RAW: args.raw, PATIENTS: args.patients, QUEUE: args.queue, TOUCHES: args.touches}
+    if args.changes and any(tables.values()):
+        parser.error("--changes updates --state; do not pass table exports with it")
+    if not args.changes and not all(tables.values()):
+        missing = ", ".join(f"--{flag}" for flag, path in zip(("raw", "patients", "queue", "touches"),
+                                                               tables.values()) if not path)
+        parser.error(f"a full pass needs every table export (missing {missing}); or use --state with --changes")
+    if args.changes and not args.state:
+        parser.error("--changes needs --state")
+
+    config = read_config(args.config) if args.config else {}
+    if args.practice_id:
+        config["practice_id"] = args.practice_id
+
+    with StatsEngine(config, args.state) as engine:
+        if args.changes:
+            engine.load()
+            for path in args.changes:
+                header, ops = read_changes(path)
+                engine.apply(header, ops)
+            print(f"Applied {sum(engine.applied.values())} changes from {len(args.changes)} file(s): "
+                  f"{dict(engine.applied)}")
+        else:
+            raw_header, raw_rows = read_table(args.raw)
+            engine.scan_raw(raw_rows)
+            for sheet in (PATIENTS, QUEUE, TOUCHES):
+                header, rows = read_table(tables[sheet], _text(config.get("practice_id")))
+                engine.scan(sheet, header, rows)
+        engine.save()
+        stats = engine.stats()
+        config = engine.config
+
+    failures = [] if args.no_assert else assert_invariants(stats, config)
+    print("=== DRY RUN HARNESS STATS ===")
+    print(json.dumps(stats, indent=2))
+    if not args.no_assert:
+        print("\n=== INVARIANTS ===")
+        for f in failures:
+            print(f"  FAIL {f['code']}: {f['message']} {json.dumps(f['details'])}")
+        print("Invariants pass" if not failures else
+              "Invariant failures: " + ", ".join(f["code"] for f in failures))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"stats": stats, "failures": failures}, f, indent=2)
+    if args.event_log:
+        run_id = str(uuid.uuid4())
+        practice_id = stats["practice_id"]
+        event_types = load_schema().event_types
+        with EventLog(args.event_log) as log:
+            log.log(event_types.get("RUN_SUMMARY", "RUN_SUMMARY"), run_id, practice_id,
+                    f"Run summary: patients_total={stats['patients_total']}, queue_eligible={stats['queue_eligible']}",
+                    stats)
+            if not args.no_assert and failures:
+                log.log(event_types.get("RUN_INVARIANTS_FAIL", "RUN_INVARIANTS_FAIL"), run_id, practice_id,
+                        "Invariant failures: " + ", ".join(f["code"] for f in failures),
+                        {"schema_version": SCHEMA_VERSION, "run_id": run_id, "practice_id": practice_id,
+                         "failures": failures, "stats": stats})
+            elif not args.no_assert:
+                log.log(event_types.get("RUN_INVARIANTS_PASS", "RUN_INVARIANTS_PASS"), run_id, practice_id,
+                        "Invariants pass", stats)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
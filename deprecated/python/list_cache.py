@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Columnar cache of a parsed recall list, stored next to the CSV.
+
+A list is usually run several times (--validate, --dry-run, T1, T2 days later) and each
+run re-reads the CSV, re-normalizes phones and re-parses timestamps. The first full pass
+over a list records what normalize() produced into typed columns:
+
+    e164                 int64, the 10 digits after +1 (0 = missing/invalid)
+    responded_at ...     int64 epoch microseconds (NO_TS = blank/unparseable)
+    status, list_tag ... int32 codes into a per-column vocabulary (names too: they repeat)
+
+plus the CsvStats summary (headers, counts, preview, timestamp failures), and writes them
+as an uncompressed .npz (<csv name>.columns.npz). Later runs memory-map each column
+straight out of the zip (no copy, no decompression), so loading takes milliseconds
+whatever the list size, and rows stream out as the same Candidates normalize() yields.
+
+The cache is keyed by the CSV's BLAKE2b digest and CACHE_VERSION: an unchanged size and
+mtime is trusted, otherwise the file is re-hashed, and any mismatch rebuilds the cache.
+NumPy is optional; without it the send script simply parses the CSV every time.
+
+Usage:
+    python3 list_cache.py /path/to/file.csv            # build (or confirm) the cache
+    python3 list_cache.py /path/to/file.csv --info     # show what the cache holds
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zipfile
+from array import array
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from eligibility import EPOCH, NO_TS
+from send_pipeline import REQUIRED_HEADERS, Candidate, CsvStats, normalize, read_rows
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+CACHE_VERSION = 1
+TS_FIELDS = ("responded_at", "booked_at", "t1_sent_at", "t2_sent_at")
+CODED_FIELDS = ("fname", "lname", "do_not_text", "list_tag", "sent_status", "status", "mode")
+CHUNK_ROWS = 16384
+
+_LOCAL_HEADER = struct.Struct("<4s5H3I2H")  # zip local file header (30 bytes)
+_ONE_US = timedelta(microseconds=1)
+
+
+def available() -> bool:
+    return np is not None
+
+
+def default_cache_path(csv_path: str) -> str:
+    """Cache lives next to the send list, like the ledger."""
+    return os.path.splitext(os.path.abspath(csv_path))[0] + ".columns.npz"
+
+
+def file_digest(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def mmap_npz(path: str) -> Dict[str, "np.ndarray"]:
+    """Memory-maps every member of an uncompressed .npz (as written by np.savez) read-only."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed; cannot memory-map")
+            f.seek(info.header_offset)
+            fields = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+            f.seek(info.header_offset + _LOCAL_HEADER.size + fields[-2] + fields[-1])
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{info.filename} holds Python objects; cannot memory-map")
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if not shape or 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(f, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran else "C")
+    return arrays
+
+
+class _Coder:
+    """Dictionary encoder for one string column."""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.vocab: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: str) -> None:
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.vocab)
+            self.vocab.append(value)
+        self.codes.append(code)
+
+
+class CachedList:
+    """A loaded cache: memory-mapped columns plus the recorded CsvStats summary."""
+
+    def __init__(self, columns: Dict[str, "np.ndarray"], meta: Dict[str, object]):
+        self.columns = columns
+        self.meta = meta
+        self.rows = int(meta["rows"])
+
+    def restore_stats(self, stats: CsvStats) -> None:
+        """Fills `stats` as if read_rows() had streamed the CSV."""
+        s = self.meta["stats"]
+        stats.headers = set(s["headers"])
+        stats.missing = REQUIRED_HEADERS - stats.headers
+        stats.total = s["total"]
+        stats.blanks = s["blanks"]
+        stats.dups = s["dups"]
+        stats.unique = s["unique"]
+        stats.preview = [dict(pairs) for pairs in s["preview"]][: stats.preview_rows]
+        for name, n in s["ts_failures"].items():
+            stats.timestamps.column(name).failures = n
+
+    def candidates(self, default_mode: str, chunk: int = CHUNK_ROWS) -> Iterator[Candidate]:
+        """Yields the Candidates normalize(read_rows(csv), default_mode) would, `chunk` rows at a time."""
+        cols = self.columns
+        vocabs = [self.meta["vocab"][name] for name in CODED_FIELDS]
+        memos = [{NO_TS: None} for _ in TS_FIELDS]
+        for start in range(0, self.rows, chunk):
+            end = start + chunk
+            fname, lname, do_not_text, list_tag, sent_status, status, mode = [
+                [vocab[code] for code in cols[name][start:end].tolist()] for name, vocab in zip(CODED_FIELDS, vocabs)]
+            mode = [m or default_mode for m in mode]
+            e164 = ["+1%010d" % n if n else "" for n in cols["e164"][start:end].tolist()]
+            stamps = []
+            for name, memo in zip(TS_FIELDS, memos):
+                col = []
+                for us in cols[name][start:end].tolist():
+                    dt = memo.get(us, memo)
+                    if dt is memo:
+                        dt = memo[us] = EPOCH + us * _ONE_US
+                    col.append(dt)
+                stamps.append(col)
+            responded_at, booked_at, t1_sent_at, t2_sent_at = stamps
+            for i, idx in enumerate(cols["idx"][start:end].tolist()):
+                yield Candidate(idx, fname[i], lname[i], e164[i], do_not_text[i], list_tag[i], sent_status[i],
+                                mode[i], status[i], responded_at[i], booked_at[i], t1_sent_at[i], t2_sent_at[i])
+
+
+class ListCache:
+    """Loads or records the columnar cache for one CSV."""
+
+    def __init__(self, csv_path: str, path: Optional[str] = None):
+        self.csv_path = csv_path
+        self.path = path or default_cache_path(csv_path)
+        self.status = "unused"  # hit / stale / miss / written / write failed: ...
+
+    def load(self) -> Optional[CachedList]:
+        """The cached columns when they match the CSV, else None."""
+        if not available() or not os.path.exists(self.path):
+            self.status = "miss"
+            return None
+        try:
+            columns = mmap_npz(self.path)
+            meta = json.loads(bytes(columns.pop("meta")).decode("utf-8"))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            self.status = "stale"
+            return None
+        st = os.stat(self.csv_path)
+        source = meta.get("source", {})
+        if meta.get("version") != CACHE_VERSION or source.get("size") != st.st_size:
+            self.status = "stale"
+            return None
+        if source.get("mtime_ns") != st.st_mtime_ns and source.get("digest") != file_digest(self.csv_path):
+            self.status = "stale"
+            return None
+        self.status = "hit"
+        return CachedList(columns, meta)
+
+    def record(self, cands: Iterable[Candidate], stats: CsvStats, default_mode: str) -> Iterator[Candidate]:
+        """
+        Passes Candidates through while recording them; writes the cache once the stream
+        is exhausted. `cands` must come from normalize(..., default_mode="") so a row's own
+        mode is kept apart from the CLI default, which is applied here.
+        """
+        st = os.stat(self.csv_path)
+        idx = array("q")
+        e164 = array("q")
+        coders = {name: _Coder() for name in CODED_FIELDS}
+        coder_list = [coders[name] for name in CODED_FIELDS]
+        stamps = {name: array("q") for name in TS_FIELDS}
+        stamp_list = [stamps[name] for name in TS_FIELDS]
+        memo = {None: NO_TS}
+        cacheable = True
+        for c in cands:
+            idx.append(c.idx)
+            if c.e164.isascii():
+                e164.append(int(c.e164[2:]) if c.e164 else 0)
+            else:  # non-ASCII digits survive normalize_e164 and would not round-trip through int64
+                e164.append(0)
+                cacheable = False
+            for coder, value in zip(coder_list, (c.fname, c.lname, c.do_not_text, c.list_tag,
+                                                 c.sent_status, c.status, c.mode)):
+                coder.add(value)
+            for col, dt in zip(stamp_list, (c.responded_at, c.booked_at, c.t1_sent_at, c.t2_sent_at)):
+                us = memo.get(dt)
+                if us is None:
+                    us = memo[dt] = (dt - EPOCH) // _ONE_US
+                col.append(us)
+            yield c if c.mode else c._replace(mode=default_mode)
+
+        if not cacheable:
+            self.status = "not cacheable (non-ASCII phone digits)"
+            return
+        meta = {
+            "version": CACHE_VERSION,
+            "rows": len(idx),
+            "source": {"path": os.path.abspath(self.csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                       "digest": file_digest(self.csv_path)},
+            "stats": {
+                "headers": sorted(stats.headers),
+                "total": stats.total,
+                "blanks": stats.blanks,
+                "dups": stats.dups,
+                "unique": stats.unique,
+                "preview": [list(row.items()) for row in stats.preview],
+                "ts_failures": stats.timestamps.failures(),
+            },
+            "vocab": {name: coders[name].vocab for name in CODED_FIELDS},
+        }
+        columns = {"idx": idx, "e164": e164, **{name: coders[name].codes for name in CODED_FIELDS}, **stamps}
+        self._write(columns, meta)
+
+    def _write(self, columns: Dict[str, array], meta: Dict[str, object]) -> None:
+        tmp = f"{self.path}.tmp{os.getpid()}"
+        try:
+            arrays = {name: np.frombuffer(col, dtype=np.int64 if col.typecode == "q" else np.int32)
+                      for name, col in columns.items()}
+            arrays["meta"] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, self.path)
+            self.status = "written"
+        except OSError as e:
+            self.status = f"write failed: {e}"
+            print(f"WARNING: could not write list cache {self.path}: {e}", file=sys.stderr)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def candidates_for(csv_path: str, stats: CsvStats, default_mode: str, cache: Optional[ListCache] = None,
+                   timed=None) -> Iterator[Candidate]:
+    """
+    read_rows -> normalize, served from `cache` when it matches the CSV and recorded into it
+    otherwise. `timed(stage, iterator)` (RunMetrics.timed) wraps each stage when given.
+    """
+    timed = timed or (lambda name, it: it)
+    cached = cache.load() if cache is not None else None
+    if cached is not None:
+        cached.restore_stats(stats)
+        return timed("cache_load", cached.candidates(default_mode))
+    rows = timed("parse", read_rows(csv_path, stats))
+    if cache is None or not available():
+        return timed("normalize", normalize(rows, default_mode, stats.timestamps))
+    return cache.record(timed("normalize", normalize(rows, "", stats.timestamps)), stats, default_mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the columnar cache for a recall CSV.")
+    parser.add_argument("csv_path", help="Path to CSV file")
+    parser.add_argument("--cache", default="", help="Cache path (default: <csv name>.columns.npz next to the CSV)")
+    parser.add_argument("--info", action="store_true", help="Describe the cache instead of building it")
+    args = parser.parse_args()
+
+    if not available():
+        print("ERROR: numpy is required for the list cache (pip install numpy)")
+        sys.exit(1)
+    cache = ListCache(args.csv_path, args.cache or None)
+    start = time.perf_counter()
+    cached = cache.load()
+    if args.info:
+        if cached is None:
+            print(f"{cache.path}: {cache.status}")
+            sys.exit(1)
+        print(f"{cache.path}: {cached.rows} rows, {os.path.getsize(cache.path):,} bytes, "
+              f"loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for name, col in cached.columns.items():
+            vocab = cached.meta["vocab"].get(name)
+            print(f"  {name:<14} {col.dtype}" + (f"  ({len(vocab)} distinct)" if vocab is not None else ""))
+        return
+    if cached is None:
+        for _ in candidates_for(args.csv_path, CsvStats(), "link", cache):
+            pass
+    print(f"{cache.path}: {cache.status} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
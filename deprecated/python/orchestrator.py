@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Run twilio_send_script.py passes for many practices in parallel.
+
+Practices come from the same Script Properties the Apps Script side uses (pass each as
+JSON, a path to a JSON file, or leave unset to read the environment variable):
+
+    RB_PRACTICE_REGISTRY_JSON  {"practice_id": "spreadsheetId", ...}
+    RB_TWILIO_CREDS_JSON       {"practice_id": {"accountSid", "authToken", "messagingServiceSid"}, ...}
+    RB_PRACTICE_COPY_JSON      {"practice_id": {"practice_name", "booking_url", "office_phone"}, ...}
+
+Each registered practice with a send list (<--lists>/<practice_id>.csv or --list
+practice_id=path) becomes one job on a process pool. A job runs the normal send path
+(plan, ledger next to its CSV, ordered output) with that practice's credentials,
+Messaging Service, copy and its own --rate budget, and every send also takes a token
+from one --global-rate bucket shared by all worker processes. Each job's output goes
+to <--log-dir>/<practice_id>.log (and, with --events, its 70_EventLog rows to
+<practice_id>.events.jsonl); the orchestrator prints one line per finished practice
+and a cross-practice summary.
+
+Usage:
+    python3 orchestrator.py --lists ./lists --dry-run
+    python3 orchestrator.py --lists ./lists --touch t1 --rate 10 --global-rate 40 --jobs 8
+    python3 orchestrator.py --list bethesda=/data/bds.csv --practice-rate bethesda=5 --json-out run.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional, Tuple
+
+from send_engine import DEFAULT_RATE_MPS, DEFAULT_WORKERS, SharedTokenBucket
+from send_metrics import RunMetrics
+from transport import LatencyHistogram
+
+DEFAULT_GLOBAL_RATE_MPS = 30.0
+
+Job = namedtuple("Job", ["practice_id", "csv_path", "argv", "env", "log_path", "metrics_path"])
+
+_CEILING: Optional[SharedTokenBucket] = None
+
+
+def load_json_source(value: Optional[str], env_name: str) -> Dict[str, object]:
+    """JSON text, a path to a JSON file, or (when empty) the environment variable `env_name`."""
+    raw = value if value else os.getenv(env_name, "")
+    if raw and not raw.lstrip().startswith("{") and os.path.exists(raw):
+        with open(raw, encoding="utf-8") as f:
+            raw = f.read()
+    if not raw:
+        return {}
+    try:
+        obj = json.loads(raw)
+    except ValueError as e:
+        raise ValueError(f"{env_name} is not valid JSON: {e}") from None
+    if not isinstance(obj, dict):
+        raise ValueError(f"{env_name} must be a JSON object")
+    return obj
+
+
+def _pairs(items: List[str], flag: str) -> Dict[str, str]:
+    out = {}
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep or not key or not value:
+            raise ValueError(f"{flag} expects practice_id=value, got {item!r}")
+        out[key] = value
+    return out
+
+
+def plan_jobs(args, registry, creds, copy) -> Tuple[List[Job], Dict[str, str]]:
+    """One Job per registered practice with a send list; the rest are returned with the reason."""
+    lists = _pairs(args.list, "--list")
+    rates = {pid: float(v) for pid, v in _pairs(args.practice_rate, "--practice-rate").items()}
+    unknown = sorted((set(lists) | set(rates)) - set(registry))
+    if unknown:
+        raise ValueError(f"not in RB_PRACTICE_REGISTRY_JSON: {', '.join(unknown)}")
+    jobs: List[Job] = []
+    skipped: Dict[str, str] = {}
+    for pid in sorted(registry):
+        csv_path = lists.get(pid) or (os.path.join(args.lists, f"{pid}.csv") if args.lists else "")
+        if not csv_path or not os.path.exists(csv_path):
+            skipped[pid] = "no send list"
+            continue
+        entry = creds.get(pid) or {}
+        if not args.dry_run and not (entry.get("accountSid") and entry.get("authToken")
+                                     and entry.get("messagingServiceSid")):
+            skipped[pid] = f"Missing Twilio creds for practice {pid} in RB_TWILIO_CREDS_JSON"
+            continue
+        practice_copy = copy.get(pid) or {}
+        argv = [csv_path, "--touch", args.touch, "--mode", args.mode,
+                "--rate", str(rates.get(pid, args.rate)), "--workers", str(args.workers), "--practice-id", pid]
+        if args.events:
+            argv += ["--event-log", os.path.join(args.log_dir, f"{pid}.events.jsonl")]
+        if args.dry_run:
+            argv.append("--dry-run")
+        if args.force:
+            argv.append("--force")
+        if args.api_base:
+            argv += ["--api-base", args.api_base]
+        if entry.get("messagingServiceSid"):
+            argv += ["--messaging-service-sid", entry["messagingServiceSid"]]
+        for key, flag in (("practice_name", "--practice-name"), ("booking_url", "--booking-url"),
+                          ("office_phone", "--office-phone")):
+            if practice_copy.get(key):
+                argv += [flag, practice_copy[key]]
+        env = {"TWILIO_ACCOUNT_SID": entry.get("accountSid", ""), "TWILIO_AUTH_TOKEN": entry.get("authToken", "")}
+        log_path = os.path.join(args.log_dir, f"{pid}.log")
+        metrics_path = os.path.join(args.log_dir, f"{pid}.metrics.json")
+        jobs.append(Job(pid, csv_path, argv, env, log_path, metrics_path))
+    return jobs, skipped
+
+
+def _init_worker(ceiling: Optional[SharedTokenBucket]) -> None:
+    global _CEILING
+    _CEILING = ceiling
+
+
+def run_practice(job: Job) -> Dict[str, object]:
+    """Runs one practice's send pass in this worker process; never raises."""
+    import twilio_send_script  # imported in the worker so each process builds its own state
+
+    os.environ.update(job.env)
+    parser = twilio_send_script.build_parser()
+    args = parser.parse_args(job.argv)
+    metrics = RunMetrics(practice=job.practice_id, touch=args.touch)
+    result = {"practice_id": job.practice_id, "csv": job.csv_path, "log": job.log_path, "status": "ok"}
+    start = time.perf_counter()
+    with open(job.log_path, "w", encoding="utf-8") as log, redirect_stdout(log):
+        try:
+            counts = twilio_send_script.run(parser, args, metrics, ceiling=_CEILING)
+        except SystemExit as e:
+            counts = None
+            result.update(status="aborted", detail=f"exit {e.code}")
+        except Exception as e:  # one practice failing must not stop the others
+            counts = None
+            result.update(status="error", detail=f"{type(e).__name__}: {e}")
+            print(f"ERROR: {result['detail']}")
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    if counts is not None:
+        total, sent, errors, skipped, api_stats = counts
+        result.update(total=total, sent=sent, errors=errors, skipped=skipped, api=api_stats)
+    metrics.write(job.metrics_path)
+    return result
+
+
+def summarize(results: List[Dict[str, object]], skipped: Dict[str, str], wall: float) -> Dict[str, object]:
+    latency = LatencyHistogram()
+    reasons: Dict[str, int] = {}
+    totals = {"rows": 0, "sent": 0, "errors": 0, "retries": 0}
+    for r in results:
+        totals["rows"] += r.get("total", 0)
+        totals["sent"] += r.get("sent", 0)
+        totals["errors"] += r.get("errors", 0)
+        for reason, n in (r.get("skipped") or {}).items():
+            reasons[reason] = reasons.get(reason, 0) + n
+        api = r.get("api")
+        if api:
+            latency.merge(api["latency"])
+            totals["retries"] += api["retries"]
+    lat = latency.snapshot()
+    lat.pop("buckets")
+    return {
+        "practices_run": len(results),
+        "practices_ok": sum(1 for r in results if r["status"] == "ok"),
+        "practices_failed": {r["practice_id"]: r.get("detail", r["status"]) for r in results if r["status"] != "ok"},
+        "practices_skipped": skipped,
+        **totals,
+        "wall_seconds": round(wall, 3),
+        "sends_per_sec": round(totals["sent"] / wall, 2) if wall > 0 else 0.0,
+        "api_latency": lat,
+        "skipped_reasons": dict(sorted(reasons.items(), key=lambda x: x[1], reverse=True)),
+        "practices": {r["practice_id"]: {k: v for k, v in r.items() if k not in ("practice_id", "skipped", "api")}
+                      for r in results},
+    }
+
+
+def print_report(summary: Dict[str, object]) -> None:
+    print("\n=== CROSS-PRACTICE SUMMARY ===")
+    print(f"Practices: {summary['practices_ok']}/{summary['practices_run']} ok, "
+          f"{len(summary['practices_skipped'])} skipped")
+    for pid, why in summary["practices_failed"].items():
+        print(f"  FAILED {pid}: {why}")
+    for pid, why in summary["practices_skipped"].items():
+        print(f"  skipped {pid}: {why}")
+    print(f"Rows: {summary['rows']}  Sent: {summary['sent']}  Errors: {summary['errors']}  "
+          f"in {summary['wall_seconds']}s ({summary['sends_per_sec']} sends/s)")
+    lat = summary["api_latency"]
+    if lat["count"]:
+        print(f"API latency (ms): p50<={lat['p50_ms']:g} p95<={lat['p95_ms']:g} p99<={lat['p99_ms']:g} "
+              f"max={lat['max_ms']:g} over {lat['count']} requests; retries={summary['retries']}")
+    if summary["skipped_reasons"]:
+        print("Skipped by reason (all practices):")
+        for reason, count in summary["skipped_reasons"].items():
+            print(f"  {count} -> {reason}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel multi-practice send passes.")
+    parser.add_argument("--registry", help="RB_PRACTICE_REGISTRY_JSON (JSON or file; default: env)")
+    parser.add_argument("--creds", help="RB_TWILIO_CREDS_JSON (JSON or file; default: env)")
+    parser.add_argument("--copy", help="RB_PRACTICE_COPY_JSON (JSON or file; default: env)")
+    parser.add_argument("--lists", help="Directory holding <practice_id>.csv send lists")
+    parser.add_argument("--list", action="append", metavar="PID=CSV", help="Send list for one practice (repeatable)")
+    parser.add_argument("--touch", choices=["t1", "t2"], default="t1")
+    parser.add_argument("--mode", choices=["link", "manual"], default="link")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_MPS, help="Per-practice messages/sec")
+    parser.add_argument("--practice-rate", action="append", metavar="PID=MPS", help="Override --rate for one practice")
+    parser.add_argument("--global-rate", type=float, default=DEFAULT_GLOBAL_RATE_MPS,
+                        help="Ceiling across all practices (0 = none)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Send threads per practice")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Practices run at once (processes)")
+    parser.add_argument("--api-base", default=os.getenv("TWILIO_API_BASE", ""))
+    parser.add_argument("--log-dir", default="orchestrator_logs", help="Per-practice output and metrics")
+    parser.add_argument("--json-out", metavar="PATH", help="Also write the summary as JSON")
+    parser.add_argument("--events", action="store_true", help="Write each practice's event log to --log-dir")
+    args = parser.parse_args()
+
+    try:
+        registry = load_json_source(args.registry, "RB_PRACTICE_REGISTRY_JSON")
+        creds = load_json_source(args.creds, "RB_TWILIO_CREDS_JSON")
+        copy = load_json_source(args.copy, "RB_PRACTICE_COPY_JSON")
+        if not registry:
+            raise ValueError("RB_PRACTICE_REGISTRY_JSON is empty")
+        jobs, skipped = plan_jobs(args, registry, creds, copy)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(2)
+    if not jobs:
+        print("Nothing to run: " + ", ".join(f"{pid} ({why})" for pid, why in skipped.items()))
+        sys.exit(1)
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    ceiling = SharedTokenBucket(args.global_rate) if args.global_rate > 0 else None
+    workers = max(1, min(args.jobs, len(jobs)))
+    print(f"Running {len(jobs)} practices on {workers} processes (rate {args.rate:g}/s each, "
+          f"global ceiling {args.global_rate:g}/s); logs in {args.log_dir}")
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ceiling,)) as pool:
+        futures = {pool.submit(run_practice, job): job for job in jobs}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            try:
+                r = fut.result()
+            except Exception as e:  # worker process died
+                r = {"practice_id": job.practice_id, "csv": job.csv_path, "log": job.log_path,
+                     "status": "error", "detail": f"{type(e).__name__}: {e}"}
+            results.append(r)
+            print(f"[{r['practice_id']}] {r['status']}: sent={r.get('sent', 0)} errors={r.get('errors', 0)} "
+                  f"rows={r.get('total', 0)} in {r.get('seconds', 0)}s" + (f" ({r['detail']})" if "detail" in r else ""))
+    summary = summarize(sorted(results, key=lambda r: r["practice_id"]), skipped, time.perf_counter() - start)
+    print_report(summary)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    sys.exit(0 if not summary["practices_failed"] and not summary["errors"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# patient_index.py
+"""
+Phone normalization and in-memory lookup indexes over 30_Patients / 60_Touches.
+
+WebApp.js finds the patient for an inbound message, the latest touch for a phone and the
+touch for a status callback by scanning the full sheet each time. PatientIndex builds
+the equivalent hash indexes once and keeps them current as rows are appended or
+rewritten:
+
+    phone_e164 -> patient rows         (first row wins, like the JS loop's `break`)
+    patient_key -> touch rows          (ascending; the last one is the latest touch)
+    phone_e164 -> touch rows
+    msg_sid -> touch rows              (first row wins, like findRowByValue_)
+
+Row numbers are getValues() indexes (0 is the header), so they can be handed straight
+back to the sheet. Only the key columns are kept per row, not the rows themselves.
+
+The normalizers drop non-digits from ASCII input with a single bytes.translate() call
+and fall back to a per-character filter only for non-ASCII input, so results are
+identical to the original list-comprehension versions.
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+_NON_DIGITS = bytes(b for b in range(256) if not 0x30 <= b <= 0x39)
+
+
+def phone_digits(raw, ascii_only: bool = False) -> str:
+    """Every digit character in `raw`, in order (only 0-9 when `ascii_only`, like JS `\\D`)."""
+    s = str(raw)
+    if s.isascii():
+        return s.encode("ascii").translate(None, _NON_DIGITS).decode("ascii")
+    if ascii_only:
+        return "".join([c for c in s if "0" <= c <= "9"])
+    return "".join([c for c in s if c.isdigit()])
+
+
+def normalize_e164(val) -> str:
+    """
+    Send-list rule: +1 followed by the last 10 digits. Returns '' if not valid.
+    """
+    if val is None:
+        return ""
+    digits = phone_digits(val)
+    if len(digits) >= 10:
+        return "+1" + digits[-10:]
+    return ""
+
+
+def normalize_phone(raw) -> Optional[str]:
+    """Utils.normalizePhone: 10 digits -> +1XXXXXXXXXX, 11 digits starting with 1 -> +1..., else None."""
+    if raw is None:
+        return None
+    digits = phone_digits(raw, ascii_only=True)
+    if len(digits) == 10:
+        return "+1" + digits
+    if len(digits) == 11 and digits.startswith("1"):
+        return "+" + digits
+    return None
+
+
+class _Multi:
+    """key -> ascending row numbers, plus the key each row currently holds."""
+
+    def __init__(self):
+        self.rows: Dict[str, List[int]] = {}
+        self.key_of: Dict[int, str] = {}
+
+    def set(self, idx: int, key) -> None:
+        key = key or ""
+        old = self.key_of.get(idx)
+        if old == key:
+            return
+        if old is not None:
+            rows = self.rows[old]
+            del rows[bisect_left(rows, idx)]
+            if not rows:
+                del self.rows[old]
+        self.key_of[idx] = key
+        if key:
+            rows = self.rows.setdefault(key, [])
+            if not rows or rows[-1] < idx:
+                rows.append(idx)
+            else:
+                insort(rows, idx)
+
+    def first(self, key) -> int:
+        rows = self.rows.get(key or "")
+        return rows[0] if rows else -1
+
+    def last(self, key) -> int:
+        rows = self.rows.get(key or "")
+        return rows[-1] if rows else -1
+
+    def all(self, key) -> List[int]:
+        return list(self.rows.get(key or "", ()))
+
+
+class PatientIndex:
+    """Hash indexes over the patient and touch sheets; update them on every row write."""
+
+    def __init__(self, patient_header: List[str], touch_header: List[str]):
+        self._p_phone = patient_header.index("phone_e164")
+        self._p_key = patient_header.index("patient_key")
+        self._t_phone = touch_header.index("phone_e164")
+        self._t_key = touch_header.index("patient_key")
+        self._t_sid = touch_header.index("msg_sid")
+        self.patients_by_phone = _Multi()
+        self.patients_by_key = _Multi()
+        self.touches_by_phone = _Multi()
+        self.touches_by_patient = _Multi()
+        self.touches_by_sid = _Multi()
+
+    @classmethod
+    def build(cls, patients: List[list], touches: List[list]) -> "PatientIndex":
+        """From getValues()-shaped data (header row first) for both sheets."""
+        index = cls(patients[0], touches[0])
+        for idx in range(1, len(patients)):
+            index.put_patient(idx, patients[idx])
+        for idx in range(1, len(touches)):
+            index.put_touch(idx, touches[idx])
+        return index
+
+    def put_patient(self, idx: int, row: list) -> None:
+        """Index a new or rewritten 30_Patients row."""
+        self.patients_by_phone.set(idx, row[self._p_phone])
+        self.patients_by_key.set(idx, row[self._p_key])
+
+    def put_touch(self, idx: int, row: list) -> None:
+        """Index a new or rewritten 60_Touches row."""
+        self.touches_by_phone.set(idx, row[self._t_phone])
+        self.touches_by_patient.set(idx, row[self._t_key])
+        self.touches_by_sid.set(idx, row[self._t_sid])
+
+    def patient_row(self, phone: str) -> int:
+        return self.patients_by_phone.first(phone)
+
+    def patient_key(self, phone: str) -> str:
+        idx = self.patient_row(phone)
+        return self.patients_by_key.key_of.get(idx, "") if idx > 0 else ""
+
+    def touch_rows_for_patient(self, patient_key: str) -> List[int]:
+        return self.touches_by_patient.all(patient_key)
+
+    def latest_touch_row(self, phone: str) -> int:
+        return self.touches_by_phone.last(phone)
+
+    def touch_row_by_sid(self, sid: str) -> int:
+        return self.touches_by_sid.first(sid)
+
+    def touch_rows(self, phone: str) -> Tuple[str, List[int]]:
+        """phone -> (patient_key, that patient's touch rows); falls back to rows keyed by the phone."""
+        key = self.patient_key(phone)
+        rows = self.touch_rows_for_patient(key) if key else []
+        return key, rows or self.touches_by_phone.all(phone)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "patients": len(self.patients_by_key.key_of),
+            "patient_phones": len(self.patients_by_phone.rows),
+            "touches": len(self.touches_by_sid.key_of),
+            "touch_sids": len(self.touches_by_sid.rows),
+        }
+
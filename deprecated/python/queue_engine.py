@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Incremental BuildQueue + CreateTouchesFromQueue over exported sheet data.
+
+Queue.js rewrites all of 50_Queue on every run and Touches.js re-hashes every patient
+and rewrites every touch row. This engine applies the same rules (eligibility,
+computeRecallStatus, touch_id = sha256(practice:campaign:patient_key:touch), the
+WOULD_SEND/SENT freeze) but keeps a per-patient snapshot and emits only the rows that
+changed since the last run:
+
+    {"op": "insert" | "update", "sheet": "50_Queue",   "key": patient_key, "row": [...QUEUE_HEADERS]}
+    {"op": "delete",            "sheet": "50_Queue",   "key": patient_key}
+    {"op": "insert",            "sheet": "60_Touches", "key": touch_id, "row": [...TOUCHES_HEADERS]}
+    {"op": "update",            "sheet": "60_Touches", "key": touch_id, "set": {column: value}}
+    {"op": "insert" | "update", "sheet": "30_Patients", "key": patient_key, "row": [...PATIENT_FIELDS]}
+    {"op": "delete",            "sheet": "30_Patients", "key": patient_key}
+
+The 30_Patients ops carry only the columns the invariants.py stats read, and only when
+they changed (their hash is kept in the snapshot), so `invariants.py --changes` keeps the
+patient counters current without a full pass.
+
+A patient is skipped without any work when the hash of its queue inputs (patient_key,
+phone, do_not_text, complaint_flag, recall_due_date, window) is unchanged and today is
+before the date its recall status can next flip (NOT_DUE -> DUE at due - window,
+DUE -> OVERDUE the day after due). A daily refresh therefore costs one CSV read plus
+work proportional to churn. Touches are never deleted (as in Touches.js); patients
+that disappear only drop their 50_Queue row.
+
+The snapshot is a SQLite file scoped by (practice, campaign, touch), like the send
+ledger; it advances only after the change file has been written. Once a snapshot exists,
+the current 60_Touches export is required (--touches): only the sheet knows which rows
+went WOULD_SEND/SENT since the last run, and those must stay frozen. Rows missing from
+the sheet are re-inserted.
+
+Usage:
+    python3 queue_engine.py --patients 30_Patients.csv --practice-id p1 --campaign c1 \\
+        --touches 60_Touches.csv --out changes.jsonl
+    python3 queue_engine.py ... --dry-run      # counts only; snapshot untouched
+    python3 queue_engine.py ... --full         # ignore the snapshot (everything is an insert)
+
+Recall dates are compared as calendar dates (Apps Script compares script-timezone
+midnights); --today pins the run date.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from invariants import PATIENT_FIELDS
+from sheet_schema import header_map, load_schema
+from timestamps import parse_ts
+
+QUEUE_CAMPAIGN = "campaign_jan_recall"  # 50_Queue.campaign_id as written by Queue.js
+DEFAULT_WINDOW_DAYS = 30
+FROZEN_SEND_STATUSES = {"WOULD_SEND", "SENT"}
+NEVER = date.max
+
+SnapEntry = namedtuple(
+    "SnapEntry", ["input_hash", "recheck_on", "queue_hash", "touch_id", "touch_hash", "planned", "send_status",
+                  "patient_hash"]
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    practice_id TEXT NOT NULL,
+    campaign    TEXT NOT NULL,
+    touch       TEXT NOT NULL,
+    patient_key TEXT NOT NULL,
+    input_hash  TEXT NOT NULL,
+    recheck_on  TEXT NOT NULL,
+    queue_hash  TEXT NOT NULL,
+    touch_id    TEXT NOT NULL,
+    touch_hash  TEXT NOT NULL,
+    planned     TEXT NOT NULL,
+    send_status TEXT NOT NULL,
+    patient_hash TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (practice_id, campaign, touch, patient_key)
+) WITHOUT ROWID;
+"""
+
+
+# ---------------------------------------------------------------------
+# Apps Script rules
+# ---------------------------------------------------------------------
+
+def parse_due_date(raw) -> Optional[date]:
+    """recall_due_date as a calendar date: YYYY-MM-DD[...], M/D/YYYY[ time], or None."""
+    s = str(raw or "").strip()
+    if not s:
+        return None
+    if len(s) >= 10 and s[4] == "-" and s[7] == "-":
+        try:
+            return date.fromisoformat(s[:10])
+        except ValueError:
+            return None
+    head = s.split(" ", 1)[0]
+    if head.count("/") == 2:
+        try:
+            return datetime.strptime(head, "%m/%d/%Y").date()
+        except ValueError:
+            return None
+    parsed = parse_ts(s)
+    return parsed.date() if parsed else None
+
+
+def compute_recall_status(due: Optional[date], today: date, window_days: int) -> Tuple[str, date]:
+    """Utils.computeRecallStatus plus the first date on which the answer can change."""
+    if due is None:
+        return "UNKNOWN", NEVER
+    if due < today:
+        return "OVERDUE", NEVER
+    if due <= today + timedelta(days=window_days):
+        return "DUE", due + timedelta(days=1)
+    return "NOT_DUE", due - timedelta(days=window_days)
+
+
+def touch_id(practice_id: str, campaign: str, patient_key: str, touch: str) -> str:
+    return hashlib.sha256(f"{practice_id}:{campaign}:{patient_key}:{touch}".encode("utf-8")).hexdigest()
+
+
+def _digest(*parts) -> str:
+    return hashlib.blake2b("\x1f".join(str(p) for p in parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ---------------------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------------------
+
+class Snapshot:
+    """Per-patient state from the previous run, scoped to one practice + campaign + touch."""
+
+    def __init__(self, path: str, practice_id: str, campaign: str, touch: str):
+        self.path = path
+        self.scope = (practice_id, campaign, touch)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        if "patient_hash" not in {r[1] for r in self._db.execute("PRAGMA table_info(patients)")}:
+            # snapshots written before 30_Patients ops: every patient row is emitted once
+            self._db.execute("ALTER TABLE patients ADD COLUMN patient_hash TEXT NOT NULL DEFAULT ''")
+
+    def load(self) -> Dict[str, SnapEntry]:
+        out: Dict[str, SnapEntry] = {}
+        for pk, ih, rc, qh, tid, th, pl, st, ph in self._db.execute(
+            "SELECT patient_key, input_hash, recheck_on, queue_hash, touch_id, touch_hash, planned, send_status, "
+            "patient_hash FROM patients WHERE practice_id=? AND campaign=? AND touch=?",
+            self.scope,
+        ):
+            out[pk] = SnapEntry(ih, date.fromisoformat(rc), qh, tid, th, pl, st, ph)
+        return out
+
+    def save(self, changed: Dict[str, SnapEntry], deleted: List[str], replace: bool = False) -> None:
+        """Applies one run's delta; `replace` first drops everything in scope (after a --full run)."""
+        with self._db:
+            if replace:
+                self._db.execute("DELETE FROM patients WHERE practice_id=? AND campaign=? AND touch=?", self.scope)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO patients VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self.scope + (pk, e.input_hash, e.recheck_on.isoformat(), e.queue_hash, e.touch_id,
+                               e.touch_hash, e.planned, e.send_status, e.patient_hash) for pk, e in changed.items()],
+            )
+            self._db.executemany(
+                "DELETE FROM patients WHERE practice_id=? AND campaign=? AND touch=? AND patient_key=?",
+                [self.scope + (pk,) for pk in deleted],
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def default_snapshot_path(patients_csv: str) -> str:
+    return os.path.splitext(os.path.abspath(patients_csv))[0] + ".queue_snapshot.sqlite"
+
+
+# ---------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------
+
+def read_sheet_csv(path: str) -> Iterator[Tuple[Dict[str, int], List[str]]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        hmap = header_map(next(reader, []))
+        for row in reader:
+            yield hmap, row
+
+
+def read_touch_states(path: str) -> Dict[str, str]:
+    """touch_id -> send_status from a 60_Touches export."""
+    out: Dict[str, str] = {}
+    for hmap, row in read_sheet_csv(path):
+        tid = row[hmap["touch_id"]]
+        if tid:
+            out[tid] = row[hmap["send_status"]] if "send_status" in hmap else ""
+    return out
+
+
+class QueueEngine:
+    """One incremental BuildQueue(touch) + CreateTouchesFromQueue(touch, campaign) pass."""
+
+    def __init__(self, practice_id: str, campaign: str, touch: str = "T1", window_days: int = DEFAULT_WINDOW_DAYS,
+                 today: Optional[date] = None, touches_dry_run: bool = True):
+        if not campaign:
+            raise ValueError("active_campaign_id is required in Config or as argument.")
+        schema = load_schema()
+        self.practice_id = practice_id
+        self.campaign = campaign
+        self.touch = touch
+        self.window_days = window_days
+        self.today = today or date.today()
+        self.touches_dry_run = touches_dry_run
+        self.queue_headers = schema.headers["50_Queue"]
+        self.touch_headers = schema.headers["60_Touches"]
+        self.tmap = header_map(self.touch_headers)
+        self.changed: Dict[str, SnapEntry] = {}
+        self.deleted: List[str] = []
+        self.counts = dict.fromkeys(
+            ["patients", "reprocessed", "unchanged", "queue_inserted", "queue_updated", "queue_deleted",
+             "touches_created", "touches_updated", "touches_frozen", "patients_changed"], 0)
+        self.ready = 0
+        self.skipped = 0
+
+    def run(self, patients: Iterator[Tuple[Dict[str, int], List[str]]], previous: Dict[str, SnapEntry],
+            touch_states: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, object]]:
+        """
+        Yields change records; self.changed / self.deleted hold the snapshot delta afterwards.
+        `touch_states` (touch_id -> send_status from 60_Touches) is required once `previous`
+        is non-empty: without it a touch frozen in the sheet could be rewritten.
+        """
+        if previous and touch_states is None:
+            raise ValueError("the 60_Touches export is required once a snapshot exists (frozen touches)")
+        now = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        seen = set()
+        counts = self.counts
+        stat_cols: Tuple[Optional[int], ...] = ()
+        for hmap, r in patients:
+            pk = r[hmap["patient_key"]]
+            if not pk or pk in seen:
+                continue
+            seen.add(pk)
+            counts["patients"] += 1
+            if not stat_cols:
+                stat_cols = tuple(hmap.get(f) for f in PATIENT_FIELDS)
+            p_row = [r[i] if i is not None and i < len(r) else "" for i in stat_cols]
+            patient_hash = _digest(*p_row)
+            prev = previous.get(pk)
+            if prev is None or prev.patient_hash != patient_hash:
+                counts["patients_changed"] += 1
+                yield {"op": "insert" if prev is None else "update", "sheet": "30_Patients", "key": pk, "row": p_row}
+                if prev is not None:
+                    # recorded even when the queue inputs below turn out unchanged
+                    prev = prev._replace(patient_hash=patient_hash)
+                    self.changed[pk] = prev
+            phone = r[hmap["phone_e164"]]
+            do_not_raw = r[hmap["do_not_text"]]
+            complaint_raw = r[hmap["complaint_flag"]] if "complaint_flag" in hmap else ""
+            due_raw = r[hmap["recall_due_date"]]
+            input_hash = _digest(pk, phone, do_not_raw, complaint_raw, due_raw, self.window_days)
+            if (prev is not None and prev.input_hash == input_hash and self.today < prev.recheck_on
+                    and (touch_states is None or prev.touch_id in touch_states)):
+                counts["unchanged"] += 1
+                self._tally(prev.planned)
+                continue
+            counts["reprocessed"] += 1
+
+            # BuildQueue
+            do_not = str(do_not_raw).upper() == "TRUE"
+            complaint = str(complaint_raw).upper() == "TRUE"
+            status, recheck_on = compute_recall_status(parse_due_date(due_raw), self.today, self.window_days)
+            if not phone:
+                eligible, reason = False, "NO_PHONE"
+            elif do_not:
+                eligible, reason = False, "DO_NOT_TEXT"
+            elif complaint:
+                eligible, reason = False, "COMPLAINT"
+            elif status not in ("DUE", "OVERDUE"):
+                eligible, reason = False, "NOT_IN_WINDOW"
+            else:
+                eligible, reason = True, ""
+            q_row = [QUEUE_CAMPAIGN, self.touch, pk, phone or "", eligible, reason, due_raw or "", status, do_not, now]
+            queue_hash = _digest(*q_row[:-1])
+            if prev is None or prev.queue_hash != queue_hash:
+                counts["queue_inserted" if prev is None else "queue_updated"] += 1
+                yield {"op": "insert" if prev is None else "update", "sheet": "50_Queue", "key": pk, "row": q_row}
+
+            # CreateTouchesFromQueue
+            tid = prev.touch_id if prev is not None else touch_id(self.practice_id, self.campaign, pk, self.touch)
+            send_status = "READY" if eligible and phone else "SKIPPED"
+            touch_hash = _digest(phone or "", eligible, reason, send_status)
+            self._tally(send_status)
+            cur = touch_states.get(tid) if touch_states is not None else None
+            if cur is None:
+                counts["touches_created"] += 1
+                yield {"op": "insert", "sheet": "60_Touches", "key": tid,
+                       "row": self._new_touch(tid, pk, phone or "", eligible, reason, send_status, now)}
+                cur = send_status
+            elif cur in FROZEN_SEND_STATUSES:
+                counts["touches_frozen"] += 1
+            elif prev is None or prev.touch_hash != touch_hash:
+                changes = {"phone_e164": phone or "", "eligible": eligible, "ineligible_reason": reason,
+                           "planned_at": now, "send_state": send_status, "updated_at": now}
+                if cur in ("READY", "SKIPPED", ""):
+                    changes["send_status"] = send_status
+                    cur = send_status
+                counts["touches_updated"] += 1
+                yield {"op": "update", "sheet": "60_Touches", "key": tid, "set": changes}
+            self.changed[pk] = SnapEntry(input_hash, recheck_on, queue_hash, tid, touch_hash, send_status, cur,
+                                         patient_hash)
+
+        for pk in previous:
+            if pk not in seen:
+                self.deleted.append(pk)
+                counts["queue_deleted"] += 1
+                yield {"op": "delete", "sheet": "50_Queue", "key": pk}
+                yield {"op": "delete", "sheet": "30_Patients", "key": pk}
+
+    def _tally(self, planned: str) -> None:
+        # READY/SKIPPED totals over every queue row, as in the CreateTouches payload.
+        if planned == "READY":
+            self.ready += 1
+        else:
+            self.skipped += 1
+
+    def _new_touch(self, tid, pk, phone, eligible, reason, status, now) -> list:
+        row = [""] * len(self.touch_headers)
+        t = self.tmap
+        for col, value in (("touch_id", tid), ("practice_id", self.practice_id), ("campaign_id", self.campaign),
+                           ("touch_type", self.touch), ("patient_key", pk), ("phone_e164", phone),
+                           ("eligible", eligible), ("ineligible_reason", reason), ("planned_at", now),
+                           ("send_status", status), ("send_state", status), ("dry_run", self.touches_dry_run),
+                           ("click_count", 0), ("preview_count", 0), ("created_at", now), ("updated_at", now)):
+            row[t[col]] = value
+        return row
+
+    def payload(self) -> Dict[str, object]:
+        """The RUN_CREATE_TOUCHES_PASS payload keys plus the incremental counters."""
+        return {
+            "queue_rows": self.counts["patients"],
+            "touches_created": self.counts["touches_created"],
+            "touches_updated": self.counts["touches_updated"],
+            "touches_ready": self.ready,
+            "touches_skipped": self.skipped,
+            "campaign_id": self.campaign,
+            "touch_type": self.touch,
+            **{k: v for k, v in self.counts.items() if k not in ("touches_created", "touches_updated")},
+        }
+
+
+def write_changes(path: str, header: Dict[str, object], changes: Iterator[Dict[str, object]]) -> int:
+    """Header line, then one JSON line per change; replaced atomically. Returns the change count."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".queue_changes.", dir=directory)
+    n = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for change in changes:
+                f.write(json.dumps(change, separators=(",", ":")) + "\n")
+                n += 1
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental BuildQueue/CreateTouches over sheet exports.")
+    parser.add_argument("--patients", required=True, help="30_Patients CSV export")
+    parser.add_argument("--touches", help="Current 60_Touches CSV export (keeps WOULD_SEND/SENT rows frozen); "
+                                          "required once the snapshot has rows, unless --full")
+    parser.add_argument("--practice-id", required=True)
+    parser.add_argument("--campaign", required=True, help="active_campaign_id")
+    parser.add_argument("--touch", default="T1", choices=["T1", "T2"])
+    parser.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS, help="recall_due_window_days")
+    parser.add_argument("--live", action="store_true", help="Create touches with dry_run=FALSE")
+    parser.add_argument("--today", type=date.fromisoformat, help="Run date (YYYY-MM-DD); default today")
+    parser.add_argument("--snapshot", help="Snapshot path (default: <patients csv>.queue_snapshot.sqlite)")
+    parser.add_argument("--out", help="Change file (JSONL); default: <patients csv>.changes.jsonl")
+    parser.add_argument("--full", action="store_true", help="Ignore the snapshot and emit every row")
+    parser.add_argument("--dry-run", action="store_true", help="Count changes only; write nothing")
+    args = parser.parse_args()
+
+    engine = QueueEngine(args.practice_id, args.campaign, args.touch, args.window_days, args.today,
+                         touches_dry_run=not args.live)
+    snapshot = Snapshot(args.snapshot or default_snapshot_path(args.patients), args.practice_id, args.campaign,
+                        args.touch)
+    try:
+        previous = {} if args.full else snapshot.load()
+        if previous and not args.touches:
+            parser.error(f"--touches is required: the snapshot has {len(previous)} patients and only the current "
+                         f"60_Touches export shows which touches are WOULD_SEND/SENT (or use --full)")
+        touch_states = read_touch_states(args.touches) if args.touches else None
+        changes = engine.run(read_sheet_csv(args.patients), previous, touch_states)
+        if args.dry_run:
+            n = sum(1 for _ in changes)
+        else:
+            out = args.out or os.path.splitext(os.path.abspath(args.patients))[0] + ".changes.jsonl"
+            header = {"version": 1, "practice_id": args.practice_id, "campaign": args.campaign, "touch": args.touch,
+                      "today": engine.today.isoformat(), "full": args.full,
+                      "patient_headers": list(PATIENT_FIELDS), "queue_headers": engine.queue_headers,
+                      "touch_headers": engine.touch_headers}
+            n = write_changes(out, header, changes)
+            snapshot.save(engine.changed, engine.deleted, replace=args.full)
+            print(f"Changes written to {out}")
+    finally:
+        snapshot.close()
+
+    print("\n=== QUEUE SUMMARY ===")
+    for key, value in engine.payload().items():
+        print(f"  {key}: {value}")
+    print(f"  changes: {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Delivery-status reconciliation: pull message statuses from Twilio in bulk and emit one
+batched update file, instead of waiting for per-message status callbacks.
+
+Inputs (either or both):
+  --touches  a 60_Touches CSV export; rows with a msg_sid are checked against Twilio and
+             differences become 60_Touches updates computed with WebApp.js
+             handleTwilioStatus_ rules (never downgrade a terminal status; delivered_at /
+             undelivered_at / failed_at set once, from Twilio's date_updated).
+  --ledger   a send ledger (send_ledger.py); `sent` rows not covered by --touches become
+             status ops keyed by msg_sid (apply them like a status callback), and `pending`
+             rows (interrupted run, or a send whose outcome was unknown) are resolved by
+             listing that phone's messages (To=): one created after the attempt means
+             `sent` (with its sid), whatever its status. None means `error` (safe to
+             resend) only once the attempt is older than --pending-grace, which may not be
+             shorter than the Messaging Service validity period (--validity-period): until
+             then a request stuck in a backed-up queue could still surface. A row whose
+             lookup failed stays pending.
+
+Statuses are fetched with the Messages list API, one DateSent day at a time (each day's
+pages in order, days in parallel on --concurrency connections); SIDs the listing did
+not return, or every SID when there are few (--strategy auto/fetch), are fetched one by
+one on the same bounded pool. Pending phones are listed with To= on the same pool (a
+DateSent listing misses messages still queued or failed before sending: they have no
+date_sent). 429/5xx are retried by the transport.
+
+The update file is JSON lines like queue_engine.py's change file: a header, then
+    {"op": "update", "sheet": "60_Touches", "key": touch_id, "msg_sid": ..., "set": {...}}
+    {"op": "status", "sheet": "60_Touches", "msg_sid": ..., "status": ..., "error_code": ..., "at": ...}
+    {"op": "update", "sheet": "ledger", "key": [campaign, touch, phone], "set": {"state": ..., ...}}
+
+Usage:
+    python3 reconcile.py --touches touches.csv --out status_updates.jsonl
+    python3 reconcile.py --ledger list.ledger.sqlite --apply-ledger
+    python3 reconcile.py --touches touches.csv --ledger list.ledger.sqlite --api-base http://127.0.0.1:8765
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from queue_engine import read_sheet_csv, write_changes
+from send_engine import TWILIO_API_BASE, RestMessages
+from send_ledger import ERROR, PENDING, SENT, SendLedger, ledger_scopes
+from transport import HttpTransport, RetryPolicy, TransportError
+from webhook_standin import TERMINAL_STATUSES, now_iso
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_LIST_THRESHOLD = 200
+DEFAULT_VALIDITY_PERIOD_S = 36000  # Twilio Messaging Service ValidityPeriod default (and maximum)
+CLOCK_SKEW = timedelta(minutes=2)
+
+TOUCH_STATUS_COLUMNS = ("msg_sid", "touch_id", "sent_at", "twilio_message_status", "error_code", "delivered_at",
+                        "undelivered_at", "failed_at", "send_state", "send_status")
+STATUS_TIME_COLUMNS = {"delivered": "delivered_at", "undelivered": "undelivered_at", "failed": "failed_at"}
+
+# One message we want a status for. `key` is the touch_id (touches) or (campaign, touch, phone) (ledger).
+Target = namedtuple("Target", ["sid", "day", "source", "key", "current"])
+Pending = namedtuple("Pending", ["campaign", "touch", "phone", "since"])
+
+
+def parse_time(value) -> Optional[datetime]:
+    """ISO-8601 (sheet / ledger) or RFC 2822 (Twilio) -> aware UTC datetime."""
+    s = str(value or "").strip()
+    if not s:
+        return None
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            dt = parsedate_to_datetime(s)
+        except (TypeError, ValueError):
+            return None
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+
+
+def iso_ms(dt: datetime) -> str:
+    """Same shape as new Date().toISOString()."""
+    return dt.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def status_changes(current: Dict[str, str], status: str, error_code, at: str) -> Dict[str, object]:
+    """The 60_Touches columns handleTwilioStatus_ would change for this status; {} when none would."""
+    status = str(status or "").lower()
+    old = str(current.get("twilio_message_status") or "").lower()
+    if old and old in TERMINAL_STATUSES and status not in TERMINAL_STATUSES:
+        return {}  # never downgrade terminal
+    changes: Dict[str, object] = {}
+
+    def put(col, value):
+        if col in current and str(current[col]) != str(value):
+            changes[col] = value
+
+    put("twilio_message_status", status)
+    if error_code:
+        put("error_code", str(error_code))
+    col = STATUS_TIME_COLUMNS.get(status)
+    if col and col in current and not current[col]:
+        changes[col] = at
+    if status == "delivered":
+        put("send_state", "SENT")
+        if current.get("send_status") == "WOULD_SEND":
+            changes["send_status"] = "SENT"
+    if changes:
+        changes["updated_at"] = now_iso()
+    return changes
+
+
+def _day(dt: Optional[datetime]) -> Optional[str]:
+    return dt.date().isoformat() if dt else None
+
+
+def read_touch_targets(path: str) -> List[Target]:
+    """60_Touches rows that have a msg_sid, with the status columns they currently hold."""
+    targets = []
+    for hmap, row in read_sheet_csv(path):
+        current = {col: (row[hmap[col]] if hmap[col] < len(row) else "") for col in TOUCH_STATUS_COLUMNS if col in hmap}
+        sid = current.get("msg_sid", "")
+        if not sid:
+            continue
+        targets.append(Target(sid, _day(parse_time(current.get("sent_at"))), "touches",
+                              current.get("touch_id", ""), current))
+    return targets
+
+
+def read_ledger(path: str, campaign: str = "", touch: str = "") -> Tuple[List[Target], List[Pending]]:
+    """`sent` ledger rows as targets and `pending` rows to resolve, across the selected scopes."""
+    targets, pending = [], []
+    for scope_campaign, scope_touch in ledger_scopes(path):
+        if (campaign and scope_campaign != campaign) or (touch and scope_touch != touch):
+            continue
+        ledger = SendLedger(path, scope_campaign, scope_touch, readonly=True)
+        for phone, entry in ledger.items():
+            at = parse_time(entry.updated_at)
+            if entry.state == SENT and entry.sid:
+                targets.append(Target(entry.sid, _day(at), "ledger", (scope_campaign, scope_touch, phone), None))
+            elif entry.state == PENDING:
+                pending.append(Pending(scope_campaign, scope_touch, phone, at))
+        ledger.close()
+    return targets, pending
+
+
+class StatusPuller:
+    """Bulk status fetch: per-day paginated listing plus per-SID fetches, on a bounded pool."""
+
+    def __init__(self, messages: RestMessages, concurrency: int = DEFAULT_CONCURRENCY,
+                 page_size: int = DEFAULT_PAGE_SIZE):
+        self.messages = messages
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.listed = 0
+        self.list_calls = 0
+        self.fetched = 0
+        self.not_found: Set[str] = set()
+        self.errors: Dict[str, str] = {}
+        self.failed_phones: Set[str] = set()
+
+    def _list_day(self, day: str, wanted: Set[str]):
+        found, n = {}, 0
+        for msg in self.messages.list(self.page_size, DateSent=day):
+            n += 1
+            if msg.get("sid") in wanted:
+                found[msg["sid"]] = msg
+        return found, n
+
+    def _list_phone(self, phone: str) -> List[Dict]:
+        return list(self.messages.list(self.page_size, To=phone))
+
+    def pull(self, sids: Set[str], list_days: Iterable[str], phones: Set[str] = frozenset()
+             ) -> Tuple[Dict[str, Dict], Dict[str, List[Dict]]]:
+        """Returns (sid -> message, phone -> every message to that phone)."""
+        found: Dict[str, Dict] = {}
+        by_phone: Dict[str, List[Dict]] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._list_day, day, sids): day for day in sorted(set(list_days))}
+            phone_futures = {pool.submit(self._list_phone, phone): phone for phone in sorted(phones)}
+            for fut in as_completed(futures):
+                try:
+                    day_found, n = fut.result()
+                except (RuntimeError, TransportError) as e:
+                    self.errors[f"list {futures[fut]}"] = str(e)
+                    continue
+                self.list_calls += 1
+                self.listed += n
+                found.update(day_found)
+            for fut in as_completed(phone_futures):
+                phone = phone_futures[fut]
+                try:
+                    by_phone[phone] = fut.result()
+                except (RuntimeError, TransportError) as e:
+                    self.failed_phones.add(phone)
+                    self.errors[f"list To={phone}"] = str(e)
+                    continue
+                self.list_calls += 1
+                self.listed += len(by_phone[phone])
+
+            missing = sorted(sids - set(found))
+            futures = {pool.submit(self.messages.fetch, sid): sid for sid in missing}
+            for fut in as_completed(futures):
+                sid = futures[fut]
+                try:
+                    msg = fut.result()
+                except (RuntimeError, TransportError) as e:
+                    self.errors[sid] = str(e)
+                    continue
+                self.fetched += 1
+                if msg is None:
+                    self.not_found.add(sid)
+                else:
+                    found[sid] = msg
+        return found, by_phone
+
+
+def _status_time(msg: Dict) -> str:
+    dt = parse_time(msg.get("date_updated") or msg.get("date_sent") or msg.get("date_created"))
+    return iso_ms(dt) if dt else now_iso()
+
+
+def reconcile(targets: List[Target], pending: List[Pending], found: Dict[str, Dict],
+              by_phone: Dict[str, List[Dict]], grace: timedelta, counts: Counter):
+    """Yields the update ops; tallies what happened in `counts`.
+
+    `by_phone` holds the To= listing of every pending phone; a phone missing from it (its
+    lookup failed) is never marked `error`.
+    """
+    covered = {t.sid for t in targets if t.source == "touches"}
+    for t in targets:
+        if t.source == "ledger" and t.sid in covered:
+            continue
+        msg = found.get(t.sid)
+        if msg is None:
+            counts["missing"] += 1
+            continue
+        status = str(msg.get("status") or "").lower()
+        counts[f"status_{status}"] += 1
+        if t.source == "touches":
+            changes = status_changes(t.current, status, msg.get("error_code"), _status_time(msg))
+            if changes:
+                counts["touch_updates"] += 1
+                yield {"op": "update", "sheet": "60_Touches", "key": t.key, "msg_sid": t.sid, "set": changes}
+            else:
+                counts["unchanged"] += 1
+        else:
+            counts["status_ops"] += 1
+            yield {"op": "status", "sheet": "60_Touches", "msg_sid": t.sid, "status": status,
+                   "error_code": msg.get("error_code") or "", "at": _status_time(msg),
+                   "campaign": t.key[0], "touch": t.key[1]}
+
+    now = datetime.now(timezone.utc)
+    for p in pending:
+        since = (p.since or now) - CLOCK_SKEW
+        msgs = sorted((m for m in by_phone.get(p.phone, ()) if (parse_time(m.get("date_created")) or now) >= since),
+                      key=lambda m: parse_time(m.get("date_created")) or now)
+        key = [p.campaign, p.touch, p.phone]
+        if msgs:
+            counts["pending_sent"] += 1
+            yield {"op": "update", "sheet": "ledger", "key": key, "set": {"state": SENT, "sid": msgs[0]["sid"]}}
+        elif p.phone in by_phone and p.since is not None and now - p.since >= grace:
+            counts["pending_error"] += 1
+            yield {"op": "update", "sheet": "ledger", "key": key,
+                   "set": {"state": ERROR, "error": "reconcile: no Twilio message after the pending attempt"}}
+        else:
+            counts["pending_unresolved"] += 1
+
+
+def apply_ledger(path: str, ops: List[Dict]) -> int:
+    """Writes resolved pending rows back through SendLedger (attempts stay audited)."""
+    ledgers: Dict[Tuple[str, str], SendLedger] = {}
+    n = 0
+    try:
+        for op in ops:
+            if op["sheet"] != "ledger":
+                continue
+            campaign, touch, phone = op["key"]
+            ledger = ledgers.get((campaign, touch))
+            if ledger is None:
+                ledger = ledgers[(campaign, touch)] = SendLedger(path, campaign, touch)
+            if op["set"]["state"] == SENT:
+                ledger.succeed(phone, op["set"]["sid"])
+            else:
+                ledger.fail(phone, op["set"]["error"])
+            n += 1
+    finally:
+        for ledger in ledgers.values():
+            ledger.close()
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-pull Twilio message statuses and emit one update file.")
+    parser.add_argument("--touches", help="60_Touches CSV export")
+    parser.add_argument("--ledger", help="Send ledger (SQLite) written by twilio_send_script.py")
+    parser.add_argument("--campaign", default="", help="Only this ledger campaign")
+    parser.add_argument("--touch", default="", help="Only this ledger touch (t1/t2)")
+    parser.add_argument("--out", help="Update file (JSONL); default: next to the first input, *.status_updates.jsonl")
+    parser.add_argument("--apply-ledger", action="store_true", help="Also write resolved pending rows to --ledger")
+    parser.add_argument("--dry-run", action="store_true", help="Count only; write nothing")
+    parser.add_argument("--strategy", choices=["auto", "list", "fetch"], default="auto",
+                        help=f"list = page through each sent day; fetch = one GET per SID; auto = list from "
+                             f"{DEFAULT_LIST_THRESHOLD} SIDs up")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Parallel API requests")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Messages per list page (max 1000)")
+    parser.add_argument("--validity-period", type=int, default=DEFAULT_VALIDITY_PERIOD_S,
+                        help="The Messaging Service ValidityPeriod in seconds (Twilio default 36000)")
+    parser.add_argument("--pending-grace", type=float,
+                        help="Minutes before a pending ledger row with no Twilio message counts as failed "
+                             "(default and minimum: the validity period)")
+    parser.add_argument("--api-base", default=os.getenv("TWILIO_API_BASE", TWILIO_API_BASE))
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+
+    if not args.touches and not args.ledger:
+        parser.error("give --touches and/or --ledger")
+    if args.apply_ledger and not args.ledger:
+        parser.error("--apply-ledger needs --ledger")
+    validity_min = args.validity_period / 60.0
+    if args.pending_grace is None:
+        args.pending_grace = validity_min
+    elif args.pending_grace < validity_min:
+        parser.error(f"--pending-grace {args.pending_grace:g} is shorter than the validity period "
+                     f"({validity_min:g} min): a queued message could still be sent after the row is released")
+    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+    if not account_sid or not auth_token:
+        print("ERROR: TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN must be set as env vars.")
+        sys.exit(1)
+
+    targets: List[Target] = read_touch_targets(args.touches) if args.touches else []
+    pending: List[Pending] = []
+    if args.ledger:
+        ledger_targets, pending = read_ledger(args.ledger, args.campaign, args.touch)
+        targets += ledger_targets
+    sids = {t.sid for t in targets}
+    days: Set[str] = set()
+    if args.strategy == "list" or (args.strategy == "auto" and len(sids) >= DEFAULT_LIST_THRESHOLD):
+        days.update(t.day for t in targets if t.day)
+    # a message created just before midnight can be sent just after it
+    days.update((datetime.fromisoformat(d) + timedelta(days=1)).date().isoformat() for d in list(days))
+    print(f"Reconciling {len(sids)} messages ({len(pending)} pending ledger rows, grace {args.pending_grace:g} min) "
+          f"over {len(days)} listed days with {args.concurrency} connections")
+
+    transport = HttpTransport(pool_size=args.concurrency, timeout=args.timeout, retry=RetryPolicy(max_retries=5))
+    puller = StatusPuller(RestMessages(account_sid, auth_token, api_base=args.api_base, transport=transport),
+                          args.concurrency, args.page_size)
+    start = time.perf_counter()
+    found, by_phone = puller.pull(sids, days, {p.phone for p in pending})
+    pulled = time.perf_counter() - start
+    api = transport.stats()
+    transport.close()
+
+    counts: Counter = Counter()
+    ops = list(reconcile(targets, pending, found, by_phone, timedelta(minutes=args.pending_grace), counts))
+
+    if not args.dry_run:
+        first = args.touches or args.ledger
+        out = args.out or os.path.splitext(os.path.abspath(first))[0] + ".status_updates.jsonl"
+        header = {"version": 1, "kind": "status_reconcile", "generated_at": now_iso(), "account_sid": account_sid,
+                  "touches": args.touches or "", "ledger": args.ledger or "", "days": sorted(days)}
+        write_changes(out, header, iter(ops))
+        print(f"Updates written to {out}")
+        if args.apply_ledger:
+            print(f"Ledger rows resolved: {apply_ledger(args.ledger, ops)}")
+
+    print("\n=== RECONCILE SUMMARY ===")
+    print(f"Messages: {len(sids)}  found: {len(found)}  not found: {len(puller.not_found)}  "
+          f"request errors: {len(puller.errors)}")
+    print(f"API: {puller.list_calls} days/phones listed ({puller.listed} messages), {puller.fetched} single fetches, "
+          f"{api['latency']['count']} requests in {pulled:.2f}s; retries={api['retries']}")
+    for key, value in sorted(counts.items()):
+        print(f"  {key}: {value}")
+    print(f"  ops: {len(ops)}")
+    for what, err in list(puller.errors.items())[:5]:
+        print(f"  ERROR {what}: {err}")
+
+
+if __name__ == "__main__":
+    main()
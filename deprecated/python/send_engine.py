@@ -0,0 +1,269 @@
+# send_engine.py
+"""
+Concurrent send stage for twilio_send_script.py.
+
+- TokenBucket: messages-per-second limiter, one per Messaging Service SID.
+- SharedTokenBucket: the same limiter held in shared memory, so worker processes
+  (orchestrator.py) draw from one global ceiling.
+- OrderedDispatcher: bounded thread pool whose output lines are released in
+  submission (row) order, so SENT/ERROR/SKIP lines read the same as a serial run.
+- RestMessages: stdlib stand-in for `Client(...).messages` (create, fetch, paged list)
+  over the pooled transport (transport.py) to api.twilio.com or any compatible base URL.
+"""
+
+import base64
+import json
+import multiprocessing
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+from urllib import parse
+
+from transport import HttpTransport
+
+DEFAULT_WORKERS = 4
+DEFAULT_RATE_MPS = 10.0
+TWILIO_API_BASE = "https://api.twilio.com"
+
+MessageInstance = namedtuple("MessageInstance", ["sid", "status"])
+
+
+class TwilioHTTPError(RuntimeError):
+    """A Twilio API call answered with an HTTP error status (kept on `.status`)."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"HTTP {status}: {detail}")
+        self.status = status
+
+
+def send_rejected(exc: BaseException) -> bool:
+    """
+    True when a failed create() certainly did not create a message: Twilio answered 4xx
+    (the SDK's TwilioRestException carries `.status` too) or the request never left the
+    process. A timeout, reset or 5xx after the request was written may still have sent it.
+    """
+    status = getattr(exc, "status", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return True
+    return bool(getattr(exc, "unsent", False))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `rate` tokens/sec refill up to `burst`; rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate or 0)
+        self.burst = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedTokenBucket:
+    """
+    TokenBucket whose state lives in shared memory; create it in the parent and hand it
+    to worker processes (Pool initializer / Process args) so they share one rate.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self.rate = float(rate or 0)
+        self.burst = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = ctx.Value("d", self.burst, lock=False)
+        self._updated = ctx.Value("d", time.time(), lock=False)
+        self._lock = ctx.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                # wall clock: monotonic clocks are not comparable across processes everywhere
+                now = time.time()
+                tokens = min(self.burst, self._tokens.value + max(0.0, now - self._updated.value) * self.rate)
+                self._updated.value = now
+                if tokens >= 1:
+                    self._tokens.value = tokens - 1
+                    return
+                self._tokens.value = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiters:
+    """Lazily creates one TokenBucket per Messaging Service SID; `ceiling` is shared by all of them."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, ceiling=None):
+        self.rate = rate
+        self.burst = burst
+        self.ceiling = ceiling
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def for_service(self, messaging_service_sid: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(messaging_service_sid)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[messaging_service_sid] = bucket
+            return bucket
+
+
+class OrderedDispatcher:
+    """
+    Runs send calls on a bounded pool and hands results back on the caller's thread in row order.
+
+    `emit(line)` queues a plain line (SKIP, DRY RUN, ...) behind any in-flight sends so stdout
+    stays in file order. `submit(fn, on_done, ...)` runs fn on a worker; `on_done(result, exc)`
+    is invoked on the calling thread once every earlier entry has been released, so counters
+    need no locking. At most `window` entries are held in memory.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, window: Optional[int] = None, out: Callable = print):
+        self.workers = max(1, int(workers or 1))
+        self.window = max(1, int(window or self.workers * 4))
+        self._out = out
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending: Deque[Tuple[Optional[object], object]] = deque()
+
+    def emit(self, line: str) -> None:
+        if not self._pending:
+            self._out(line)
+            return
+        self._pending.append((None, line))
+
+    def submit(self, fn: Callable, on_done: Callable, *args, **kwargs) -> None:
+        self._pending.append((self._pool.submit(fn, *args, **kwargs), on_done))
+        while len(self._pending) > self.window:
+            self._release_head()
+        self._drain(block=False)
+
+    def close(self) -> None:
+        try:
+            self._drain(block=True)
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _drain(self, block: bool) -> None:
+        while self._pending:
+            fut, _ = self._pending[0]
+            if fut is not None and not block and not fut.done():
+                return
+            self._release_head()
+
+    def _release_head(self) -> None:
+        fut, item = self._pending.popleft()
+        if fut is None:
+            self._out(item)
+            return
+        exc = fut.exception()
+        item(None if exc else fut.result(), exc)
+
+
+def rate_limited(send: Callable, limiters: RateLimiters) -> Callable:
+    """Wraps a `messages.create`-style callable so each call first takes a token for its service."""
+
+    def _send(**kwargs):
+        limiters.for_service(kwargs.get("messaging_service_sid") or "").acquire()
+        if limiters.ceiling is not None:
+            limiters.ceiling.acquire()
+        return send(**kwargs)
+
+    return _send
+
+
+class RestMessages:
+    """
+    Minimal `client.messages` replacement (create, fetch, list) for Twilio-compatible endpoints,
+    sent through a pooled keep-alive HttpTransport. Point `api_base` at a local fake
+    server to exercise the send path without touching Twilio.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, api_base: str = TWILIO_API_BASE,
+                 transport: Optional[HttpTransport] = None):
+        self.account_sid = account_sid
+        self.api_base = (api_base or TWILIO_API_BASE).rstrip("/")
+        self.transport = transport or HttpTransport()
+        creds = f"{account_sid}:{auth_token}".encode("utf-8")
+        self._auth = "Basic " + base64.b64encode(creds).decode("ascii")
+
+    @property
+    def url(self) -> str:
+        return f"{self.api_base}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+
+    def create(self, *, to: str, body: str, messaging_service_sid: Optional[str] = None,
+               shorten_urls: bool = False, status_callback: Optional[str] = None) -> MessageInstance:
+        form = {"To": to, "Body": body}
+        if messaging_service_sid:
+            form["MessagingServiceSid"] = messaging_service_sid
+        if shorten_urls:
+            form["ShortenUrls"] = "true"
+        if status_callback:
+            form["StatusCallback"] = status_callback
+        resp = self.transport.request(
+            "POST",
+            self.url,
+            body=parse.urlencode(form).encode("utf-8"),
+            headers={
+                "Authorization": self._auth,
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Accept": "application/json",
+            },
+        )
+        if resp.status >= 400:
+            detail = resp.body.decode("utf-8", errors="replace")
+            raise TwilioHTTPError(resp.status, detail)
+        payload = json.loads(resp.body.decode("utf-8") or "{}")
+        return MessageInstance(payload.get("sid", ""), payload.get("status", ""))
+
+    def fetch(self, sid: str) -> Optional[Dict[str, object]]:
+        """One message resource as JSON, or None when Twilio answers 404."""
+        return self._get(f"{self.api_base}/2010-04-01/Accounts/{self.account_sid}/Messages/{parse.quote(sid)}.json",
+                         missing_ok=True)
+
+    def list(self, page_size: int = 1000, **filters: str) -> Iterator[Dict[str, object]]:
+        """
+        Every message matching `filters` (e.g. {"DateSent": "2025-01-31"}), newest first,
+        following next_page_uri; pages are fetched one at a time as the caller iterates.
+        """
+        query = dict(filters, PageSize=str(page_size))
+        url = self.url + "?" + parse.urlencode(query)
+        while url:
+            page = self._get(url)
+            yield from page.get("messages") or ()
+            next_uri = page.get("next_page_uri")
+            url = f"{self.api_base}{next_uri}" if next_uri else ""
+
+    def _get(self, url: str, missing_ok: bool = False) -> Optional[Dict[str, object]]:
+        resp = self.transport.request("GET", url, headers={"Authorization": self._auth, "Accept": "application/json"})
+        if resp.status == 404 and missing_ok:
+            return None
+        if resp.status >= 400:
+            detail = resp.body.decode("utf-8", errors="replace")
+            raise TwilioHTTPError(resp.status, detail)
+        return json.loads(resp.body.decode("utf-8") or "{}")
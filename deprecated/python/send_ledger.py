@@ -0,0 +1,170 @@
+# send_ledger.py
+"""
+Durable send ledger for twilio_send_script.py (SQLite, WAL mode).
+
+One row per (campaign, touch, phone) holds the latest state:
+  pending -> written (and committed) before the Twilio call is made
+  sent    -> Twilio accepted the message; sid recorded
+  error   -> Twilio rejected it; safe to retry on the next run
+Every attempt is also appended to `attempts` for audit.
+
+A rerun loads the campaign/touch states into memory once and skips `sent` rows in
+O(1). `pending` rows mean the process died mid-call, or the call failed after the
+request was written (timeout, reset, 5xx): the message may or may not have gone out,
+so they are skipped too until reconciled against Twilio.
+"""
+
+import os
+import sqlite3
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LedgerEntry = namedtuple("LedgerEntry", ["state", "sid", "error", "attempts", "row_idx", "updated_at"])
+
+PENDING = "pending"
+SENT = "sent"
+ERROR = "error"
+BLOCKING_STATES = {PENDING, SENT}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    campaign   TEXT NOT NULL,
+    touch      TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    state      TEXT NOT NULL,
+    sid        TEXT,
+    error      TEXT,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    row_idx    INTEGER,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (campaign, touch, phone)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS attempts (
+    id         INTEGER PRIMARY KEY,
+    campaign   TEXT NOT NULL,
+    touch      TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    row_idx    INTEGER,
+    state      TEXT NOT NULL,
+    sid        TEXT,
+    error      TEXT,
+    at         TEXT NOT NULL
+);
+"""
+
+
+def default_ledger_path(csv_path: str) -> str:
+    """Ledger lives next to the send list (outside the repo, like the CSV itself)."""
+    return os.path.splitext(os.path.abspath(csv_path))[0] + ".ledger.sqlite"
+
+
+def ledger_scopes(path: str) -> List[Tuple[str, str]]:
+    """Every (campaign, touch) recorded in the ledger at `path`."""
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return [tuple(r) for r in db.execute("SELECT DISTINCT campaign, touch FROM sends ORDER BY 1, 2")]
+    finally:
+        db.close()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SendLedger:
+    """Ledger scoped to one campaign + touch. Use from a single thread (the dispatcher's caller)."""
+
+    def __init__(self, path: str, campaign: str, touch: str, readonly: bool = False):
+        self.path = path
+        self.campaign = campaign
+        self.touch = touch
+        self.readonly = readonly
+        if readonly:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            self._db = sqlite3.connect(path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        self._entries: Dict[str, LedgerEntry] = {}
+        for phone, *rest in self._db.execute(
+            "SELECT phone, state, sid, error, attempts, row_idx, updated_at FROM sends WHERE campaign=? AND touch=?",
+            (campaign, touch),
+        ):
+            self._entries[phone] = LedgerEntry(*rest)
+
+    @classmethod
+    def open_for(cls, path: str, campaign: str, touch: str, dry_run: bool = False) -> Optional["SendLedger"]:
+        """Dry runs only read an existing ledger; they never create one."""
+        if dry_run:
+            return cls(path, campaign, touch, readonly=True) if os.path.exists(path) else None
+        return cls(path, campaign, touch)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def items(self) -> Iterator[Tuple[str, LedgerEntry]]:
+        """(phone, entry) for every phone in this campaign + touch."""
+        return iter(list(self._entries.items()))
+
+    def lookup(self, phone: str) -> Optional[LedgerEntry]:
+        return self._entries.get(phone)
+
+    def blocks(self, phone: str) -> Optional[LedgerEntry]:
+        """Returns the entry when it means this phone must not be sent again."""
+        entry = self._entries.get(phone)
+        return entry if entry is not None and entry.state in BLOCKING_STATES else None
+
+    def begin(self, phone: str, row_idx: int) -> None:
+        self._write(phone, row_idx, PENDING, None, None, bump=True)
+
+    def succeed(self, phone: str, sid: str) -> None:
+        self._write(phone, None, SENT, sid, None)
+
+    def fail(self, phone: str, error: str) -> None:
+        self._write(phone, None, ERROR, None, error)
+
+    def unresolved(self, phone: str, error: str) -> None:
+        """The call failed but Twilio may have created the message: stays pending (audited)."""
+        self._write(phone, None, PENDING, None, error)
+
+    def counts(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for entry in self._entries.values():
+            out[entry.state] = out.get(entry.state, 0) + 1
+        return out
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _write(self, phone: str, row_idx: Optional[int], state: str, sid: Optional[str],
+               error: Optional[str], bump: bool = False) -> None:
+        if self.readonly:
+            raise RuntimeError("ledger opened read-only")
+        prev = self._entries.get(phone)
+        attempts = (prev.attempts if prev else 0) + (1 if bump else 0)
+        row_idx = row_idx if row_idx is not None else (prev.row_idx if prev else None)
+        now = _now()
+        with self._db:
+            self._db.execute(
+                "INSERT INTO sends (campaign, touch, phone, state, sid, error, attempts, row_idx, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (campaign, touch, phone) DO UPDATE SET state=excluded.state, sid=excluded.sid, "
+                "error=excluded.error, attempts=excluded.attempts, row_idx=excluded.row_idx, "
+                "updated_at=excluded.updated_at",
+                (self.campaign, self.touch, phone, state, sid, error, attempts, row_idx, now),
+            )
+            self._db.execute(
+                "INSERT INTO attempts (campaign, touch, phone, row_idx, state, sid, error, at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.campaign, self.touch, phone, row_idx, state, sid, error, now),
+            )
+        self._entries[phone] = LedgerEntry(state, sid, error, attempts, row_idx, now)
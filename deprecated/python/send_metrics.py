@@ -0,0 +1,250 @@
+# send_metrics.py
+"""
+Run instrumentation for twilio_send_script.py.
+
+- Stage timings: `timed(name, iterable)` wraps a pipeline generator and records
+  per-row *self* time (time spent in that stage, minus the stages upstream of it).
+- API calls: `timed_call(send)` times every Twilio request (both transports) into
+  a latency histogram; `error(exc)` counts failures by Twilio error code.
+- Phases: wall time for plan/commit, overall rows/sec and sends/sec.
+
+`write(path)` emits JSON, or Prometheus text exposition when the path ends in
+.prom; `start_reporter(path, every)` rewrites that file every N seconds while the
+run is in progress. Stdlib only.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from transport import LatencyHistogram
+
+# Per-row stage buckets (ms): rows cost microseconds, so the API buckets are far too coarse.
+ROW_BUCKETS_MS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 50, 250, 1000)
+
+PROM_PREFIX = "recallbridge_send"
+
+_HTTP_ERROR = re.compile(r"^HTTP (\d{3}):\s*(.*)$", re.S)
+
+
+def error_code(exc: BaseException) -> str:
+    """Twilio error code for an exception from either transport (SDK `.code`, or the HTTP body)."""
+    code = getattr(exc, "code", None)
+    if code:
+        return str(code)
+    m = _HTTP_ERROR.match(str(exc))
+    if m:
+        try:
+            body_code = json.loads(m.group(2)).get("code")
+        except (ValueError, AttributeError):
+            body_code = None
+        return str(body_code) if body_code else f"http_{m.group(1)}"
+    return type(exc).__name__
+
+
+class StageTimer:
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.seconds = 0.0
+        self.per_row = LatencyHistogram(ROW_BUCKETS_MS)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "rows": self.rows,
+            "seconds": round(self.seconds, 6),
+            "us_per_row": round(self.seconds / self.rows * 1e6, 3) if self.rows else 0.0,
+            "rows_per_sec": round(self.rows / self.seconds, 1) if self.seconds else 0.0,
+            "per_row_ms": self.per_row.snapshot(),
+        }
+
+
+class _Timed:
+    """Iterator wrapper charging each next() to its stage, net of nested (upstream) stages."""
+
+    __slots__ = ("_it", "_stage", "_metrics")
+
+    def __init__(self, it: Iterator, stage: StageTimer, metrics: "RunMetrics"):
+        self._it = it
+        self._stage = stage
+        self._metrics = metrics
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        m = self._metrics
+        outer = m._nested
+        m._nested = 0.0
+        start = time.perf_counter()
+        try:
+            item = next(self._it)
+        except StopIteration:
+            elapsed = time.perf_counter() - start
+            self._stage.seconds += elapsed - m._nested
+            m._nested = outer + elapsed
+            raise
+        elapsed = time.perf_counter() - start
+        own = elapsed - m._nested
+        m._nested = outer + elapsed
+        stage = self._stage
+        stage.rows += 1
+        stage.seconds += own
+        stage.per_row.observe(own * 1000.0)
+        return item
+
+
+class RunMetrics:
+    """Collects stage/API/phase metrics for one run. Stage wrappers run on the main thread only."""
+
+    def __init__(self, **labels: str):
+        self.labels = {k: str(v) for k, v in labels.items() if v}
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.stages: Dict[str, StageTimer] = {}
+        self.phases: Dict[str, float] = {}
+        self.api = LatencyHistogram()
+        self.errors: Dict[str, int] = {}
+        self.sent = 0
+        self.transport: Optional[Dict[str, object]] = None
+        self._nested = 0.0
+        self._reporter: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # -- collection -------------------------------------------------------
+
+    def stage(self, name: str) -> StageTimer:
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = self.stages[name] = StageTimer(name)
+        return timer
+
+    def timed(self, name: str, iterable: Iterable) -> Iterator:
+        return _Timed(iter(iterable), self.stage(name), self)
+
+    def timed_call(self, fn: Callable) -> Callable:
+        """Wraps a send callable so each call's wall time lands in the API histogram (thread-safe)."""
+        api = self.api
+
+        def _call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                api.observe((time.perf_counter() - start) * 1000.0)
+
+        return _call
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def error(self, exc: BaseException) -> None:
+        code = error_code(exc)
+        self.errors[code] = self.errors.get(code, 0) + 1
+
+    def success(self) -> None:
+        self.sent += 1
+
+    # -- reporting --------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, object]:
+        elapsed = time.perf_counter() - self._t0
+        rows = max((s.rows for s in self.stages.values()), default=0)
+        attempts = self.sent + sum(self.errors.values())
+        return {
+            "labels": self.labels,
+            "started_at": self.started,
+            "elapsed_s": round(elapsed, 3),
+            "rows": rows,
+            "rows_per_sec": round(rows / elapsed, 1) if elapsed else 0.0,
+            "sent": self.sent,
+            "sends_per_sec": round(self.sent / elapsed, 2) if elapsed else 0.0,
+            "errors": sum(self.errors.values()),
+            "error_rate": round(sum(self.errors.values()) / attempts, 4) if attempts else 0.0,
+            "errors_by_code": dict(self.errors),
+            "phases_s": {k: round(v, 6) for k, v in self.phases.items()},
+            "stages": {name: s.snapshot() for name, s in self.stages.items()},
+            "api_latency_ms": self.api.snapshot(),
+            "transport": self.transport,
+        }
+
+    def prometheus(self) -> str:
+        snap = self.snapshot()
+        base = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(self.labels.items()))
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            full = f"{PROM_PREFIX}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for suffix, extra, value in samples:
+                labels = ",".join(x for x in (base, extra) if x)
+                lines.append(f"{full}{suffix}{{{labels}}} {value}" if labels else f"{full}{suffix} {value}")
+
+        metric("elapsed_seconds", "gauge", "Wall time since the run started.", [("", "", snap["elapsed_s"])])
+        metric("rows_total", "counter", "Rows read from the send list.", [("", "", snap["rows"])])
+        metric("sent_total", "counter", "Messages accepted by Twilio.", [("", "", self.sent)])
+        metric("errors_total", "counter", "Failed sends by Twilio error code.",
+               [("", f'code="{_escape(c)}"', n) for c, n in sorted(self.errors.items())])
+        metric("stage_seconds_total", "counter", "Self time spent per pipeline stage.",
+               [("", f'stage="{n}"', round(s.seconds, 6)) for n, s in self.stages.items()])
+        metric("stage_rows_total", "counter", "Rows through each pipeline stage.",
+               [("", f'stage="{n}"', s.rows) for n, s in self.stages.items()])
+        metric("phase_seconds", "gauge", "Wall time per run phase.",
+               [("", f'phase="{n}"', round(v, 6)) for n, v in self.phases.items()])
+
+        hist = self.api
+        with hist._lock:
+            counts = list(hist.counts)
+            total_ms, count = hist.total_ms, hist.count
+        samples, cum = [], 0
+        for bound, c in zip(hist.bounds, counts):
+            cum += c
+            samples.append(("_bucket", f'le="{bound / 1000.0:g}"', cum))
+        samples.append(("_bucket", 'le="+Inf"', count))
+        samples.append(("_sum", "", round(total_ms / 1000.0, 6)))
+        samples.append(("_count", "", count))
+        metric("api_latency_seconds", "histogram", "Twilio API call latency.", samples)
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Atomically writes the report (Prometheus text for *.prom, JSON otherwise)."""
+        data = self.prometheus() if path.endswith(".prom") else json.dumps(self.snapshot(), indent=2) + "\n"
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def start_reporter(self, path: str, every: float) -> None:
+        """Rewrites `path` every `every` seconds until stop_reporter()."""
+        if every <= 0 or self._reporter is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(every):
+                try:
+                    self.write(path)
+                except (OSError, RuntimeError):
+                    pass  # a torn snapshot mid-run is not worth failing the send over
+
+        self._reporter = threading.Thread(target=_loop, name="send-metrics", daemon=True)
+        self._reporter.start()
+
+    def stop_reporter(self) -> None:
+        if self._reporter is not None:
+            self._stop.set()
+            self._reporter.join()
+            self._reporter = None
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
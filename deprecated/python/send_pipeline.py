@@ -0,0 +1,292 @@
+# send_pipeline.py
+"""
+Single-pass streaming pipeline for twilio_send_script.py:
+
+    read_rows -> normalize -> evaluate -> render -> (plan) -> send
+
+Each stage is a generator, so the CSV is parsed exactly once and memory stays flat
+regardless of file size. Header checks, blank/duplicate counts and the preview are
+collected by CsvStats while rows stream past. A plan (one JSON line per row) can be
+spooled to disk and committed later without re-reading the CSV.
+"""
+
+import csv
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote_plus
+
+from patient_index import normalize_e164
+from templates import PRACTICE_NAME, render_message
+from timestamps import TimestampColumns
+
+TRUEY = {"true", "1", "yes", "y", "t"}
+WORKABLE_STATUSES = {"", "new", "calling", "lvm", "texted"}
+STRONG_STATUSES = {"booked", "closed", "wrong_number", "dnd"}
+RECENT_REPLY_DAYS = 14
+MIN_T2_HOURS = 60
+
+REQUIRED_HEADERS = {
+    "e164_phone",
+    "list_tag",
+    "FName",
+    "LName",
+    "do_not_text",
+    "responded_at",
+    "booked_at",
+    "t1_sent_at",
+    "t2_sent_at",
+}
+
+PLAN_VERSION = 1
+
+Candidate = namedtuple(
+    "Candidate",
+    [
+        "idx",
+        "fname",
+        "lname",
+        "e164",
+        "do_not_text",
+        "list_tag",
+        "sent_status",
+        "mode",
+        "status",
+        "responded_at",
+        "booked_at",
+        "t1_sent_at",
+        "t2_sent_at",
+    ],
+)
+
+
+def is_true(val):
+    if val is None:
+        return False
+    return str(val).strip().lower() in TRUEY
+
+
+class CsvStats:
+    """Validation counters gathered while rows stream through read_rows()."""
+
+    def __init__(self, preview_rows: int = 10):
+        self.preview_rows = preview_rows
+        self.headers: Set[str] = set()
+        self.missing: Set[str] = set()
+        self.seen_phones: Set[str] = set()
+        self.preview: List[Dict[str, str]] = []
+        self.total = 0
+        self.blanks = 0
+        self.dups = 0
+        self.unique = 0
+        self.timestamps = TimestampColumns()
+
+    def observe(self, row: Dict[str, str]) -> None:
+        self.total += 1
+        phone = (row.get("e164_phone") or "").strip()
+        if phone:
+            # "(301) 555-0100" and "3015550100" are the same recipient at send time.
+            phone = normalize_e164(phone) or phone
+        if not phone:
+            self.blanks += 1
+        elif phone in self.seen_phones:
+            self.dups += 1
+        else:
+            self.seen_phones.add(phone)
+            self.unique += 1
+        if len(self.preview) < self.preview_rows:
+            self.preview.append(row)
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.blanks
+
+    def report(self) -> bool:
+        """Prints the CSV VALIDATION SUMMARY and returns whether validation passed."""
+        if self.missing:
+            print(f"ERROR: Missing required headers: {', '.join(self.missing)}")
+            return False
+        print(f"\nCSV VALIDATION SUMMARY:")
+        print(f"  Total rows: {self.total}")
+        print(f"  Blank e164_phone: {self.blanks}")
+        print(f"  Duplicate e164_phone: {self.dups}")
+        print(f"  Unique e164_phone: {self.unique}")
+        print(f"  Headers: {sorted(self.headers)}")
+        failures = self.timestamps.failures()
+        if failures:
+            print(f"  Unparseable timestamps: {', '.join(f'{k}={v}' for k, v in sorted(failures.items()))}")
+        print(f"\nPreview (first {self.preview_rows} rows):")
+        for i, row in enumerate(self.preview, 1):
+            print(f"  [{i}] {row}")
+        if self.blanks:
+            print("\nERROR: Validation failed. Fix issues above or use --force to override.")
+            return False
+        if self.dups:
+            print("\nWARNING: Duplicate e164_phone detected in CSV; duplicates will be skipped at send time.")
+        print("\nValidation passed.")
+        return True
+
+
+def read_rows(csv_path: str, stats: CsvStats) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yields (row_number, row) once per CSV row, feeding stats as it goes."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        stats.headers = set(reader.fieldnames or [])
+        stats.missing = REQUIRED_HEADERS - stats.headers
+        for idx, row in enumerate(reader, start=1):
+            stats.observe(row)
+            yield idx, row
+
+
+def normalize(rows: Iterable[Tuple[int, Dict[str, str]]], default_mode: str,
+              timestamps: Optional[TimestampColumns] = None) -> Iterator[Candidate]:
+    ts = (timestamps or TimestampColumns()).parse
+    for idx, row in rows:
+        row_mode = (row.get("mode", "") or "").strip().lower()
+        yield Candidate(
+            idx=idx,
+            fname=row.get("FName", "").strip(),
+            lname=row.get("LName", "").strip(),
+            e164=normalize_e164(row.get("e164_phone", "").strip()),
+            do_not_text=row.get("do_not_text", "").strip(),
+            list_tag=row.get("list_tag", "").strip(),
+            sent_status=row.get("sent_status", "").strip(),
+            mode=row_mode if row_mode in ("link", "manual") else default_mode,
+            status=(row.get("status", "") or "").strip().lower(),
+            responded_at=ts("responded_at", row.get("responded_at")),
+            booked_at=ts("booked_at", row.get("booked_at")),
+            t1_sent_at=ts("t1_sent_at", row.get("t1_sent_at") or row.get("sent_at")),
+            t2_sent_at=ts("t2_sent_at", row.get("t2_sent_at")),
+        )
+
+
+def skip_reasons(c: Candidate, touch: str, force: bool, now: datetime, seen_phones: Set[str]) -> List[str]:
+    """Returns the T1/T2 skip reasons for one row (empty list means eligible)."""
+    reasons = []
+
+    if is_true(c.do_not_text):
+        reasons.append("do_not_text is true")
+    if not c.e164:
+        reasons.append("missing/invalid e164_phone")
+    if c.status in STRONG_STATUSES:
+        reasons.append(f"status={c.status} (strong)")
+    if c.booked_at:
+        reasons.append("booked_at present")
+    if c.responded_at and (now - c.responded_at) < timedelta(days=RECENT_REPLY_DAYS):
+        reasons.append(f"responded within {RECENT_REPLY_DAYS}d")
+    if c.sent_status and c.sent_status.lower() == "sent" and not force:
+        reasons.append("sent_status=sent (use --force to override)")
+    if c.e164 and c.e164 in seen_phones:
+        reasons.append("duplicate phone already processed in this file")
+
+    if touch == "t1":
+        if c.status not in WORKABLE_STATUSES:
+            reasons.append(f"status not workable ({c.status})")
+        if c.t1_sent_at:
+            reasons.append("t1_sent_at already set")
+    else:  # T2
+        if not c.t1_sent_at:
+            reasons.append("no t1_sent_at (not eligible for T2)")
+        if c.t2_sent_at:
+            reasons.append("t2_sent_at already set")
+        if c.t1_sent_at and (now - c.t1_sent_at) < timedelta(hours=MIN_T2_HOURS):
+            reasons.append(f"T1 age < {MIN_T2_HOURS}h")
+        if c.responded_at and c.t1_sent_at and c.responded_at > c.t1_sent_at:
+            reasons.append("reply received after T1")
+    return reasons
+
+
+def evaluate(cands: Iterable[Candidate], touch: str, force: bool,
+             now: Optional[datetime] = None) -> Iterator[Tuple[Candidate, List[str]]]:
+    now = now or datetime.now(timezone.utc)
+    seen_phones: Set[str] = set()
+    for c in cands:
+        reasons = skip_reasons(c, touch, force, now, seen_phones)
+        if not reasons and c.e164:
+            seen_phones.add(c.e164)
+        yield c, reasons
+
+
+def render(evaluated: Iterable[Tuple[Candidate, List[str]]], touch: str,
+           booking_url: str, office_phone: str, practice_name: str = PRACTICE_NAME,
+           linker: Optional[Callable[[str, str, str], Tuple[str, str]]] = None) -> Iterator[Dict[str, object]]:
+    """
+    Turns evaluated rows into plan entries:
+      {"idx", "skip": <SKIP line>, "reason": <histogram key>}
+      {"idx", "to", "name", "body", "mode", "note": <mode=... line>, "list_tag"}
+    With a linker (shortlink.ShortLinker), link-mode bodies carry its short URL instead of
+    the tracking URL and the entry gets "link": <code>.
+    """
+    for c, reasons in evaluated:
+        if reasons:
+            yield {
+                "idx": c.idx,
+                "skip": f"[{c.idx}] SKIP {c.fname} {c.lname} — {', '.join(reasons)}",
+                "reason": ";".join(reasons),
+            }
+            continue
+        if c.mode == "link":
+            # build tracking URL with list_tag + phone
+            lt = quote_plus(c.list_tag) if c.list_tag else "due_soon"
+            tracking_url = f"{booking_url}?lt={lt}&pn={quote_plus(c.e164)}"
+            note = f"mode=link tracking_url={tracking_url}"
+            short_url = tracking_url
+            code = None
+            if linker is not None:
+                code, short_url = linker(c.e164, c.list_tag or "due_soon", tracking_url)
+                note = f"mode=link short_url={short_url} -> {tracking_url}"
+            body = render_message(
+                mode="link",
+                list_tag=c.list_tag,
+                first=c.fname,
+                office_phone=office_phone,
+                short_url=short_url,
+                touch=touch,
+                practice_name=practice_name,
+            )
+        else:
+            # manual callback path (no link)
+            note = "mode=manual (no URL)"
+            body = render_message(
+                mode="manual",
+                list_tag=c.list_tag,
+                first=c.fname,
+                office_phone=office_phone,
+                touch=touch,
+                practice_name=practice_name,
+            )
+        entry = {"idx": c.idx, "to": c.e164, "name": f"{c.fname} {c.lname}", "body": body, "mode": c.mode, "note": note,
+                 "list_tag": c.list_tag}
+        if c.mode == "link" and code is not None:
+            entry["link"] = code
+        yield entry
+
+
+def write_plan(f: IO[str], entries: Iterable[Dict[str, object]], **meta) -> int:
+    """Spools plan entries as JSON lines (header, entries, trailer). Returns the row count."""
+    f.write(json.dumps({"plan": PLAN_VERSION, **meta}) + "\n")
+    total = 0
+    for entry in entries:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        total += 1
+    f.write(json.dumps({"total": total}) + "\n")
+    f.flush()
+    return total
+
+
+def read_plan(f: IO[str]) -> Tuple[Dict[str, object], Iterator[Dict[str, object]]]:
+    """Returns (header, entries). Raises ValueError if the file is not a plan or is truncated."""
+    header = json.loads(f.readline() or "{}")
+    if header.get("plan") != PLAN_VERSION:
+        raise ValueError("not a send plan (missing or unsupported plan header)")
+
+    def _entries():
+        for line in f:
+            entry = json.loads(line)
+            if "idx" not in entry:
+                return
+            yield entry
+        raise ValueError("send plan is truncated (no trailer)")
+
+    return header, _entries()
@@ -0,0 +1,81 @@
+# sheet_schema.py
+"""
+Engine sheet layout for the Python tools, read straight from the Apps Script source
+(src/Apps Script/RecallBridge Script/Schema.js) so the two never drift apart.
+
+    from sheet_schema import load_schema
+    schema = load_schema()
+    schema.headers["60_Touches"]      # TOUCHES_HEADERS
+    schema.event_types["TWILIO_STATUS"]
+
+Only the simple literal forms Schema.js uses are understood: `const NAME = [ "a", ... ];`
+arrays of strings and `const NAME = { KEY: "value", ... };` string maps.
+"""
+
+import os
+import re
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+SCHEMA_JS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "Apps Script", "RecallBridge Script", "Schema.js"
+)
+
+# Sheet name -> Schema.js constant holding its header row.
+SHEET_HEADERS = {
+    "30_Patients": "PATIENT_HEADERS",
+    "50_Queue": "QUEUE_HEADERS",
+    "60_Touches": "TOUCHES_HEADERS",
+    "70_EventLog": "EVENT_HEADERS",
+}
+
+Schema = namedtuple("Schema", ["headers", "event_types", "dentrix_mapping", "config_keys", "required_sheets"])
+
+_CONST = re.compile(r"const\s+([A-Z_]+)\s*=\s*([\[{])(.*?)[\]}]\s*;", re.S)
+_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_PAIR = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def parse_constants(source: str) -> Dict[str, object]:
+    """All top-level string-array and string-map constants in a JS source file."""
+    out: Dict[str, object] = {}
+    for name, kind, body in _CONST.findall(source):
+        body = re.sub(r"//[^\n]*", "", body)
+        out[name] = _STRING.findall(body) if kind == "[" else dict(_PAIR.findall(body))
+    return out
+
+
+_CACHE: Dict[str, Schema] = {}
+
+
+def load_schema(path: Optional[str] = None) -> Schema:
+    path = os.path.abspath(path or SCHEMA_JS)
+    schema = _CACHE.get(path)
+    if schema is not None:
+        return schema
+    with open(path, encoding="utf-8") as f:
+        consts = parse_constants(f.read())
+    missing = [c for c in SHEET_HEADERS.values() if c not in consts]
+    if missing:
+        raise ValueError(f"{path}: missing {', '.join(missing)}")
+    schema = Schema(
+        headers={sheet: list(consts[c]) for sheet, c in SHEET_HEADERS.items()},
+        event_types=dict(consts.get("EVENT_TYPES", {})),
+        dentrix_mapping=dict(consts.get("DENTRIX_MAPPING", {})),
+        config_keys=list(consts.get("CONFIG_KEYS", [])),
+        required_sheets=list(consts.get("REQUIRED_SHEETS", [])),
+    )
+    _CACHE[path] = schema
+    return schema
+
+
+def header_map(header: List[str]) -> Dict[str, int]:
+    """Utils.headerMap: column name -> index; duplicate names are an error."""
+    out: Dict[str, int] = {}
+    for idx, name in enumerate(header):
+        if name in ("", None):
+            continue
+        if name in out:
+            raise ValueError(f"Duplicate header: {name}")
+        out[name] = idx
+    return out
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Deterministic short links for link-mode sends, with a code -> touch click index.
+
+In link mode the send script builds BOOKING_URL?lt=<list_tag>&pn=<phone> per row and
+asks Twilio to shorten it (shorten_urls=True). A click then reaches twilio-click.js with
+only the MessageSid, and the touch is found by scanning 60_Touches for that SID.
+
+Here every (campaign, touch, phone, list_tag) gets a compact code instead:
+
+    code = base62(blake2b(campaign|touch|phone|list_tag, key=<index secret>))[:8]
+
+The secret is generated once per index file (or taken from RB_SHORTLINK_SECRET), so a
+re-render of the same list yields the same codes and codes cannot be guessed from a phone
+number. Codes are staged in batches while the plan is rendered and published to the
+index once the list has passed validation, before anything is sent (a rejected list adds
+nothing); the send path attaches the Twilio SID to each code as messages go out.
+The body carries <short-base>/<code>, so Twilio has nothing to shorten.
+
+`serve` answers GET /<code> with a 302 to the booking URL. The code resolves to its touch
+from an in-memory dict (one primary-key read when the SID was attached after startup),
+so there is no Messages API call per click. Each hit bumps the index counters, is logged
+as a twilio.click_event row (same dedupe_key as WebApp.js handleTwilioClick_) when
+--event-log is set, and is forwarded in the background to the Apps Script route=twilio_click
+(sms_sid / event_type / click_time, X-RB-Proxy-Token) when --forward-url is set. Link
+preview fetchers (by User-Agent) count as event_type=preview.
+
+Usage:
+    python3 twilio_send_script.py list.csv --short-links links.sqlite --short-base https://rb.example/s
+    python3 shortlink.py serve links.sqlite --port 8780 --event-log events.jsonl \\
+        --forward-url "$GAS_EXEC_URL" --practice-id p1
+    python3 shortlink.py stats links.sqlite
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import string
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from event_log import EventLog, new_event_id, now_iso
+from sheet_schema import load_schema
+
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+CODE_LENGTH = 8  # 62**8 ~ 2.2e14 codes
+BATCH_SIZE = 1000
+SID_FLUSH_S = 1.0  # attached SIDs reach a running redirect server within about this long
+FORWARD_RETRIES = 3
+PREVIEW_AGENTS = ("facebookexternalhit", "twitterbot", "slackbot", "whatsapp", "telegrambot", "discordbot",
+                  "linkedinbot", "skypeuripreview", "applebot", "googlebot", "bingbot", "iframely", "embedly")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    code             TEXT PRIMARY KEY,
+    campaign         TEXT NOT NULL,
+    touch            TEXT NOT NULL,
+    phone            TEXT NOT NULL,
+    list_tag         TEXT NOT NULL,
+    target_url       TEXT NOT NULL,
+    sid              TEXT,
+    created_at       TEXT NOT NULL,
+    clicks           INTEGER NOT NULL DEFAULT 0,
+    previews         INTEGER NOT NULL DEFAULT 0,
+    first_clicked_at TEXT,
+    last_clicked_at  TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+"""
+# new codes wait here (per connection, never in the index file) until publish()
+STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS staged (
+    code       TEXT PRIMARY KEY,
+    campaign   TEXT NOT NULL,
+    touch      TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    list_tag   TEXT NOT NULL,
+    target_url TEXT NOT NULL,
+    created_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+Link = namedtuple("Link", ["code", "campaign", "touch", "phone", "list_tag", "target_url", "sid"])
+
+
+def _base62(data: bytes) -> str:
+    n = int.from_bytes(data, "big")
+    out = []
+    while n:
+        n, r = divmod(n, 62)
+        out.append(ALPHABET[r])
+    return "".join(out) or "0"
+
+
+def link_digest(secret: bytes, campaign: str, touch: str, phone: str, list_tag: str) -> str:
+    """Base62 keyed hash of the touch identity; the code is a prefix of it."""
+    key = "\x1f".join((campaign, touch, phone, list_tag)).encode("utf-8")
+    return _base62(hashlib.blake2b(key, key=secret[:64], digest_size=16).digest())
+
+
+def is_preview(user_agent: str) -> bool:
+    ua = (user_agent or "").lower()
+    return any(bot in ua for bot in PREVIEW_AGENTS)
+
+
+class LinkIndex:
+    """
+    code -> (campaign, touch, phone, list_tag, target_url, sid) in SQLite. Writes are batched;
+    new codes are staged until publish(), and close() drops any that were not published.
+    """
+
+    def __init__(self, path: str, secret: Optional[str] = None, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.executescript(STAGING)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, tuple] = {}
+        self._sids: List[Tuple[str, str]] = []
+        stored = self._meta("secret")
+        if stored is None:
+            stored = secret or secrets.token_hex(32)
+            with self._db:
+                self._db.execute("INSERT INTO meta (key, value) VALUES ('secret', ?)", (stored,))
+        elif secret and secret != stored:
+            raise ValueError(f"{path} was created with a different short-link secret")
+        self.secret = stored.encode("utf-8")
+        self._flushed_at = time.monotonic()
+
+    def __enter__(self) -> "LinkIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _owner(self, code: str) -> Optional[tuple]:
+        pending = self._pending.get(code)
+        if pending is not None:
+            return pending[1:5]
+        return self._db.execute(
+            "SELECT campaign, touch, phone, list_tag FROM links WHERE code=:c "
+            "UNION ALL SELECT campaign, touch, phone, list_tag FROM staged WHERE code=:c", {"c": code}).fetchone()
+
+    def code_for(self, campaign: str, touch: str, phone: str, list_tag: str, target_url: str) -> str:
+        """Returns the code for this touch, staging it for the index if it is new."""
+        ident = (campaign, touch, phone, list_tag)
+        digest = link_digest(self.secret, *ident)
+        for length in range(CODE_LENGTH, len(digest) + 1):
+            code = digest[:length]
+            owner = self._owner(code)
+            if owner is None:
+                self._pending[code] = (code, *ident, target_url, now_iso())
+                if len(self._pending) >= self.batch_size:
+                    self.flush()
+                return code
+            if tuple(owner) == ident:
+                return code
+        raise RuntimeError(f"no free short code for {phone} ({campaign}/{touch})")
+
+    def attach_sid(self, code: str, sid: str) -> None:
+        self._sids.append((sid, code))
+        if len(self._sids) >= self.batch_size or time.monotonic() - self._flushed_at >= SID_FLUSH_S:
+            self.flush()
+
+    def flush(self) -> None:
+        if not (self._pending or self._sids):
+            return
+        with self._lock, self._db:
+            if self._pending:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO staged (code, campaign, touch, phone, list_tag, target_url, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", list(self._pending.values()))
+            if self._sids:
+                self._db.executemany("UPDATE links SET sid=? WHERE code=?", self._sids)
+        self._pending.clear()
+        self._sids.clear()
+        self._flushed_at = time.monotonic()
+
+    def publish(self) -> int:
+        """Moves every staged code into the index in one transaction. Returns how many were added."""
+        self.flush()
+        with self._lock, self._db:
+            added = self._db.execute("INSERT OR IGNORE INTO links (code, campaign, touch, phone, list_tag, target_url, "
+                                     "created_at) SELECT * FROM staged").rowcount
+            self._db.execute("DELETE FROM staged")
+        return added
+
+    def get(self, code: str) -> Optional[Link]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT code, campaign, touch, phone, list_tag, target_url, sid FROM links WHERE code=?",
+                (code,)).fetchone()
+        return Link(*row) if row else None
+
+    def load(self) -> Dict[str, Link]:
+        with self._lock:
+            return {row[0]: Link(*row) for row in self._db.execute(
+                "SELECT code, campaign, touch, phone, list_tag, target_url, sid FROM links")}
+
+    def record_hit(self, code: str, preview: bool, at: str) -> None:
+        with self._lock, self._db:
+            if preview:
+                self._db.execute("UPDATE links SET previews = previews + 1 WHERE code=?", (code,))
+            else:
+                self._db.execute(
+                    "UPDATE links SET clicks = clicks + 1, first_clicked_at = COALESCE(first_clicked_at, ?), "
+                    "last_clicked_at = ? WHERE code=?", (at, at, code))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            links, with_sid, clicked, clicks, previews = self._db.execute(
+                "SELECT COUNT(*), COUNT(sid), SUM(clicks > 0), COALESCE(SUM(clicks), 0), COALESCE(SUM(previews), 0) "
+                "FROM links").fetchone()
+            scopes = self._db.execute(
+                "SELECT campaign, touch, COUNT(*), SUM(clicks > 0) FROM links GROUP BY 1, 2 ORDER BY 1, 2").fetchall()
+        return {"path": self.path, "links": links, "with_sid": with_sid, "clicked": clicked or 0,
+                "clicks": clicks, "previews": previews,
+                "scopes": [{"campaign": c, "touch": t, "links": n, "clicked": k or 0} for c, t, n, k in scopes]}
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
+
+
+class ShortLinker:
+    """Bound to one campaign + touch; render() calls it for each link-mode row."""
+
+    def __init__(self, index: LinkIndex, base_url: str, campaign: str, touch: str):
+        self.index = index
+        self.base_url = base_url.rstrip("/")
+        self.campaign = campaign
+        self.touch = touch
+
+    def __call__(self, phone: str, list_tag: str, target_url: str) -> Tuple[str, str]:
+        """(code, short_url)"""
+        code = self.index.code_for(self.campaign, self.touch, phone, list_tag, target_url)
+        return code, f"{self.base_url}/{code}"
+
+
+class ClickForwarder:
+    """Posts click events to the Apps Script twilio_click route from one background thread."""
+
+    def __init__(self, exec_url: str, practice_id: str, webhook_token: str, proxy_token: str, timeout: float = 10.0):
+        self.url = f"{exec_url}?" + urlencode({"route": "twilio_click", "practice_id": practice_id,
+                                               "token": webhook_token})
+        self.proxy_token = proxy_token
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self._q: "queue.Queue[Optional[Dict[str, str]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="click-forwarder", daemon=True)
+        self._thread.start()
+
+    def submit(self, form: Dict[str, str]) -> None:
+        self._q.put(form)
+
+    def _post(self, form: Dict[str, str]) -> bool:
+        req = urllib.request.Request(self.url, data=urlencode(form).encode("utf-8"), method="POST", headers={
+            "Content-Type": "application/x-www-form-urlencoded", "X-RB-Proxy-Token": self.proxy_token})
+        for attempt in range(FORWARD_RETRIES + 1):
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    body = resp.read(256).decode("utf-8", errors="replace")
+                # twilio-click.js: retry on GAS error HTML, never on config errors
+                if not (body.startswith("<!DOCTYPE html>") or "<title>Error</title>" in body):
+                    return True
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    return False
+            except OSError:
+                pass
+            time.sleep(min(8.0, 0.5 * 2 ** attempt))
+        return False
+
+    def _run(self) -> None:
+        while True:
+            form = self._q.get()
+            if form is None:
+                return
+            if self._post(form):
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def close(self) -> None:
+        self._q.put(None)
+        self._thread.join()
+
+
+class RedirectApp:
+    """Resolves codes from memory, records hits and hands them to the event log / forwarder."""
+
+    def __init__(self, index: LinkIndex, event_log: Optional[EventLog] = None,
+                 forwarder: Optional[ClickForwarder] = None, practice_id: str = ""):
+        self.index = index
+        self.links = index.load()
+        self.event_log = event_log
+        self.forwarder = forwarder
+        self.practice_id = practice_id
+        self.click_event = load_schema().event_types.get("TWILIO_CLICK", "twilio.click_event")
+        self.hits = {"click": 0, "preview": 0, "unknown": 0}
+
+    def resolve(self, code: str) -> Optional[Link]:
+        link = self.links.get(code)
+        if link is None or not link.sid:
+            # sent after startup: one primary-key read picks up the new code / attached SID
+            link = self.index.get(code) or link
+            if link is not None:
+                self.links[code] = link
+        return link
+
+    def hit(self, code: str, user_agent: str) -> Optional[Link]:
+        link = self.resolve(code)
+        if link is None:
+            self.hits["unknown"] += 1
+            return None
+        event_type = "preview" if is_preview(user_agent) else "click"
+        self.hits[event_type] += 1
+        at = now_iso()
+        self.index.record_hit(code, event_type == "preview", at)
+        sid = link.sid or ""
+        if self.event_log is not None:
+            payload = {"code": code, "event_type": event_type, "click_time": at, "campaign_id": link.campaign,
+                       "touch_type": link.touch, "list_tag": link.list_tag, "to": link.phone}
+            self.event_log.log(self.click_event, new_event_id(), self.practice_id, "click " + event_type, payload,
+                               {"dedupe_key": f"click:{sid or code}:{event_type}:{at}", "twilio_message_sid": sid})
+        if self.forwarder is not None and sid:
+            self.forwarder.submit({"sms_sid": sid, "event_type": event_type, "click_time": at, "link": code})
+        return link
+
+    def snapshot(self) -> Dict[str, object]:
+        snap = {"hits": dict(self.hits), "cached_links": len(self.links), "index": self.index.stats()}
+        if self.event_log is not None:
+            snap["event_log"] = self.event_log.stats()
+        if self.forwarder is not None:
+            snap["forwarded"] = {"sent": self.forwarder.sent, "failed": self.forwarder.failed}
+        return snap
+
+    def close(self) -> None:
+        if self.forwarder is not None:
+            self.forwarder.close()
+        if self.event_log is not None:
+            self.event_log.close()
+        self.index.close()
+
+
+def make_handler(app: RedirectApp):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _reply(self, code: int, text: str = "", location: str = "", head: bool = False):
+            data = text.encode("utf-8")
+            self.send_response(code)
+            if location:
+                self.send_header("Location", location)
+                self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Type", "application/json" if text.startswith("{") else "text/plain")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(data)
+
+        def _handle(self, head: bool):
+            path = urlsplit(self.path).path
+            if path == "/__stats":
+                self._reply(200, json.dumps(app.snapshot(), indent=2), head=head)
+                return
+            link = app.hit(path.rsplit("/", 1)[-1], self.headers.get("User-Agent", ""))
+            if link is None:
+                self._reply(404, "unknown link", head=head)
+            else:
+                self._reply(302, "", location=link.target_url, head=head)
+
+        def do_GET(self):
+            self._handle(head=False)
+
+        def do_HEAD(self):
+            self._handle(head=True)
+
+    return Handler
+
+
+def serve(app: RedirectApp, host: str = "127.0.0.1", port: int = 8780) -> ThreadingHTTPServer:
+    """Builds (but does not start) the redirect server."""
+    server = ThreadingHTTPServer((host, port), make_handler(app))
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Short-link index and redirect server for link-mode sends.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", help="Serve /<code> redirects and record clicks")
+    p_serve.add_argument("index", help="links.sqlite written by twilio_send_script.py --short-links")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8780)
+    p_serve.add_argument("--event-log", metavar="PATH", default="", help="Append twilio.click_event rows here")
+    p_serve.add_argument("--practice-id", default="", help="practice_id for event rows and the forwarded click")
+    p_serve.add_argument("--forward-url", default=os.getenv("GAS_EXEC_URL", ""),
+                         help="Apps Script /exec URL; clicks are posted to route=twilio_click (GAS_EXEC_URL)")
+    p_serve.add_argument("--token", default=os.getenv("RB_WEBHOOK_TOKEN", ""), help="RB_WEBHOOK_TOKEN")
+    p_serve.add_argument("--proxy-token", default=os.getenv("RB_PROXY_TOKEN", ""), help="RB_PROXY_TOKEN")
+    p_stats = sub.add_parser("stats", help="Links and clicks per campaign/touch")
+    p_stats.add_argument("index")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        with LinkIndex(args.index) as index:
+            print(json.dumps(index.stats(), indent=2))
+        return
+
+    forwarder = None
+    if args.forward_url:
+        if not (args.practice_id and args.token and args.proxy_token):
+            parser.error("--forward-url needs --practice-id, --token (RB_WEBHOOK_TOKEN) and --proxy-token (RB_PROXY_TOKEN)")
+        forwarder = ClickForwarder(args.forward_url, args.practice_id, args.token, args.proxy_token)
+    app = RedirectApp(LinkIndex(args.index), EventLog(args.event_log) if args.event_log else None, forwarder,
+                      args.practice_id)
+    server = serve(app, args.host, args.port)
+    print(f"Short links on http://{args.host}:{args.port}/<code> ({len(app.links)} codes from {args.index})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        app.close()
+        print(json.dumps(app.hits))
+
+
+if __name__ == "__main__":
+    main()
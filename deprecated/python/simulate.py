@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Send simulation: carrier encoding, segment counts, cost and duration for a rendered plan.
+
+A body is sent as GSM-7 when every character is in the GSM 03.38 basic set or its
+extension table (^ { } [ ] ~ | \\ € and form feed count as two septets); a single
+character outside it (a curly apostrophe, an emoji) switches the whole message to
+UCS-2. Segment limits are 160 septets / 70 UTF-16 units for a single message and
+153 / 67 per part once concatenated; escape pairs and surrogate pairs are never split
+across parts, as carriers do.
+
+Simulation consumes plan entries (twilio_send_script --simulate, or a --plan file),
+counts segments for every send, and projects cost and wall-clock time for the rate
+limit and worker count the real run would use. Link-mode bodies carry the full
+tracking URL; pass short_url_len to count them as Twilio's shortened link instead.
+
+Usage:
+    python3 twilio_send_script.py /path/to/file.csv --simulate --rate 10
+    python3 simulate.py plan.jsonl --rate 10 --workers 8 --short-url-len 23
+"""
+
+import argparse
+import heapq
+import math
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+GSM7_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = "\f^{}\\[~]|€"
+
+GSM7_SINGLE, GSM7_PART = 160, 153
+UCS2_SINGLE, UCS2_PART = 70, 67
+
+# Lookalikes that force UCS-2 and have a GSM-7 equivalent (used for the "if replaced" projection).
+GSM7_LOOKALIKES = {
+    "‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-",
+    "…": "...", "\u00a0": " ", "•": "-",
+}
+
+DEFAULT_SEGMENT_PRICE_USD = 0.0079
+DEFAULT_LATENCY_MS = 250.0
+DEFAULT_WORST = 5
+
+_NON_GSM = re.compile("[^" + re.escape(GSM7_BASIC + GSM7_EXTENDED) + "]")
+_GSM_EXT = re.compile("[" + re.escape(GSM7_EXTENDED) + "]")
+_ASTRAL = re.compile("[\U00010000-\U0010ffff]")
+_LOOKALIKE = re.compile("[" + "".join(GSM7_LOOKALIKES) + "]")
+
+
+def _pack(units: List[int], part: int) -> int:
+    """Greedy concatenated-SMS packing of per-character unit widths (1 or 2) into `part`-unit segments."""
+    segments, used = 1, 0
+    for w in units:
+        if used + w > part:
+            segments += 1
+            used = 0
+        used += w
+    return segments
+
+
+def encode_info(body: str) -> Tuple[str, int, int]:
+    """(encoding, length in septets or UTF-16 units, segment count) for one message body."""
+    if not _NON_GSM.search(body):
+        ext = len(_GSM_EXT.findall(body))
+        length = len(body) + ext
+        if length <= GSM7_SINGLE:
+            return "GSM-7", length, 1
+        if not ext:
+            return "GSM-7", length, math.ceil(length / GSM7_PART)
+        return "GSM-7", length, _pack([2 if c in GSM7_EXTENDED else 1 for c in body], GSM7_PART)
+    astral = len(_ASTRAL.findall(body))
+    length = len(body) + astral
+    if length <= UCS2_SINGLE:
+        return "UCS-2", length, 1
+    if not astral:
+        return "UCS-2", length, math.ceil(length / UCS2_PART)
+    return "UCS-2", length, _pack([2 if ord(c) > 0xFFFF else 1 for c in body], UCS2_PART)
+
+
+def non_gsm_chars(body: str) -> List[str]:
+    return _NON_GSM.findall(body)
+
+
+def project_seconds(sends: int, rate: float, workers: int, latency_ms: float) -> float:
+    """
+    Wall-clock estimate for `sends` requests: the token bucket lets `max(1, rate)` through
+    at once and then `rate` per second, `workers` requests are in flight at a time, and
+    the last response arrives one latency after the last request leaves.
+    """
+    if sends <= 0:
+        return 0.0
+    latency = max(0.0, latency_ms) / 1000.0
+    by_rate = max(0, sends - max(1.0, rate)) / rate if rate > 0 else 0.0
+    by_workers = (sends - 1) // max(1, workers) * latency
+    return max(by_rate, by_workers) + latency
+
+
+class Simulation:
+    """Accumulates encoding/segment stats over plan entries; report() prints the projection."""
+
+    def __init__(self, short_url_len: int = 0, worst: int = DEFAULT_WORST):
+        self.short_url_len = short_url_len
+        self.worst = worst
+        self.rows = 0
+        self.sends = 0
+        self.skipped = 0
+        self.segments = 0
+        self.segments_if_replaced = 0
+        self.by_encoding: Counter = Counter()
+        self.by_segments: Counter = Counter()
+        self.by_mode: Counter = Counter()
+        self.forcing_ucs2: Counter = Counter()
+        self.max_length = 0
+        self._worst: List[Tuple[int, int, int, Dict[str, object]]] = []
+        self._memo: Dict[str, Tuple[str, int, int, int, Tuple[str, ...]]] = {}
+
+    def _counted_body(self, entry: Dict[str, object]) -> str:
+        body = entry["body"]
+        note = entry.get("note") or ""
+        if self.short_url_len and entry.get("mode") == "link" and "tracking_url=" in note:
+            body = body.replace(note.split("tracking_url=", 1)[1], "x" * self.short_url_len)
+        return body
+
+    def _analyze(self, body: str) -> Tuple[str, int, int, int, Tuple[str, ...]]:
+        info = self._memo.get(body)
+        if info is None:
+            encoding, length, segments = encode_info(body)
+            replaced = segments
+            bad: Tuple[str, ...] = ()
+            if encoding == "UCS-2":
+                bad = tuple(non_gsm_chars(body))
+                replaced = encode_info(_LOOKALIKE.sub(lambda m: GSM7_LOOKALIKES[m.group()], body))[2]
+            info = (encoding, length, segments, replaced, bad)
+            if len(self._memo) < 100000:
+                self._memo[body] = info
+        return info
+
+    def observe(self, entry: Dict[str, object], skip_reason: Optional[str] = None) -> None:
+        """One plan entry; `skip_reason` marks a send the real run would skip (ledger, dedupe store)."""
+        self.rows += 1
+        if "skip" in entry or skip_reason:
+            self.skipped += 1
+            return
+        encoding, length, segments, replaced, bad = self._analyze(self._counted_body(entry))
+        self.sends += 1
+        self.segments += segments
+        self.segments_if_replaced += replaced
+        self.by_encoding[encoding] += 1
+        self.by_segments[segments] += 1
+        self.by_mode[entry.get("mode") or "link"] += 1
+        self.forcing_ucs2.update(set(bad))
+        self.max_length = max(self.max_length, length)
+        item = (segments, length, -int(entry["idx"]), entry)
+        if len(self._worst) < self.worst:
+            heapq.heappush(self._worst, item)
+        elif item[:3] > self._worst[0][:3]:
+            heapq.heapreplace(self._worst, item)
+
+    def observe_all(self, entries: Iterable[Dict[str, object]]) -> "Simulation":
+        for entry in entries:
+            self.observe(entry)
+        return self
+
+    def worst_entries(self) -> List[Tuple[int, int, Dict[str, object]]]:
+        """(segments, length, entry), most segments first."""
+        return [(s, n, e) for s, n, _, e in sorted(self._worst, key=lambda x: x[:3], reverse=True)]
+
+    def summary(self, rate: float, workers: int, latency_ms: float,
+                price: float = DEFAULT_SEGMENT_PRICE_USD) -> Dict[str, object]:
+        secs = project_seconds(self.sends, rate, workers, latency_ms)
+        return {
+            "rows": self.rows,
+            "sends": self.sends,
+            "skipped": self.skipped,
+            "segments": self.segments,
+            "by_encoding": dict(self.by_encoding),
+            "by_segments": dict(sorted(self.by_segments.items())),
+            "by_mode": dict(self.by_mode),
+            "forcing_ucs2": {f"U+{ord(c):04X}": n for c, n in self.forcing_ucs2.most_common()},
+            "segments_if_replaced": self.segments_if_replaced,
+            "cost_usd": round(self.segments * price, 4),
+            "cost_if_replaced_usd": round(self.segments_if_replaced * price, 4),
+            "projected_seconds": round(secs, 1),
+            "sends_per_sec": round(self.sends / secs, 2) if secs else 0.0,
+        }
+
+    def report(self, rate: float, workers: int, latency_ms: float,
+               price: float = DEFAULT_SEGMENT_PRICE_USD) -> Dict[str, object]:
+        s = self.summary(rate, workers, latency_ms, price)
+        print("\n=== SIMULATION ===")
+        print(f"Rows: {s['rows']}  Sends: {s['sends']}  Skipped: {s['skipped']}")
+        if not self.sends:
+            print("Nothing would be sent.")
+            return s
+        print("Encoding: " + ", ".join(f"{enc} {n}" for enc, n in sorted(s["by_encoding"].items())))
+        print("Segments per message: " + ", ".join(f"{k}: {v}" for k, v in s["by_segments"].items()))
+        print(f"Total segments: {s['segments']} (avg {s['segments'] / self.sends:.2f}/message, "
+              f"longest {self.max_length} units)")
+        if self.short_url_len:
+            print(f"Link-mode URLs counted as {self.short_url_len} chars (shortened).")
+        elif self.by_mode.get("link"):
+            print("Link-mode bodies counted with the full tracking URL; Twilio link shortening will shorten it.")
+        print(f"Cost: ${s['cost_usd']:,.2f} at ${price:g}/segment")
+        if self.forcing_ucs2:
+            chars = ", ".join(f"{c!r} (U+{ord(c):04X}) in {n}" for c, n in self.forcing_ucs2.most_common())
+            print(f"WARNING: {s['by_encoding'].get('UCS-2', 0)} messages forced to UCS-2 by: {chars}")
+            if s["segments_if_replaced"] < self.segments:
+                print(f"  Replaced with GSM-7 lookalikes they would need {s['segments_if_replaced']} segments "
+                      f"(${s['cost_if_replaced_usd']:,.2f}), saving {self.segments - s['segments_if_replaced']}.")
+        mins, secs = divmod(s["projected_seconds"], 60)
+        limit = f"{rate:g} msg/s" if rate > 0 else "unlimited rate"
+        print(f"Projected duration: {int(mins)}m{secs:04.1f}s ({s['sends_per_sec']:g} sends/s; {limit}, "
+              f"{workers} workers, {latency_ms:g} ms API latency)")
+        worst = self.worst_entries()
+        if worst:
+            print(f"Worst-case bodies (top {len(worst)}):")
+            for segments, length, e in worst:
+                encoding = self._analyze(self._counted_body(e))[0]
+                print(f"  [{e['idx']}] {segments} segments, {length} units, {encoding}: {e['body']!r}")
+        return s
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Simulation flags shared with twilio_send_script.py."""
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_LATENCY_MS,
+                        help="Assumed Twilio API latency for the duration projection")
+    parser.add_argument("--price", type=float, default=DEFAULT_SEGMENT_PRICE_USD, help="USD per SMS segment")
+    parser.add_argument("--short-url-len", type=int, default=0,
+                        help="Count link-mode tracking URLs as a shortened link of this many chars")
+    parser.add_argument("--worst", type=int, default=DEFAULT_WORST, help="How many worst-case bodies to list")
+
+
+
+def main():
+    from send_engine import DEFAULT_RATE_MPS, DEFAULT_WORKERS
+    from send_pipeline import read_plan
+
+    parser = argparse.ArgumentParser(description="Simulate sending a plan written by twilio_send_script.py --plan.")
+    parser.add_argument("plan_path", help="Plan file (JSON lines)")
+    add_arguments(parser)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_MPS, help="Messages/sec the run would use")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Workers the run would use")
+    args = parser.parse_args()
+
+    try:
+        with open(args.plan_path, encoding="utf-8") as f:
+            header, entries = read_plan(f)
+            sim = Simulation(args.short_url_len, args.worst).observe_all(entries)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    print(f"Plan {args.plan_path} (csv={header.get('csv')}, touch={header.get('touch')})")
+    sim.report(args.rate, args.workers, args.latency_ms, args.price)
+
+
+if __name__ == "__main__":
+    main()
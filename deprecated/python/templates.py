@@ -1,8 +1,9 @@
 # templates.py
 
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
 
 OPT_OUT_FOOTER = " Reply STOP to opt out."
+PRACTICE_NAME = "Bethesda Dental Smiles"
 
 def _norm_list_tag(tag: Optional[str]) -> str:
     if not tag:
@@ -22,6 +23,7 @@ def render_link_mode(
     office_phone: str,
     touch: str = "t1",
     include_opt_out: bool = True,
+    practice_name: str = PRACTICE_NAME,
 ) -> str:
     """
     Scheduler link flow: includes shortened URL and Questions line.
@@ -37,14 +39,14 @@ def render_link_mode(
         else:
             lead = "checking back about your hygiene/recall visit."
         body = (
-            f"Hi {name}, this is Bethesda Dental Smiles, {lead} "
+            f"Hi {name}, this is {practice_name}, {lead} "
             f"We still have openings this week. Book here: {short_url}\n\n"
             f"Questions? Call {office_phone}."
         )
     else:
         if tag == "past_due":
             body = (
-                f"Hi {name}, this is Bethesda Dental Smiles. "
+                f"Hi {name}, this is {practice_name}. "
                 f"Your recall/cleaning is past due. "
                 f"Book here: {short_url}\n\n"
                 f"Questions? Call {office_phone}."
@@ -52,7 +54,7 @@ def render_link_mode(
         else:
             # due_soon
             body = (
-                f"Hi {name}, this is Bethesda Dental Smiles. "
+                f"Hi {name}, this is {practice_name}. "
                 f"You’re due for your next hygiene/recall visit. "
                 f"Book here: {short_url}\n\n"
                 f"Questions? Call {office_phone}."
@@ -70,6 +72,7 @@ def render_manual_mode(
     office_phone: str,
     touch: str = "t1",
     include_opt_out: bool = True,
+    practice_name: str = PRACTICE_NAME,
 ) -> str:
     """
     No-scheduler/manual callback flow: asks for YES or CALL ME. No links.
@@ -87,7 +90,7 @@ def render_manual_mode(
             lead = "You’re due for your next hygiene/recall visit."
 
     body = (
-        f"Hi {name}, this is Bethesda Dental Smiles. {lead} "
+        f"Hi {name}, this is {practice_name}. {lead} "
         f"Reply YES and we’ll call to schedule. Prefer a call now? Text CALL ME.\n\n"
         f"Questions? Call {office_phone}."
     )
@@ -97,6 +100,143 @@ def render_manual_mode(
     return body
 
 
+# ---------------------------------------------------------------------
+# Compiled variants: every (mode, touch, list_tag, include_opt_out) body is
+# rendered once through the functions above with sentinel slot values, then
+# frozen into literal segments around the slots. Output is byte-for-byte what the
+# functions above return; test_templates.py pins every variant to golden bodies.
+# ---------------------------------------------------------------------
+
+MODES = ("link", "manual")
+TOUCHES = ("t1", "t2")
+LIST_TAGS = ("past_due", "due_soon")
+
+_SLOT_NAME = "\x00name\x00"
+_SLOT_URL = "\x00url\x00"
+_SLOT_PHONE = "\x00phone\x00"
+
+VariantKey = Tuple[str, str, str, bool]
+
+
+class CompiledTemplate:
+    """
+    One message variant as literal segments around three slots, always in this order:
+    greeting name, short URL (link mode only) and office phone.
+    """
+
+    __slots__ = ("key", "parts", "uses_url")
+
+    def __init__(self, key: VariantKey, text: str):
+        self.key = key
+        self.uses_url = _SLOT_URL in text
+        head, rest = text.split(_SLOT_NAME)
+        if self.uses_url:
+            mid, rest = rest.split(_SLOT_URL)
+        else:
+            mid = ""
+        url_tail, tail = rest.split(_SLOT_PHONE)
+        if not self.uses_url:
+            mid, url_tail = url_tail, ""
+        self.parts = (head, mid, url_tail, tail)
+
+    def render(self, name: str, short_url: str, office_phone: str) -> str:
+        p0, p1, p2, p3 = self.parts
+        return f"{p0}{name}{p1}{short_url}{p2}{office_phone}{p3}"
+
+
+def _compile(key: VariantKey, practice_name: str = PRACTICE_NAME) -> CompiledTemplate:
+    mode, touch, tag, include_opt_out = key
+    if mode == "manual":
+        text = render_manual_mode(
+            list_tag=tag, first=_SLOT_NAME, office_phone=_SLOT_PHONE, touch=touch, include_opt_out=include_opt_out,
+            practice_name=practice_name,
+        )
+    else:
+        text = render_link_mode(
+            list_tag=tag, first=_SLOT_NAME, short_url=_SLOT_URL, office_phone=_SLOT_PHONE,
+            touch=touch, include_opt_out=include_opt_out, practice_name=practice_name,
+        )
+    return CompiledTemplate(key, text)
+
+
+def _compile_all(practice_name: str = PRACTICE_NAME) -> Dict[VariantKey, CompiledTemplate]:
+    return {
+        key: _compile(key, practice_name)
+        for key in (
+            (mode, touch, tag, opt_out)
+            for mode in MODES
+            for touch in TOUCHES
+            for tag in LIST_TAGS
+            for opt_out in (True, False)
+        )
+    }
+
+
+TEMPLATES: Dict[VariantKey, CompiledTemplate] = _compile_all()
+
+# Other practices' copy (RB_PRACTICE_COPY_JSON practice_name) is compiled on first use.
+_BY_PRACTICE: Dict[str, Dict[VariantKey, CompiledTemplate]] = {PRACTICE_NAME: TEMPLATES}
+
+
+def templates_for(practice_name: str = PRACTICE_NAME) -> Dict[VariantKey, CompiledTemplate]:
+    compiled = _BY_PRACTICE.get(practice_name)
+    if compiled is None:
+        compiled = _BY_PRACTICE[practice_name] = _compile_all(practice_name)
+    return compiled
+
+
+def variant_key(mode: Optional[str], touch: Optional[str], list_tag: Optional[str],
+                include_opt_out: bool = True) -> VariantKey:
+    """Collapses raw inputs onto a TEMPLATES key using the same normalization as the functions above."""
+    m = "manual" if (mode or "link").strip().lower() == "manual" else "link"
+    t = "t2" if (touch or "t1").strip().lower() == "t2" else "t1"
+    return (m, t, _norm_list_tag(list_tag), bool(include_opt_out))
+
+
+# Raw (mode, touch, list_tag, include_opt_out) -> template, so repeat inputs skip normalization.
+_LOOKUP: Dict[tuple, CompiledTemplate] = {}
+_LOOKUP_MAX = 1024
+
+
+def lookup(mode: Optional[str], touch: Optional[str], list_tag: Optional[str],
+           include_opt_out: bool = True, practice_name: str = PRACTICE_NAME) -> CompiledTemplate:
+    raw = (mode, touch, list_tag, include_opt_out, practice_name)
+    tpl = _LOOKUP.get(raw)
+    if tpl is None:
+        tpl = templates_for(practice_name)[variant_key(mode, touch, list_tag, include_opt_out)]
+        if len(_LOOKUP) < _LOOKUP_MAX:
+            _LOOKUP[raw] = tpl
+    return tpl
+
+
+def render_many(rows: Iterable[Mapping[str, Any]], **defaults: Any) -> List[str]:
+    """
+    Batch render. Each row supplies render_message keyword args (mode, list_tag, first,
+    short_url, office_phone, touch, include_opt_out, practice_name); missing keys fall back to defaults.
+    """
+    d_mode = defaults.get("mode", "link")
+    d_tag = defaults.get("list_tag")
+    d_first = defaults.get("first")
+    d_url = defaults.get("short_url")
+    d_phone = defaults.get("office_phone", "")
+    d_touch = defaults.get("touch", "t1")
+    d_opt_out = defaults.get("include_opt_out", True)
+    d_practice = defaults.get("practice_name", PRACTICE_NAME)
+    out = []
+    append = out.append
+    for row in rows:
+        get = row.get
+        tpl = lookup(get("mode", d_mode), get("touch", d_touch), get("list_tag", d_tag), get("include_opt_out", d_opt_out),
+                     get("practice_name", d_practice))
+        url = get("short_url", d_url) if tpl.uses_url else ""
+        if tpl.uses_url and not url:
+            raise ValueError("short_url is required for link mode")
+        p0, p1, p2, p3 = tpl.parts
+        name = (get("first", d_first) or "").strip() or "there"
+        append(f"{p0}{name}{p1}{url}{p2}{get('office_phone', d_phone)}{p3}")
+    return out
+
+
 # Optional helper: single entry point if you prefer one function.
 def render_message(
     *,
@@ -107,24 +247,12 @@ def render_message(
     short_url: Optional[str] = None,
     touch: str = "t1",
     include_opt_out: bool = True,
+    practice_name: str = PRACTICE_NAME,
 ) -> str:
-    mode = (mode or "link").strip().lower()
-    if mode == "manual":
-        return render_manual_mode(
-            list_tag=list_tag,
-            first=first,
-            office_phone=office_phone,
-            touch=touch,
-            include_opt_out=include_opt_out,
-        )
-    # default: link mode requires a URL
-    if not short_url:
+    tpl = lookup(mode, touch, list_tag, include_opt_out, practice_name)
+    if not tpl.uses_url:
+        short_url = ""
+    elif not short_url:
+        # default: link mode requires a URL
         raise ValueError("short_url is required for link mode")
-    return render_link_mode(
-        list_tag=list_tag,
-        first=first,
-        short_url=short_url,
-        office_phone=office_phone,
-        touch=touch,
-        include_opt_out=include_opt_out,
-    )
+    return tpl.render((first or "").strip() or "there", short_url, office_phone)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Golden bodies for every compiled template variant (mode, touch, list_tag, opt-out).
+
+The expected strings are literal copies of the message copy, so any byte that changes in
+the compiled path, the reference render_*_mode functions or render_many fails here.
+
+Usage:
+    cd deprecated/python && python3 -m unittest test_templates
+"""
+
+import unittest
+
+import templates
+from templates import render_link_mode, render_manual_mode, render_many, render_message
+
+URL = "https://rb.example/s/Ab3dE9xZ"
+PHONE = "301-656-7872"
+STOP = " Reply STOP to opt out."
+
+GOLDEN = {
+    ("link", "t1", "past_due", False):
+        "Hi Ann, this is Bethesda Dental Smiles. Your recall/cleaning is past due. "
+        "Book here: https://rb.example/s/Ab3dE9xZ\n\nQuestions? Call 301-656-7872.",
+    ("link", "t1", "due_soon", False):
+        "Hi Ann, this is Bethesda Dental Smiles. You’re due for your next hygiene/recall visit. "
+        "Book here: https://rb.example/s/Ab3dE9xZ\n\nQuestions? Call 301-656-7872.",
+    ("link", "t2", "past_due", False):
+        "Hi Ann, this is Bethesda Dental Smiles, following up on your overdue recall/cleaning. "
+        "We still have openings this week. Book here: https://rb.example/s/Ab3dE9xZ\n\n"
+        "Questions? Call 301-656-7872.",
+    ("link", "t2", "due_soon", False):
+        "Hi Ann, this is Bethesda Dental Smiles, checking back about your hygiene/recall visit. "
+        "We still have openings this week. Book here: https://rb.example/s/Ab3dE9xZ\n\n"
+        "Questions? Call 301-656-7872.",
+    ("manual", "t1", "past_due", False):
+        "Hi Ann, this is Bethesda Dental Smiles. Your recall/cleaning is past due. "
+        "Reply YES and we’ll call to schedule. Prefer a call now? Text CALL ME.\n\n"
+        "Questions? Call 301-656-7872.",
+    ("manual", "t1", "due_soon", False):
+        "Hi Ann, this is Bethesda Dental Smiles. You’re due for your next hygiene/recall visit. "
+        "Reply YES and we’ll call to schedule. Prefer a call now? Text CALL ME.\n\n"
+        "Questions? Call 301-656-7872.",
+    ("manual", "t2", "past_due", False):
+        "Hi Ann, this is Bethesda Dental Smiles. Following up about your hygiene/recall visit. "
+        "Reply YES and we’ll call to schedule. Prefer a call now? Text CALL ME.\n\n"
+        "Questions? Call 301-656-7872.",
+    ("manual", "t2", "due_soon", False):
+        "Hi Ann, this is Bethesda Dental Smiles. Following up about your hygiene/recall visit. "
+        "Reply YES and we’ll call to schedule. Prefer a call now? Text CALL ME.\n\n"
+        "Questions? Call 301-656-7872.",
+}
+GOLDEN.update({(m, t, g, True): body + STOP for (m, t, g, _), body in list(GOLDEN.items())})
+
+
+def _reference(mode, touch, tag, opt_out, first="Ann", url=URL, phone=PHONE):
+    if mode == "manual":
+        return render_manual_mode(list_tag=tag, first=first, office_phone=phone, touch=touch,
+                                  include_opt_out=opt_out)
+    return render_link_mode(list_tag=tag, first=first, short_url=url, office_phone=phone, touch=touch,
+                            include_opt_out=opt_out)
+
+
+class GoldenVariantTest(unittest.TestCase):
+
+    def test_every_variant_is_covered(self):
+        self.assertEqual(len(GOLDEN), 16)
+        self.assertEqual(set(GOLDEN), set(templates.TEMPLATES))
+
+    def test_render_message(self):
+        for (mode, touch, tag, opt_out), body in GOLDEN.items():
+            with self.subTest(mode=mode, touch=touch, list_tag=tag, opt_out=opt_out):
+                self.assertEqual(render_message(mode=mode, touch=touch, list_tag=tag, include_opt_out=opt_out,
+                                                first="Ann", short_url=URL, office_phone=PHONE), body)
+
+    def test_reference_functions(self):
+        for key, body in GOLDEN.items():
+            with self.subTest(key=key):
+                self.assertEqual(_reference(*key), body)
+
+    def test_render_many(self):
+        rows = [{"mode": m, "touch": t, "list_tag": g, "include_opt_out": o} for m, t, g, o in GOLDEN]
+        self.assertEqual(render_many(rows, first="Ann", short_url=URL, office_phone=PHONE), list(GOLDEN.values()))
+
+    def test_manual_mode_ignores_url(self):
+        body = render_message(mode="manual", touch="t1", list_tag="past_due", first="Ann", short_url=URL,
+                              office_phone=PHONE)
+        self.assertEqual(body, GOLDEN[("manual", "t1", "past_due", True)])
+        self.assertNotIn(URL, body)
+
+
+class EdgeInputTest(unittest.TestCase):
+
+    def render(self, **kw):
+        args = dict(mode="link", touch="t1", list_tag="due_soon", first="Ann", short_url=URL, office_phone=PHONE)
+        args.update(kw)
+        return render_message(**args)
+
+    def test_blank_and_whitespace_names_greet_there(self):
+        expected = ("Hi there, this is Bethesda Dental Smiles. Your recall/cleaning is past due. "
+                    "Book here: https://rb.example/s/Ab3dE9xZ\n\nQuestions? Call 301-656-7872." + STOP)
+        for first in (None, "", "   ", "\t\n"):
+            with self.subTest(first=first):
+                self.assertEqual(self.render(list_tag="past_due", first=first), expected)
+                self.assertEqual(_reference("link", "t1", "past_due", True, first=first), expected)
+                self.assertEqual(render_many([{"first": first}], list_tag="past_due", short_url=URL,
+                                             office_phone=PHONE), [expected])
+
+    def test_name_is_trimmed(self):
+        self.assertEqual(self.render(first="  Ann \n"), GOLDEN[("link", "t1", "due_soon", True)])
+
+    def test_unknown_or_missing_tag_is_due_soon(self):
+        for tag in (None, "", "recall", "overdue", "DUE_SOON"):
+            with self.subTest(list_tag=tag):
+                self.assertEqual(self.render(list_tag=tag), GOLDEN[("link", "t1", "due_soon", True)])
+                self.assertEqual(_reference("link", "t1", tag, True), GOLDEN[("link", "t1", "due_soon", True)])
+
+    def test_tag_touch_and_mode_are_case_and_space_insensitive(self):
+        self.assertEqual(self.render(list_tag=" PAST_DUE ", touch=" T2 "), GOLDEN[("link", "t2", "past_due", True)])
+        self.assertEqual(self.render(mode="MANUAL", touch="T2", list_tag="Past_Due"),
+                         GOLDEN[("manual", "t2", "past_due", True)])
+        # anything that is not t2 is a first touch
+        self.assertEqual(self.render(touch=None), GOLDEN[("link", "t1", "due_soon", True)])
+        self.assertEqual(self.render(touch="t3"), GOLDEN[("link", "t1", "due_soon", True)])
+
+    def test_non_ascii_name(self):
+        self.assertEqual(
+            self.render(mode="manual", first="Zoë \U0001f600", touch="t2"),
+            "Hi Zoë \U0001f600, this is Bethesda Dental Smiles. Following up about your hygiene/recall visit. "
+            "Reply YES and we’ll call to schedule. Prefer a call now? Text CALL ME.\n\n"
+            "Questions? Call 301-656-7872." + STOP)
+        self.assertEqual(self.render(first="José"),
+                         GOLDEN[("link", "t1", "due_soon", True)].replace("Hi Ann,", "Hi José,"))
+
+    def test_slot_values_are_not_formatted(self):
+        self.assertEqual(
+            self.render(first="{first}", short_url="https://x.test/?a={0}&b=%s", office_phone="{office_phone}",
+                        include_opt_out=False),
+            "Hi {first}, this is Bethesda Dental Smiles. You’re due for your next hygiene/recall visit. "
+            "Book here: https://x.test/?a={0}&b=%s\n\nQuestions? Call {office_phone}.")
+
+    def test_other_practice_name(self):
+        self.assertEqual(self.render(practice_name="Rockville Family Dental"),
+                         GOLDEN[("link", "t1", "due_soon", True)].replace("Bethesda Dental Smiles",
+                                                                          "Rockville Family Dental"))
+
+    def test_link_mode_requires_url(self):
+        for url in (None, ""):
+            with self.subTest(short_url=url):
+                with self.assertRaises(ValueError):
+                    self.render(short_url=url)
+                with self.assertRaises(ValueError):
+                    render_many([{"short_url": url}], office_phone=PHONE)
+
+
+if __name__ == "__main__":
+    unittest.main()
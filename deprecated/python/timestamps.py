@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Column-aware timestamp parsing for recall CSVs.
+
+Sheets/Dentrix exports use one format per column and repeat the same values many
+times, so instead of trying fromisoformat + every strptime format per cell:
+
+- the first non-blank value of a column picks a specialized parser (ISO, ISO with Z,
+  or the Sheets "M/D/YYYY H:MM[:SS]" layout);
+- results are memoized per column in an LRU cache;
+- values the fast path cannot read fall back to parse_ts(), so results are identical;
+- blank cells are ignored, unreadable non-blank cells are counted per column.
+
+Usage (benchmark against parse_ts on a synthetic fixture):
+    python3 timestamps.py --bench 1000000
+"""
+
+import argparse
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional
+
+DEFAULT_CACHE_SIZE = 4096
+
+_SHEETS_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{1,2})(?::(\d{1,2}))?")
+_ISO_Z_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ].*Z")
+_ISO_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+Parser = Callable[[str], Optional[datetime]]
+
+
+def parse_ts(val):
+    """
+    Best-effort timestamp parser for ISO strings or Sheets datetime strings.
+    Returns timezone-aware UTC datetime or None.
+    """
+    if val is None:
+        return None
+    s = str(val).strip()
+    if not s:
+        return None
+    try:
+        if s.endswith("Z"):
+            return datetime.fromisoformat(s.replace("Z", "+00:00")).astimezone(timezone.utc)
+        return datetime.fromisoformat(s).astimezone(timezone.utc)
+    except Exception:
+        pass
+    # Fallback: try common sheet format e.g., 11/24/2025 18:52:41
+    for fmt in ("%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M"):
+        try:
+            return datetime.strptime(s, fmt).replace(tzinfo=timezone.utc)
+        except Exception:
+            continue
+    return None
+
+
+def _parse_sheets(s: str) -> Optional[datetime]:
+    m = _SHEETS_RE.fullmatch(s)
+    if not m:
+        return None
+    mo, d, y, hh, mi, ss = m.groups()
+    try:
+        return datetime(int(y), int(mo), int(d), int(hh), int(mi), int(ss or 0), tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def _parse_iso_z(s: str) -> Optional[datetime]:
+    if not s.endswith("Z"):
+        return None
+    try:
+        return datetime.fromisoformat(s[:-1] + "+00:00").astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
+def _parse_iso(s: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(s).astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
+FORMATS: Dict[str, Parser] = {
+    "sheets": _parse_sheets,
+    "iso_z": _parse_iso_z,
+    "iso": _parse_iso,
+}
+
+
+def detect_format(sample: str) -> str:
+    """Names the specialized parser for a column given one representative non-blank value."""
+    if _SHEETS_RE.fullmatch(sample):
+        return "sheets"
+    if _ISO_Z_RE.fullmatch(sample):
+        return "iso_z"
+    if _ISO_RE.match(sample):
+        return "iso"
+    return "generic"
+
+
+class ColumnTimestamps:
+    """Parser for a single column: detected fast path + LRU memo + failure counter."""
+
+    def __init__(self, name: str, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.name = name
+        self.format: Optional[str] = None
+        self.parsed = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self._cached = lru_cache(maxsize=cache_size)(self._parse_uncached)
+
+    def _parse_uncached(self, s: str) -> Optional[datetime]:
+        fast = FORMATS.get(self.format)
+        if fast is not None:
+            dt = fast(s)
+            if dt is not None:
+                return dt
+            self.fallbacks += 1
+        return parse_ts(s)
+
+    def parse(self, val) -> Optional[datetime]:
+        if val is None:
+            return None
+        s = str(val).strip()
+        if not s:
+            return None
+        if self.format is None:
+            self.format = detect_format(s)
+        self.parsed += 1
+        dt = self._cached(s)
+        if dt is None:
+            self.failures += 1
+        return dt
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+
+class TimestampColumns:
+    """One ColumnTimestamps per column name, created on first use."""
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.columns: Dict[str, ColumnTimestamps] = {}
+
+    def column(self, name: str) -> ColumnTimestamps:
+        col = self.columns.get(name)
+        if col is None:
+            col = ColumnTimestamps(name, self.cache_size)
+            self.columns[name] = col
+        return col
+
+    def parse(self, name: str, val) -> Optional[datetime]:
+        return self.column(name).parse(val)
+
+    def failures(self) -> Dict[str, int]:
+        """Per-column count of non-blank values that could not be parsed."""
+        return {name: col.failures for name, col in self.columns.items() if col.failures}
+
+
+def _fixture(n: int, distinct: int = 5000, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    pool = []
+    for i in range(distinct):
+        d = base + timedelta(minutes=rng.randint(0, 525600))
+        pool.append(d.strftime("%m/%d/%Y %H:%M:%S") if i % 2 else d.strftime("%Y-%m-%dT%H:%M:%SZ"))
+    sheets = [v for v in pool if "/" in v]
+    iso = [v for v in pool if "/" not in v]
+    # Half the cells blank; each column keeps a single format like real exports.
+    return [("" if rng.random() < 0.5 else rng.choice(sheets if c % 2 else iso), c % 4) for c in range(n)]
+
+
+def bench(cells: Iterable) -> Dict[str, float]:
+    cells = list(cells)
+    start = time.perf_counter()
+    for val, _ in cells:
+        parse_ts(val)
+    baseline = time.perf_counter() - start
+
+    cols = TimestampColumns()
+    names = ["responded_at", "booked_at", "t1_sent_at", "t2_sent_at"]
+    start = time.perf_counter()
+    for val, c in cells:
+        cols.parse(names[c], val)
+    fast = time.perf_counter() - start
+    return {"cells": len(cells), "parse_ts_per_sec": len(cells) / baseline, "columns_per_sec": len(cells) / fast}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark column-aware timestamp parsing against parse_ts.")
+    parser.add_argument("--bench", type=int, default=1000000, help="Number of cells in the synthetic fixture")
+    args = parser.parse_args()
+
+    res = bench(_fixture(args.bench))
+    rows = res["cells"] / 4  # four timestamp columns per recall row
+    print(f"Cells: {res['cells']} ({rows:.0f} rows x 4 timestamp columns)")
+    print(f"parse_ts:         {res['parse_ts_per_sec']:>12,.0f} cells/s  {res['parse_ts_per_sec'] / 4:>12,.0f} rows/s")
+    print(f"TimestampColumns: {res['columns_per_sec']:>12,.0f} cells/s  {res['columns_per_sec'] / 4:>12,.0f} rows/s")
+    print(f"Speedup: {res['columns_per_sec'] / res['parse_ts_per_sec']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# transport.py
+"""
+Pooled keep-alive HTTP transport for the Twilio REST calls made by the send script.
+
+- HttpTransport keeps up to `pool_size` persistent connections per host (size it to
+  --workers) so each send skips the TCP/TLS handshake.
+- RetryPolicy retries 429/5xx with full-jitter exponential backoff and honours
+  Retry-After. Non-idempotent requests (POST Messages.json) are retried only on 429 and
+  on 503 with Retry-After: a gateway 500/502/504 can arrive after the message was created. A pooled socket the server has already closed is dropped before use; a
+  request is sent again on a new socket only if writing it failed on a reused one (a
+  failure after that may mean Twilio already created the message, so it is raised).
+- Every attempt is timed into a LatencyHistogram so pool size, rate and timeouts
+  can be tuned from real numbers.
+
+Stdlib only (http.client), so it runs unchanged against api.twilio.com or a local stub.
+"""
+
+import bisect
+import http.client
+import queue
+import random
+import select
+import socket
+import threading
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from typing import Dict, FrozenSet, Optional, Tuple
+from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_POOL_SIZE = 4
+
+Response = namedtuple("Response", ["status", "headers", "body"])
+
+# Upper bounds (ms) of the latency buckets; anything slower lands in the overflow bucket.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 1500, 2500, 5000, 10000, 30000)
+
+# Raised by conn.request() when a reused keep-alive socket can no longer be written: nothing
+# reached the server, so the request is safe to send again on a new connection.
+_UNSENT_ERRORS = (BrokenPipeError, http.client.CannotSendRequest)
+
+
+def _dropped(conn: http.client.HTTPConnection) -> bool:
+    """True when an idle pooled socket is closed (readable means EOF or junk from the server)."""
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class TransportError(Exception):
+    """
+    Raised when a request could not be completed (network failure or retries exhausted).
+    `unsent` is True only when the request never fully left the process (connect or write
+    failed), so the server cannot have acted on it.
+    """
+
+    def __init__(self, message: str, response: Optional[Response] = None, unsent: bool = False):
+        super().__init__(message)
+        self.response = response
+        self.unsent = unsent
+
+
+class LatencyHistogram:
+    """Thread-safe fixed-bucket latency histogram with approximate percentiles."""
+
+    def __init__(self, bounds_ms=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float) -> None:
+        i = bisect.bisect_left(self.bounds, ms)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def merge(self, snapshot: Dict[str, object]) -> None:
+        """Adds another histogram's snapshot() (same bounds), e.g. from a worker process."""
+        counts = list(snapshot["buckets"].values())
+        if len(counts) != len(self.counts):
+            raise ValueError("histogram bounds differ")
+        with self._lock:
+            for i, c in enumerate(counts):
+                self.counts[i] += c
+            self.count += snapshot["count"]
+            self.total_ms += snapshot["mean_ms"] * snapshot["count"]
+            self.max_ms = max(self.max_ms, snapshot["max_ms"])
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile, capped at the observed max."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q / 100.0 * self.count
+            seen = 0
+            for i, c in enumerate(self.counts):
+                seen += c
+                if c and seen >= rank:
+                    return min(float(self.bounds[i]), self.max_ms) if i < len(self.bounds) else self.max_ms
+            return self.max_ms
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": {f"le_{b}": c for b, c in zip(self.bounds + ("inf",), self.counts)},
+        }
+
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+
+    def should_retry(self, method: str, resp: Response) -> bool:
+        if resp.status not in self.retry_statuses:
+            return False
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        # the request was refused before it was processed
+        return resp.status == 429 or (resp.status == 503 and "retry-after" in resp.headers)
+
+    def delay(self, attempt: int, resp: Optional[Response] = None) -> float:
+        """Seconds to wait before retry number `attempt` (1-based)."""
+        retry_after = _retry_after_seconds(resp.headers.get("retry-after")) if resp is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max * 4)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpTransport:
+    """Keep-alive connection pool + retries + per-request timeouts + latency histogram."""
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 retry: Optional[RetryPolicy] = None):
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.latency = LatencyHistogram()
+        self.retries = 0
+        self.status_counts: Dict[int, int] = {}
+        self._pools: Dict[Tuple[str, str, int], "queue.LifoQueue"] = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> Response:
+        """Performs the request, retrying per policy. Returns the final Response (any status)."""
+        attempt = 0
+        while True:
+            resp = self._send_once(method, url, body, headers or {}, timeout or self.timeout)
+            if attempt >= self.retry.max_retries or not self.retry.should_retry(method, resp):
+                return resp
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(self.retry.delay(attempt, resp))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            statuses = dict(self.status_counts)
+            retries = self.retries
+        return {"latency": self.latency.snapshot(), "retries": retries, "status_counts": statuses}
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    def _pool(self, key: Tuple[str, str, int]) -> "queue.LifoQueue":
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = queue.LifoQueue(maxsize=self.pool_size)
+                self._pools[key] = pool
+            return pool
+
+    def _send_once(self, method: str, url: str, body: Optional[bytes], headers: Dict[str, str],
+                   timeout: float) -> Response:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "https"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname or "", port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        pool = self._pool(key)
+
+        for fresh in (False, True):
+            conn = None
+            while not fresh:
+                try:
+                    conn = pool.get_nowait()
+                except queue.Empty:
+                    fresh = True
+                    break
+                if not _dropped(conn):
+                    break
+                conn.close()
+                conn = None
+            if conn is None:
+                cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+                conn = cls(key[1], port, timeout=timeout)
+            else:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+            except _UNSENT_ERRORS as e:
+                conn.close()
+                if not fresh:
+                    continue  # reused keep-alive socket could not be written; reopen once
+                raise TransportError(f"{method} {url} failed: {e!r}", unsent=True) from e
+            except (socket.timeout, OSError, http.client.HTTPException) as e:
+                # connect or write failed: the server never got a complete request
+                conn.close()
+                raise TransportError(f"{method} {url} failed: {e!r}", unsent=True) from e
+            try:
+                # from here on the server may have acted on the request: never resend
+                raw = conn.getresponse()
+                data = raw.read()
+            except (socket.timeout, OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise TransportError(f"{method} {url} failed: {e!r}") from e
+            self.latency.observe((time.perf_counter() - start) * 1000.0)
+            resp = Response(raw.status, {k.lower(): v for k, v in raw.getheaders()}, data)
+            with self._lock:
+                self.status_counts[resp.status] = self.status_counts.get(resp.status, 0) + 1
+            if raw.will_close:
+                conn.close()
+            else:
+                try:
+                    pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            return resp
+        raise TransportError(f"{method} {url} failed: no connection")  # pragma: no cover
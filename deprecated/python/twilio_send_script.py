@@ -9,6 +9,12 @@ Usage:
     python3 twilio_send_script.py /path/to/file.csv --force
     python3 twilio_send_script.py /path/to/file.csv --mode manual   # no scheduler link
     python3 twilio_send_script.py /path/to/file.csv --mode link     # with scheduler link (default)
+    python3 twilio_send_script.py /path/to/file.csv --plan plan.jsonl   # validate + render only
+    python3 twilio_send_script.py --commit plan.jsonl                   # send a reviewed plan
+    python3 twilio_send_script.py /path/to/file.csv --workers 8 --rate 20
+    python3 twilio_send_script.py /path/to/file.csv --simulate --rate 20   # segments, cost, duration
+    python3 twilio_send_script.py /path/to/file.csv --api-base http://127.0.0.1:8765  # local fake Twilio
+    python3 twilio_send_script.py /path/to/file.csv --short-links links.sqlite --short-base https://rb.example/s
 
 Rules (CSV-driven; no sheet lookups):
 - Require: e164_phone present and valid, do_not_text is FALSE.
@@ -17,16 +23,63 @@ Rules (CSV-driven; no sheet lookups):
 - sent_status=sent rows are skipped unless --force.
 - list_tag drives copy variant ("past_due" or "due_soon"); row-level "mode" overrides CLI --mode.
 - in link mode, appends ?lt=<list_tag>&pn=<e164_phone> and uses Twilio link shortening.
+- the CSV is read once: validation, eligibility and rendering stream into a plan spooled to
+  disk; --plan keeps that file for review and --commit sends it later without the CSV.
+- every send is recorded in a SQLite ledger keyed by (campaign, touch, phone); reruns skip
+  phones already sent (or left pending by a crash), so an interrupted run resumes safely.
+- sends run on a bounded worker pool (--workers) behind a per-Messaging-Service token bucket
+  (--rate messages/sec); output lines are still printed in row order.
+- the default http transport reuses keep-alive connections, retries 429 (and 503 with
+  Retry-After) with jittered backoff and reports API latency percentiles in the RUN SUMMARY.
+- --metrics PATH writes per-stage timings, rows/sec, API latency percentiles and errors by
+  Twilio code as JSON (or Prometheus text for *.prom) at the end of the run, and every
+  --metrics-interval seconds while it runs.
+- the parsed list (normalized phones, epoch timestamps, coded statuses) is cached as
+  <csv name>.columns.npz next to the CSV, keyed by the file's hash; later passes over the
+  same file memory-map it instead of re-parsing (needs numpy; --no-cache to disable).
+- --simulate renders every eligible body and reports GSM-7/UCS-2 encoding, SMS segment
+  counts, cost and the projected duration at --rate/--workers, plus the worst-case bodies;
+  nothing is sent (works with --commit PLAN too).
+- --dedupe-store PATH keeps a time-windowed record of phones texted across runs and
+  campaigns; phones texted within --dedupe-window hours are skipped.
+- --event-log PATH records the run and every SENT/SKIP/ERROR row as 70_EventLog rows
+  (JSONL, or SQLite for *.sqlite), written behind in batches with one fsync per batch.
+- --short-links INDEX.sqlite replaces Twilio link shortening with deterministic codes
+  (--short-base URL/<code>) written to a code -> touch index before sending; the SID is
+  attached to each code as it is sent and `shortlink.py serve` answers the redirects.
 """
 
-import csv
 import os
 import sys
 import argparse
-from datetime import datetime, timedelta, timezone
-from urllib.parse import quote_plus
-from templates import render_message
-from twilio.rest import Client
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from send_pipeline import (
+    CsvStats,
+    evaluate,
+    read_plan,
+    render,
+    write_plan,
+)
+from send_engine import (
+    DEFAULT_RATE_MPS,
+    DEFAULT_WORKERS,
+    OrderedDispatcher,
+    RateLimiters,
+    RestMessages,
+    rate_limited,
+    send_rejected,
+)
+from dedupe_store import DedupeStore
+from event_log import EventLog
+from list_cache import ListCache, available as list_cache_available, candidates_for
+from send_ledger import SendLedger, default_ledger_path
+from send_metrics import RunMetrics
+from shortlink import LinkIndex, ShortLinker
+from simulate import Simulation, add_arguments as add_simulation_arguments
+from templates import PRACTICE_NAME
+from transport import DEFAULT_TIMEOUT, HttpTransport, RetryPolicy
 
 # =====================================================================
 # CONFIG
@@ -36,108 +89,217 @@ BOOKING_URL = "https://schedule.solutionreach.com/scheduling/subscriber/79395/sc
 OFFICE_PHONE = "301-656-7872"
 MESSAGING_SERVICE_SID = "MGaf34766209ca8d189e1f03fef1f524f4"
 
-TRUEY = {"true", "1", "yes", "y", "t"}
-WORKABLE_STATUSES = {"", "new", "calling", "lvm", "texted"}
-STRONG_STATUSES = {"booked", "closed", "wrong_number", "dnd"}
-RECENT_REPLY_DAYS = 14
-MIN_T2_HOURS = 60
+# Per-row event types with no Apps Script counterpart (Send.js logs sends and failures only).
+SKIP_EVENT = "send.skipped"
+DRY_RUN_EVENT = "send.dry_run"
 
-def is_true(val):
-    if val is None:
-        return False
-    return str(val).strip().lower() in TRUEY
 
-def parse_ts(val):
-    """
-    Best-effort timestamp parser for ISO strings or Sheets datetime strings.
-    Returns timezone-aware UTC datetime or None.
-    """
-    if val is None:
-        return None
-    s = str(val).strip()
-    if not s:
-        return None
-    try:
-        if s.endswith("Z"):
-            return datetime.fromisoformat(s.replace("Z", "+00:00")).astimezone(timezone.utc)
-        return datetime.fromisoformat(s).astimezone(timezone.utc)
-    except Exception:
+def validate_csv(csv_path, preview_rows=10, cache=None):
+    """Streams the CSV once for header/blank/duplicate checks and prints the summary."""
+    stats = CsvStats(preview_rows)
+    # Rows are normalized too, so unparseable timestamps are reported and the list cache
+    # the following passes load gets built here.
+    for _ in candidates_for(csv_path, stats, "link", cache):
         pass
-    # Fallback: try common sheet format e.g., 11/24/2025 18:52:41
-    for fmt in ("%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M"):
-        try:
-            return datetime.strptime(s, fmt).replace(tzinfo=timezone.utc)
-        except Exception:
-            continue
-    return None
-
-def normalize_e164(val):
-    """
-    Normalize to +1XXXXXXXXXX (last 10 digits). Returns '' if not valid.
+    return stats.report()
+
+def commit_plan(header, entries, args, metrics=None, ceiling=None, failed=None):
+    """Prints/sends a rendered plan in row order and returns the RUN SUMMARY counters.
+
+    `failed`, when given, is a set that collects the phones whose send errored.
     """
-    if val is None:
-        return ""
-    digits = "".join([c for c in str(val) if c.isdigit()])
-    if len(digits) >= 10:
-        core = digits[-10:]
-        return "+1" + core
-    return ""
-
-def validate_csv(csv_path, preview_rows=10):
-    required_headers = {
-        "e164_phone",
-        "list_tag",
-        "FName",
-        "LName",
-        "do_not_text",
-        "responded_at",
-        "booked_at",
-        "t1_sent_at",
-        "t2_sent_at",
-    }
-    seen_phones = set()
-    preview = []
+    touch = header.get("touch") or args.touch
+    campaign = header.get("campaign") or args.campaign
+    metrics = metrics or RunMetrics()
+    metrics.labels.update(touch=touch, campaign=campaign)
+    ledger_path = args.ledger or default_ledger_path(header.get("csv") or args.commit)
+    ledger = None if args.no_ledger else SendLedger.open_for(ledger_path, campaign, touch, dry_run=args.dry_run)
+    if ledger is not None:
+        print(f"Ledger {ledger_path} (campaign={campaign}, touch={touch}): {ledger.counts() or 'empty'}")
+    recent = None
+    if args.dedupe_store and not (args.dry_run and not os.path.exists(args.dedupe_store)):
+        # Cross-campaign guard: one text per phone per window, whichever list it came from.
+        recent = DedupeStore(window_s=args.dedupe_window * 3600.0, path=args.dedupe_store)
+        print(f"Dedupe store {args.dedupe_store}: {len(recent)} phones texted in the last {args.dedupe_window:g}h")
+    events = EventLog(args.event_log) if args.event_log else None
+    links = LinkIndex(args.short_links, args.short_secret or None) if args.short_links and not args.dry_run else None
+    run_id = str(uuid.uuid4())
+    run_type = "RUN_SEND_DRY_RUN" if args.dry_run else "RUN_SEND"
+
+    def log_event(event_type, notes, payload=None, **extras):
+        if events is not None:
+            events.log(event_type, run_id, args.practice_id, notes, payload, extras)
+
+    log_event(run_type + "_START", f"SendReady start {touch} {campaign}",
+              {"csv": header.get("csv") or "", "campaign_id": campaign, "touch_type": touch})
     total = 0
-    blanks = 0
-    dups = 0
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        headers = set(reader.fieldnames or [])
-        missing = required_headers - headers
-        if missing:
-            print(f"ERROR: Missing required headers: {', '.join(missing)}")
-            return False
-        for idx, row in enumerate(reader, start=1):
+    sent_count = 0
+    skipped_reasons = {}
+    error_count = 0
+
+    dispatcher = OrderedDispatcher(workers=args.workers)
+    send = None
+    transport = None
+    if not args.dry_run:
+        # creds
+        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+        if not account_sid or not auth_token:
+            print("ERROR: TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN must be set as env vars.")
+            sys.exit(1)
+        if args.transport == "sdk":
+            from twilio.rest import Client
+            messages = Client(account_sid, auth_token).messages
+        else:
+            # keep-alive pool sized to the worker count; a send is retried only on 429 / 503 + Retry-After
+            transport = HttpTransport(pool_size=args.workers, timeout=args.timeout,
+                                      retry=RetryPolicy(max_retries=args.max_retries))
+            messages = RestMessages(account_sid, auth_token, api_base=args.api_base, transport=transport)
+        send = rate_limited(metrics.timed_call(messages.create), RateLimiters(args.rate, ceiling=ceiling))
+
+    def on_sent(idx, e164, effective_mode, code=None):
+        def _done(msg, exc):
+            nonlocal sent_count, error_count
+            if exc is not None:
+                rejected = send_rejected(exc)
+                print(f"[{idx}] ERROR sending to {e164}: {exc}"
+                      + ("" if rejected else " (outcome unknown; reconcile before resending)"))
+                error_count += 1
+                metrics.error(exc)
+                if failed is not None:
+                    failed.add(e164)
+                log_event("RUN_SEND_FAIL", "Twilio send failed", {"row": idx, "to": e164}, error=str(exc))
+                if ledger is not None:
+                    if rejected:
+                        ledger.fail(e164, str(exc))
+                    else:
+                        # the request may have reached Twilio: keep the row blocking until reconcile.py
+                        ledger.unresolved(e164, str(exc))
+                return
+            print(f"[{idx}] SENT -> to={e164} sid={msg.sid} (mode={effective_mode}, touch={touch})")
+            sent_count += 1
+            metrics.success()
+            log_event("RUN_SEND_PASS", "Twilio sent", {"row": idx, "to": e164, "mode": effective_mode},
+                      twilio_message_sid=msg.sid, dedupe_key="send:" + e164)
+            if ledger is not None:
+                ledger.succeed(e164, msg.sid)
+            if code and links is not None:
+                links.attach_sid(code, msg.sid)
+            if recent is not None:
+                recent.add("send:" + e164)
+        return _done
+
+    with metrics.phase("commit"), dispatcher:
+        for entry in metrics.timed("plan_read", entries):
+            idx = entry["idx"]
             total += 1
-            phone = row.get("e164_phone", "").strip()
-            if not phone:
-                blanks += 1
-            elif phone in seen_phones:
-                dups += 1
-            else:
-                seen_phones.add(phone)
-            if len(preview) < preview_rows:
-                preview.append(row)
-    print(f"\nCSV VALIDATION SUMMARY:")
-    print(f"  Total rows: {total}")
-    print(f"  Blank e164_phone: {blanks}")
-    print(f"  Duplicate e164_phone: {dups}")
-    print(f"  Unique e164_phone: {len(seen_phones)}")
-    print(f"  Headers: {sorted(headers)}")
-    print(f"\nPreview (first {preview_rows} rows):")
-    for i, row in enumerate(preview, 1):
-        print(f"  [{i}] {row}")
-    if missing or blanks:
-        print("\nERROR: Validation failed. Fix issues above or use --force to override.")
-        return False
-    if dups:
-        print("\nWARNING: Duplicate e164_phone detected in CSV; duplicates will be skipped at send time.")
-    print("\nValidation passed.")
-    return True
+            if "skip" in entry:
+                dispatcher.emit(entry["skip"])
+                key = entry["reason"]
+                skipped_reasons[key] = skipped_reasons.get(key, 0) + 1
+                log_event(SKIP_EVENT, key, {"row": idx})
+                continue
+            prior = ledger.blocks(entry["to"]) if ledger is not None else None
+            if prior is not None:
+                if prior.state == "sent":
+                    key = "already sent per ledger"
+                    detail = f"{key} (sid={prior.sid})"
+                else:
+                    key = "ledger attempt pending from an interrupted or failed run (reconcile before resending)"
+                    detail = key
+                dispatcher.emit(f"[{idx}] SKIP {entry.get('name', '')} — {detail}")
+                skipped_reasons[key] = skipped_reasons.get(key, 0) + 1
+                log_event(SKIP_EVENT, key, {"row": idx, "to": entry["to"]}, twilio_message_sid=prior.sid or "")
+                continue
+            if recent is not None and recent.seen("send:" + entry["to"]):
+                key = f"phone texted within the last {args.dedupe_window:g}h (dedupe store)"
+                dispatcher.emit(f"[{idx}] SKIP {entry.get('name', '')} — {key}")
+                skipped_reasons[key] = skipped_reasons.get(key, 0) + 1
+                log_event(SKIP_EVENT, key, {"row": idx, "to": entry["to"]})
+                continue
+            dispatcher.emit(entry["note"])
+            if args.dry_run:
+                dispatcher.emit(f"[{idx}] DRY RUN -> to={entry['to']} | body={entry['body']}")
+                log_event(DRY_RUN_EVENT, "would send", {"row": idx, "to": entry["to"], "mode": entry["mode"]})
+                continue
 
-def main():
+            # send via Twilio (worker pool; result lines are released in row order).
+            # The ledger row is committed as pending before the request can leave the process.
+            if ledger is not None:
+                ledger.begin(entry["to"], idx)
+            dispatcher.submit(
+                send,
+                on_sent(idx, entry["to"], entry["mode"], entry.get("link")),
+                messaging_service_sid=args.messaging_service_sid,
+                to=entry["to"],
+                body=entry["body"],
+                shorten_urls="link" not in entry,  # no-op in manual mode; our own short link needs none
+                status_callback=None  # set at the Messaging Service level
+            )
+    if ledger is not None:
+        ledger.close()
+    if recent is not None:
+        recent.close()
+    if links is not None:
+        links.close()
+    if events is not None:
+        log_event(run_type + "_PASS", f"SendReady {touch} {campaign} complete",
+                  {"rows": total, "sent_count": sent_count, "error_count": error_count,
+                   "skipped_count": sum(skipped_reasons.values()), "campaign_id": campaign, "touch_type": touch})
+        events.close()
+        ev = events.stats()
+        print(f"Event log {args.event_log}: {ev['events']} events in {ev['batches']} batches ({ev['fsyncs']} fsyncs)")
+    api_stats = None
+    if transport is not None:
+        api_stats = transport.stats()
+        metrics.transport = api_stats
+        transport.close()
+    return total, sent_count, error_count, skipped_reasons, api_stats
+
+def simulate_plan(header, entries, args):
+    """--simulate: a Simulation over the sends commit_plan would make (same ledger/dedupe skips); sends nothing."""
+    touch = header.get("touch") or args.touch
+    campaign = header.get("campaign") or args.campaign
+    ledger = None
+    if not args.no_ledger:
+        ledger = SendLedger.open_for(args.ledger or default_ledger_path(header.get("csv") or args.commit),
+                                     campaign, touch, dry_run=True)
+    recent = None
+    if args.dedupe_store and os.path.exists(args.dedupe_store):
+        recent = DedupeStore(window_s=args.dedupe_window * 3600.0, path=args.dedupe_store)
+    sim = Simulation(args.short_url_len, args.worst)
+    for entry in entries:
+        reason = None
+        if "skip" not in entry:
+            if ledger is not None and ledger.blocks(entry["to"]) is not None:
+                reason = "ledger"
+            elif recent is not None and recent.seen("send:" + entry["to"]):
+                reason = "dedupe store"
+        sim.observe(entry, reason)
+    if ledger is not None:
+        ledger.close()
+    if recent is not None:
+        recent.close()
+    return sim
+
+def print_summary(total, sent_count, error_count, skipped_reasons, api_stats=None):
+    print("\n=== RUN SUMMARY ===")
+    print(f"Total rows processed: {total}")
+    print(f"Sent: {sent_count}")
+    print(f"Errors: {error_count}")
+    if api_stats and api_stats["latency"]["count"]:
+        lat = api_stats["latency"]
+        print(f"API latency (ms): p50<={lat['p50_ms']:g} p95<={lat['p95_ms']:g} p99<={lat['p99_ms']:g} "
+              f"max={lat['max_ms']:g} over {lat['count']} requests; retries={api_stats['retries']}")
+    if skipped_reasons:
+        print("Skipped by reason:")
+        for reason, count in sorted(skipped_reasons.items(), key=lambda x: x[1], reverse=True):
+            print(f"  {count} -> {reason}")
+    print("Done.")
+
+def build_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument("csv_path", help="Path to CSV file")
+    parser.add_argument("csv_path", nargs="?", help="Path to CSV file")
     parser.add_argument("--dry-run", action="store_true", help="Print what would be sent")
     parser.add_argument("--force", action="store_true", help="Send even if sent_status == sent or validation fails")
     parser.add_argument("--mode", choices=["link", "manual"], default="link",
@@ -145,147 +307,185 @@ def main():
     parser.add_argument("--touch", choices=["t1", "t2"], default="t1",
                         help="Touch pass to run (t1 or t2). Rows are filtered per-touch.")
     parser.add_argument("--validate", action="store_true", help="Validate CSV and preview rows, then exit")
+    parser.add_argument("--plan", metavar="PLAN_PATH",
+                        help="Validate + render every row into a plan file, then exit without sending")
+    parser.add_argument("--commit", metavar="PLAN_PATH",
+                        help="Send a plan written by --plan (the CSV is not re-read)")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Project segments, cost and duration for the eligible sends instead of sending")
+    parser.add_argument("--campaign", default="",
+                        help="Ledger campaign key (default: CSV file name without extension)")
+    parser.add_argument("--ledger", default="",
+                        help="Send ledger path (default: <csv name>.ledger.sqlite next to the CSV)")
+    parser.add_argument("--no-ledger", action="store_true",
+                        help="Do not consult or record the send ledger")
+    parser.add_argument("--cache", default="",
+                        help="Columnar list cache path (default: <csv name>.columns.npz next to the CSV)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always parse the CSV; do not read or write the list cache")
+    parser.add_argument("--dedupe-store", metavar="PATH", default="",
+                        help="SQLite dedupe store shared across runs: skip phones texted within --dedupe-window")
+    parser.add_argument("--dedupe-window", type=float, default=24.0,
+                        help="Hours a phone stays blocked in --dedupe-store (default 24)")
+    parser.add_argument("--event-log", metavar="PATH", default="",
+                        help="Append run and per-row events (70_EventLog columns) here: JSONL, or SQLite for *.sqlite")
+    parser.add_argument("--practice-id", default="", help="practice_id written on --event-log rows")
+    parser.add_argument("--short-links", metavar="INDEX", default="",
+                        help="Use local short links (code -> touch index in this SQLite file) instead of Twilio shortening")
+    parser.add_argument("--short-base", default=os.getenv("RB_SHORT_BASE", ""),
+                        help="Public base URL of `shortlink.py serve`; bodies carry <base>/<code> (RB_SHORT_BASE)")
+    parser.add_argument("--short-secret", default=os.getenv("RB_SHORTLINK_SECRET", ""),
+                        help="Code key for a new index (default: random, stored in the index) (RB_SHORTLINK_SECRET)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Concurrent Twilio API calls (1 = serial)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_MPS,
+                        help="Max messages/sec per Messaging Service (0 = unlimited)")
+    parser.add_argument("--transport", choices=["http", "sdk"], default="http",
+                        help="http = pooled keep-alive client with retries (default); sdk = twilio.rest.Client")
+    parser.add_argument("--api-base", default=os.getenv("TWILIO_API_BASE", ""),
+                        help="Twilio-compatible base URL for the http transport (e.g. a local fake server)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-request timeout in seconds")
+    parser.add_argument("--max-retries", type=int, default=3, help="Retries on 429, or 503 with Retry-After (http transport)")
+    parser.add_argument("--metrics", metavar="PATH", default="",
+                        help="Write a run metrics report here (JSON, or Prometheus text if PATH ends in .prom)")
+    parser.add_argument("--metrics-interval", type=float, default=0.0,
+                        help="Also rewrite the --metrics report every N seconds during the run")
+    parser.add_argument("--messaging-service-sid", default=os.getenv("TWILIO_MESSAGING_SERVICE_SID", MESSAGING_SERVICE_SID),
+                        help="Messaging Service SID (default: TWILIO_MESSAGING_SERVICE_SID or the built-in one)")
+    parser.add_argument("--booking-url", default=BOOKING_URL, help="Scheduler link used in link mode")
+    parser.add_argument("--office-phone", default=OFFICE_PHONE, help="Office phone quoted in the message")
+    parser.add_argument("--practice-name", default=PRACTICE_NAME, help="Practice name used in the message")
+    add_simulation_arguments(parser)
+    return parser
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
 
+    metrics = RunMetrics(touch=args.touch, campaign=args.campaign)
+    if args.metrics:
+        metrics.start_reporter(args.metrics, args.metrics_interval)
+    try:
+        run(parser, args, metrics)
+    finally:
+        if args.metrics:
+            metrics.stop_reporter()
+            metrics.write(args.metrics)
+            print(f"Metrics written to {args.metrics}")
+
+def run(parser, args, metrics, ceiling=None):
+
+    if args.commit:
+        with open(args.commit, encoding="utf-8") as f:
+            header, entries = read_plan(f)
+            if args.simulate:
+                print(f"Simulating plan {args.commit} (csv={header.get('csv')}, touch={header.get('touch')})")
+                sim = simulate_plan(header, entries, args)
+                return sim.report(args.rate, args.workers, args.latency_ms, args.price)
+            print(f"Committing plan {args.commit} (csv={header.get('csv')}, touch={header.get('touch')}, "
+                  f"planned_at={header.get('planned_at')})")
+            counts = commit_plan(header, entries, args, metrics, ceiling)
+        print_summary(*counts)
+        return counts
+
+    if not args.csv_path:
+        parser.error("csv_path is required unless --commit is given")
+    args.campaign = args.campaign or os.path.splitext(os.path.basename(args.csv_path))[0]
+    metrics.labels["campaign"] = args.campaign
+
+    cache = None
+    if not args.no_cache and list_cache_available():
+        cache = ListCache(args.csv_path, args.cache or None)
+
     if args.validate:
-        ok = validate_csv(args.csv_path)
+        ok = validate_csv(args.csv_path, cache=cache)
         sys.exit(0 if ok else 1)
 
-    # Always validate unless --force
-    if not args.force:
-        ok = validate_csv(args.csv_path)
-        if not ok:
+    links = None
+    linker = None
+    if args.short_links:
+        if not args.short_base:
+            parser.error("--short-links needs --short-base (or RB_SHORT_BASE)")
+        links = LinkIndex(args.short_links, args.short_secret or None)
+        linker = ShortLinker(links, args.short_base, args.campaign, args.touch)
+
+    # Single pass: validation counters are collected while rows are normalized,
+    # evaluated and rendered into a plan spooled to disk (constant memory).
+    stats = CsvStats()
+    now = datetime.now(timezone.utc)
+    timed = metrics.timed
+    stages = timed("render", render(
+        timed("eligibility", evaluate(
+            candidates_for(args.csv_path, stats, args.mode, cache, timed),
+            args.touch, args.force, now)),
+        args.touch,
+        args.booking_url,
+        args.office_phone,
+        args.practice_name,
+        linker,
+    ))
+    if args.simulate and not args.plan:
+        # Nothing to keep or commit: rendered entries feed the simulation without a spool file.
+        header = {"csv": os.path.abspath(args.csv_path), "touch": args.touch, "campaign": args.campaign}
+        with metrics.phase("simulate"):
+            sim = simulate_plan(header, stages, args)
+        if links is not None:
+            links.close()  # nothing will be sent: staged codes are dropped
+        if not args.force and not stats.report():
             print("Aborting due to validation errors. Use --force to override.")
             sys.exit(1)
+        return sim.report(args.rate, args.workers, args.latency_ms, args.price)
 
-    # creds
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    if not account_sid or not auth_token:
-        print("ERROR: TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN must be set as env vars.")
-        sys.exit(1)
-    client = Client(account_sid, auth_token)
+    if args.plan:
+        # spooled next to --plan and moved onto it only once the list has passed validation,
+        # so a rejected list never leaves a committable plan behind
+        plan_file = tempfile.NamedTemporaryFile("w+", encoding="utf-8", delete=False, suffix=".tmp",
+                                                prefix=os.path.basename(args.plan) + ".",
+                                                dir=os.path.dirname(os.path.abspath(args.plan)))
+    else:
+        plan_file = tempfile.TemporaryFile("w+", encoding="utf-8")
+    try:
+        with plan_file:
+            with metrics.phase("plan"):
+                total = write_plan(plan_file, stages, csv=os.path.abspath(args.csv_path), touch=args.touch,
+                                   campaign=args.campaign, planned_at=now.isoformat())
+            if cache is not None:
+                metrics.labels["list_cache"] = cache.status
 
-    now = datetime.now(timezone.utc)
-    seen_phones = set()
-    sent_count = 0
-    skipped_reasons = {}
-    error_count = 0
+            # Always validate unless --force
+            if not args.force:
+                ok = stats.report()
+                if not ok:
+                    print("Aborting due to validation errors. Use --force to override.")
+                    sys.exit(1)
 
-    with open(args.csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for idx, row in enumerate(reader, start=1):
-            lname       = row.get("LName", "").strip()
-            fname       = row.get("FName", "").strip()
-            e164_raw    = row.get("e164_phone", "").strip()
-            e164        = normalize_e164(e164_raw)
-            do_not_text = row.get("do_not_text", "").strip()
-            list_tag    = row.get("list_tag", "").strip()
-            sent_status = row.get("sent_status", "").strip()
-            row_mode    = (row.get("mode", "") or "").strip().lower()
-            effective_mode = row_mode if row_mode in ("link", "manual") else args.mode
-            status      = (row.get("status", "") or "").strip().lower()
-            responded_at = parse_ts(row.get("responded_at"))
-            booked_at    = parse_ts(row.get("booked_at"))
-            t1_sent_at   = parse_ts(row.get("t1_sent_at") or row.get("sent_at"))
-            t2_sent_at   = parse_ts(row.get("t2_sent_at"))
-
-            reasons = []
-
-            if is_true(do_not_text):
-                reasons.append("do_not_text is true")
-            if not e164:
-                reasons.append("missing/invalid e164_phone")
-            if status in STRONG_STATUSES:
-                reasons.append(f"status={status} (strong)")
-            if booked_at:
-                reasons.append("booked_at present")
-            if responded_at and (now - responded_at) < timedelta(days=RECENT_REPLY_DAYS):
-                reasons.append(f"responded within {RECENT_REPLY_DAYS}d")
-            if sent_status and sent_status.lower() == "sent" and not args.force:
-                reasons.append("sent_status=sent (use --force to override)")
-            if e164 and e164 in seen_phones:
-                reasons.append("duplicate phone already processed in this file")
-
-            if args.touch == "t1":
-                if status not in WORKABLE_STATUSES:
-                    reasons.append(f"status not workable ({status})")
-                if t1_sent_at:
-                    reasons.append("t1_sent_at already set")
-            else:  # T2
-                if not t1_sent_at:
-                    reasons.append("no t1_sent_at (not eligible for T2)")
-                if t2_sent_at:
-                    reasons.append("t2_sent_at already set")
-                if t1_sent_at and (now - t1_sent_at) < timedelta(hours=MIN_T2_HOURS):
-                    reasons.append(f"T1 age < {MIN_T2_HOURS}h")
-                if responded_at and t1_sent_at and responded_at > t1_sent_at:
-                    reasons.append("reply received after T1")
-
-            if reasons:
-                print(f"[{idx}] SKIP {fname} {lname} — {', '.join(reasons)}")
-                key = ";".join(reasons)
-                skipped_reasons[key] = skipped_reasons.get(key, 0) + 1
-                continue
-            if e164:
-                seen_phones.add(e164)
-
-            # 4) construct body per mode
-            body = ""
-            if effective_mode == "link":
-                # build tracking URL with list_tag + phone
-                encoded_phone = quote_plus(e164)
-                lt = quote_plus(list_tag) if list_tag else "due_soon"
-                tracking_url = f"{BOOKING_URL}?lt={lt}&pn={encoded_phone}"
-                print(f"mode=link tracking_url={tracking_url}")
-                body = render_message(
-                    mode="link",
-                    list_tag=list_tag,
-                    first=fname,
-                    office_phone=OFFICE_PHONE,
-                    short_url=tracking_url,
-                    touch=args.touch,
-                )
-            else:
-                # manual callback path (no link)
-                print("mode=manual (no URL)")
-                body = render_message(
-                    mode="manual",
-                    list_tag=list_tag,
-                    first=fname,
-                    office_phone=OFFICE_PHONE,
-                    touch=args.touch,
-                )
+            if links is not None:
+                # every code is in the index before the first message can carry it
+                print(f"Short links {args.short_links}: {links.publish()} new codes")
+                links.close()
 
-            if args.dry_run:
-                print(f"[{idx}] DRY RUN -> to={e164} | body={body}")
-                continue
+            if args.plan:
+                plan_file.flush()
+                os.replace(plan_file.name, args.plan)
+                print(f"\nPlan written to {args.plan} ({total} rows). Send it with --commit {args.plan}")
+                if args.simulate:
+                    plan_file.seek(0)
+                    sim = simulate_plan(*read_plan(plan_file), args)
+                    return sim.report(args.rate, args.workers, args.latency_ms, args.price)
+                return
 
-            # 5) send via Twilio
-            try:
-                msg = client.messages.create(
-                    messaging_service_sid=MESSAGING_SERVICE_SID,
-                    to=e164,
-                    body=body,
-                    shorten_urls=True,  # no-op in manual mode; required in link mode
-                    status_callback=None  # set at the Messaging Service level
-                )
-                print(f"[{idx}] SENT -> to={e164} sid={msg.sid} (mode={effective_mode}, touch={args.touch})")
-                sent_count += 1
-            except Exception as e:
-                print(f"[{idx}] ERROR sending to {e164}: {e}")
-                error_count += 1
+            plan_file.seek(0)
+            header, entries = read_plan(plan_file)
+            counts = commit_plan(header, entries, args, metrics, ceiling)
+    finally:
+        if links is not None:
+            links.close()  # drops the staged codes of a rejected list
+        if args.plan and os.path.exists(plan_file.name):
+            os.unlink(plan_file.name)
 
     # End-of-run summary
-    print("\n=== RUN SUMMARY ===")
-    print(f"Total rows processed: {idx}")
-    print(f"Sent: {sent_count}")
-    print(f"Errors: {error_count}")
-    if skipped_reasons:
-        print("Skipped by reason:")
-        for reason, count in sorted(skipped_reasons.items(), key=lambda x: x[1], reverse=True):
-            print(f"  {count} -> {reason}")
-    print("Done.")
+    print_summary(*counts)
+    return counts
 
 if __name__ == "__main__":
     main()
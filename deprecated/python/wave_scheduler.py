@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+Priority send waves with quiet hours and per-practice time zones.
+
+twilio_send_script.py sends a list top to bottom as fast as --rate allows, whatever the
+local time. The scheduler sits between --plan and --commit instead:
+
+    enqueue  reads a reviewed plan (one streaming pass, joined by row to its CSV for
+             recall_due_date when the list has one) and stores its send entries in a
+             SQLite state file; re-enqueueing the same plan adds nothing but
+             queues its failed rows again
+    run      keeps one heap per practice ordered by (list_tag priority, due date, row):
+             past_due before due_soon, earliest due first. Inside the practice's
+             allowed local window (--window/--days in its --tz) it pops a wave of
+             --wave-size rows every --wave-interval seconds and commits it through
+             the normal send path (ledger, dedupe store, event log, --rate limiter).
+             A wave is never larger than --rate can finish before the window closes.
+    status   queued / in-flight / done / failed per practice and when its next window opens
+    preview  the wave timeline `run` would follow, without sending
+
+Rows move queued -> wave -> done (or failed, when their send errored) in the state
+file, committed before and after each wave, so a restart resumes where it stopped. Rows
+left in a wave by a crash are queued again; the send ledger skips the ones that already
+went out (run without --no-ledger). Failed rows are not retried within a run: enqueueing
+their plan again queues them again (a send whose outcome was unknown stays skipped by the
+ledger until reconcile.py resolves it).
+Per-practice Twilio credentials come from RB_TWILIO_CREDS_JSON as in orchestrator.py and
+are set afresh for every wave; a practice without complete credentials is not sent (its
+rows stay queued) unless the run is --dry-run.
+
+Usage:
+    python3 twilio_send_script.py list.csv --touch t1 --plan plan.jsonl
+    python3 wave_scheduler.py enqueue plan.jsonl --practice-id p1 --tz America/Chicago --window 09:00-19:00
+    python3 wave_scheduler.py preview
+    python3 wave_scheduler.py run --wave-size 200 --wave-interval 300 -- --rate 10 --workers 4
+    python3 wave_scheduler.py run --once            # release whatever is due now (cron)
+    python3 wave_scheduler.py status
+"""
+
+import argparse
+import copy
+import csv
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import twilio_send_script
+from orchestrator import load_json_source
+from queue_engine import parse_due_date
+from send_metrics import RunMetrics
+from send_pipeline import read_plan
+
+DEFAULT_STATE = "wave_schedule.sqlite"
+DEFAULT_TZ = "America/New_York"  # TemplateProvisioning default for 00_Config.timezone
+DEFAULT_WINDOW = "09:00-19:00"
+DEFAULT_DAYS = "mon-sat"
+DEFAULT_WAVE_SIZE = 200
+DEFAULT_WAVE_INTERVAL_S = 300.0
+MAX_SLEEP_S = 60.0
+LIST_TAG_PRIORITY = {"past_due": 0, "due_soon": 1}
+OTHER_PRIORITY = 2
+NO_DUE = date.max.toordinal()
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+QUEUED, WAVE, DONE, FAILED = "queued", "wave", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS practices (
+    practice_id  TEXT PRIMARY KEY,
+    timezone     TEXT NOT NULL,
+    window       TEXT NOT NULL,
+    days         TEXT NOT NULL,
+    next_wave_at REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sends (
+    seq         INTEGER PRIMARY KEY,
+    practice_id TEXT NOT NULL,
+    campaign    TEXT NOT NULL,
+    touch       TEXT NOT NULL,
+    phone       TEXT NOT NULL,
+    csv         TEXT NOT NULL,
+    priority    INTEGER NOT NULL,
+    due         INTEGER NOT NULL,
+    entry       TEXT NOT NULL,
+    state       TEXT NOT NULL DEFAULT 'queued',
+    wave        INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS sends_key ON sends (practice_id, campaign, touch, phone);
+CREATE INDEX IF NOT EXISTS sends_state ON sends (state, practice_id);
+CREATE TABLE IF NOT EXISTS waves (
+    wave        INTEGER PRIMARY KEY,
+    practice_id TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    started_at  TEXT NOT NULL,
+    finished_at TEXT,
+    sent        INTEGER,
+    errors      INTEGER,
+    skipped     INTEGER
+);
+"""
+
+
+def parse_window(spec: str) -> Tuple[dtime, dtime]:
+    """"HH:MM-HH:MM" local send window (end exclusive)."""
+    try:
+        start, end = (dtime.fromisoformat(part.strip()) for part in spec.split("-", 1))
+    except ValueError:
+        raise ValueError(f"window must look like 09:00-19:00, got {spec!r}") from None
+    if end <= start:
+        raise ValueError(f"window {spec!r} ends before it starts")
+    return start, end
+
+
+def parse_days(spec: str) -> frozenset:
+    """Weekday numbers (Mon=0) from "mon-sat", "mon,wed,fri" or "all"."""
+    if spec.strip().lower() == "all":
+        return frozenset(range(7))
+    days = set()
+    for part in spec.lower().split(","):
+        first, _, last = part.strip().partition("-")
+        try:
+            a = DAY_NAMES.index(first[:3])
+            b = DAY_NAMES.index(last[:3]) if last else a
+        except ValueError:
+            raise ValueError(f"days must look like mon-sat or mon,wed,fri, got {spec!r}") from None
+        days.update((a + i) % 7 for i in range((b - a) % 7 + 1))
+    return frozenset(days)
+
+
+class SendWindow:
+    """A practice's allowed local sending hours."""
+
+    def __init__(self, tz: str, window: str, days: str):
+        self.tz = ZoneInfo(tz)
+        self.start, self.end = parse_window(window)
+        self.days = parse_days(days)
+        if not self.days:
+            raise ValueError("no sending days")
+
+    def current(self, now: float) -> Tuple[float, float]:
+        """(opens_at, closes_at) epoch of the window open at `now`, or else the next one."""
+        local = datetime.fromtimestamp(now, self.tz)
+        for offset in range(8):
+            day = local.date() + timedelta(days=offset)
+            if day.weekday() not in self.days:
+                continue
+            closes = datetime.combine(day, self.end, self.tz).timestamp()
+            if now < closes:
+                return max(now, datetime.combine(day, self.start, self.tz).timestamp()), closes
+        raise AssertionError("a sending day always occurs within a week")
+
+
+def _rank(list_tag: str, due_raw) -> Tuple[int, int]:
+    due = parse_due_date(due_raw)
+    return LIST_TAG_PRIORITY.get((list_tag or "").strip(), OTHER_PRIORITY), due.toordinal() if due else NO_DUE
+
+
+def with_list_fields(entries: Iterable[Dict[str, object]], csv_path: str) -> Iterator[Tuple[Dict, str, object]]:
+    """(entry, list_tag, recall_due_date) per send entry, walking the plan and its CSV together by row."""
+    rows: Iterator[Tuple[int, Dict[str, str]]] = iter(())
+    f = None
+    if csv_path and os.path.exists(csv_path):
+        f = open(csv_path, newline="", encoding="utf-8")
+        rows = enumerate(csv.DictReader(f), start=1)
+    try:
+        row_idx, row = 0, {}
+        for entry in entries:
+            if "skip" in entry:
+                continue
+            while row_idx < entry["idx"]:
+                row_idx, row = next(rows, (sys.maxsize, {}))
+            matched = row if row_idx == entry["idx"] else {}
+            yield entry, entry.get("list_tag") or matched.get("list_tag", ""), matched.get("recall_due_date")
+    finally:
+        if f is not None:
+            f.close()
+
+
+class WaveScheduler:
+    """State file + one in-memory heap of (priority, due, seq) per practice."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(SCHEMA)
+        self.windows: Dict[str, SendWindow] = {}
+        self.next_wave_at: Dict[str, float] = {}
+        for pid, tz, window, days, next_at in self._db.execute(
+                "SELECT practice_id, timezone, window, days, next_wave_at FROM practices"):
+            self.windows[pid] = SendWindow(tz, window, days)
+            self.next_wave_at[pid] = next_at
+        self.heaps: Dict[str, List[Tuple[int, int, int]]] = {}
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "WaveScheduler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def configure(self, practice_id: str, tz: str, window: str, days: str) -> None:
+        self.windows[practice_id] = SendWindow(tz, window, days)  # validates before anything is stored
+        with self._db:
+            self._db.execute(
+                "INSERT INTO practices (practice_id, timezone, window, days) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (practice_id) DO UPDATE SET timezone=excluded.timezone, window=excluded.window, "
+                "days=excluded.days", (practice_id, tz, window, days))
+        self.next_wave_at.setdefault(practice_id, 0.0)
+
+    def enqueue(self, practice_id: str, plan_path: str) -> Tuple[int, int, int]:
+        """Adds a plan's send entries; returns (added, failed rows queued again, already queued)."""
+        if practice_id not in self.windows:
+            raise ValueError(f"practice {practice_id} has no send window configured")
+        with open(plan_path, encoding="utf-8") as f:
+            header, entries = read_plan(f)
+            csv_path = header.get("csv") or ""
+            campaign, touch = header.get("campaign") or "", header.get("touch") or ""
+            seen = added = retried = 0
+            with self._db:
+                for entry, list_tag, due in with_list_fields(entries, csv_path):
+                    priority, due_ord = _rank(list_tag, due)
+                    seen += 1
+                    fields = (csv_path, priority, due_ord, json.dumps(entry, ensure_ascii=False))
+                    key = (practice_id, campaign, touch, entry["to"])
+                    n = self._db.execute(
+                        "UPDATE sends SET csv=?, priority=?, due=?, entry=?, state=?, wave=NULL "
+                        "WHERE practice_id=? AND campaign=? AND touch=? AND phone=? AND state=?",
+                        fields + (QUEUED,) + key + (FAILED,)).rowcount
+                    retried += n
+                    if not n:
+                        added += self._db.execute(
+                            "INSERT OR IGNORE INTO sends (csv, priority, due, entry, practice_id, campaign, touch, "
+                            "phone) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", fields + key).rowcount
+        return added, retried, seen - added - retried
+
+    def load(self) -> int:
+        """Builds the heaps from the state file; rows a crash left in a wave are queued again."""
+        with self._db:
+            requeued = self._db.execute("UPDATE sends SET state=?, wave=NULL WHERE state=?", (QUEUED, WAVE)).rowcount
+        self.heaps = {pid: [] for pid in self.windows}
+        for pid, priority, due, seq in self._db.execute(
+                "SELECT practice_id, priority, due, seq FROM sends WHERE state=?", (QUEUED,)):
+            self.heaps.setdefault(pid, []).append((priority, due, seq))
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+        return requeued
+
+    def ready_at(self, practice_id: str, now: float) -> Tuple[float, float]:
+        """(when the practice's next wave may start, when that window closes)."""
+        opens, closes = self.windows[practice_id].current(max(now, self.next_wave_at.get(practice_id, 0.0)))
+        return opens, closes
+
+    def pop_wave(self, practice_id: str, size: int) -> List[int]:
+        heap = self.heaps.get(practice_id) or []
+        return [heapq.heappop(heap)[2] for _ in range(min(size, len(heap)))]
+
+    def begin_wave(self, practice_id: str, seqs: List[int]) -> Tuple[int, List[Tuple[Dict, Dict]]]:
+        """Marks the rows in-flight; returns (wave id, [(plan header, entry)] in pop order)."""
+        order = {seq: i for i, seq in enumerate(seqs)}
+        with self._db:
+            wave = self._db.execute("INSERT INTO waves (practice_id, size, started_at) VALUES (?, ?, ?)",
+                                    (practice_id, len(seqs), _now_iso())).lastrowid
+            self._db.executemany("UPDATE sends SET state=?, wave=? WHERE seq=?", [(WAVE, wave, s) for s in seqs])
+        rows = self._db.execute(
+            f"SELECT seq, csv, campaign, touch, entry FROM sends WHERE seq IN ({','.join('?' * len(seqs))})", seqs)
+        out = sorted(((order[seq], {"csv": csv_path, "campaign": campaign, "touch": touch}, json.loads(entry))
+                      for seq, csv_path, campaign, touch, entry in rows), key=lambda r: r[0])
+        return wave, [(h, e) for _, h, e in out]
+
+    def requeue_wave(self, wave: int) -> None:
+        """Undoes begin_wave() in the state file (dry runs); the heap keeps the rows popped."""
+        with self._db:
+            self._db.execute("UPDATE sends SET state=?, wave=NULL WHERE wave=?", (QUEUED, wave))
+            self._db.execute("DELETE FROM waves WHERE wave=?", (wave,))
+
+    def finish_wave(self, practice_id: str, wave: int, sent: int, errors: int, skipped: int,
+                    next_wave_at: float, failed: Iterable[Tuple[str, str, str]] = ()) -> None:
+        """Rows of the wave become done, except the (campaign, touch, phone) sends in `failed`."""
+        self.next_wave_at[practice_id] = next_wave_at
+        with self._db:
+            self._db.execute("UPDATE sends SET state=? WHERE wave=?", (DONE, wave))
+            self._db.executemany("UPDATE sends SET state=? WHERE wave=? AND campaign=? AND touch=? AND phone=?",
+                                 [(FAILED, wave) + key for key in failed])
+            self._db.execute("UPDATE waves SET finished_at=?, sent=?, errors=?, skipped=? WHERE wave=?",
+                             (_now_iso(), sent, errors, skipped, wave))
+            self._db.execute("UPDATE practices SET next_wave_at=? WHERE practice_id=?", (next_wave_at, practice_id))
+
+    def practice(self, practice_id: str) -> Optional[Tuple[str, str, str]]:
+        """(timezone, window, days) as stored for this practice."""
+        return self._db.execute("SELECT timezone, window, days FROM practices WHERE practice_id=?",
+                                (practice_id,)).fetchone()
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {pid: {} for pid in self.windows}
+        for pid, state, n in self._db.execute(
+                "SELECT practice_id, state, COUNT(*) FROM sends GROUP BY 1, 2 ORDER BY 1, 2"):
+            out.setdefault(pid, {})[state] = n
+        return out
+
+    def queued_mix(self, practice_id: str) -> Dict[int, int]:
+        return dict(self._db.execute("SELECT priority, COUNT(*) FROM sends WHERE practice_id=? AND state=? "
+                                     "GROUP BY 1", (practice_id, QUEUED)).fetchall())
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _local(ts: float, window: SendWindow) -> str:
+    return datetime.fromtimestamp(ts, window.tz).strftime("%a %Y-%m-%d %H:%M %Z")
+
+
+def wave_size(limit: int, rate: float, opens: float, closes: float) -> int:
+    """Rows that fit in one wave: --wave-size, or fewer when --rate cannot finish them before closing."""
+    if rate <= 0:
+        return limit
+    return max(0, min(limit, int((closes - opens) * rate)))
+
+
+def timeline(sched: WaveScheduler, size: int, interval: float, rate: float,
+             now: float) -> Iterator[Tuple[str, float, int]]:
+    """(practice_id, start epoch, rows) for every wave `run` would release, in start order."""
+    remaining = {pid: len(heap) for pid, heap in sched.heaps.items() if heap}
+    next_at = dict(sched.next_wave_at)
+    while remaining:
+        starts = {}
+        for pid in remaining:
+            opens, closes = sched.windows[pid].current(max(now, next_at.get(pid, 0.0)))
+            n = wave_size(size, rate, opens, closes)
+            while n == 0:
+                opens, closes = sched.windows[pid].current(closes)
+                n = wave_size(size, rate, opens, closes)
+            starts[pid] = (opens, n)
+        pid = min(starts, key=lambda p: starts[p][0])
+        opens, n = starts[pid]
+        n = min(n, remaining[pid])
+        yield pid, opens, n
+        remaining[pid] -= n
+        if not remaining[pid]:
+            del remaining[pid]
+        busy = n / rate if rate > 0 else 0.0
+        next_at[pid] = opens + max(interval, busy)
+
+
+def missing_creds(creds: Dict[str, Dict], practice_id: str) -> bool:
+    entry = creds.get(practice_id) or {}
+    return not (entry.get("accountSid") and entry.get("authToken") and entry.get("messagingServiceSid"))
+
+
+def send_wave(sched: WaveScheduler, practice_id: str, seqs: List[int], send_args, creds: Dict[str, Dict],
+              next_wave_at: float) -> Dict[str, int]:
+    """Commits one wave through twilio_send_script.commit_plan, one call per (campaign, touch)."""
+    if missing_creds(creds, practice_id) and not send_args.dry_run:
+        raise ValueError(f"Missing Twilio creds for practice {practice_id} in RB_TWILIO_CREDS_JSON")
+    entry = creds.get(practice_id) or {}
+    # only this practice's account: nothing carries over from the previous wave
+    for var, key in (("TWILIO_ACCOUNT_SID", "accountSid"), ("TWILIO_AUTH_TOKEN", "authToken")):
+        if entry.get(key):
+            os.environ[var] = entry[key]
+        else:
+            os.environ.pop(var, None)
+    send_args = copy.copy(send_args)
+    send_args.practice_id = practice_id
+    if entry.get("messagingServiceSid"):
+        send_args.messaging_service_sid = entry["messagingServiceSid"]
+    wave, rows = sched.begin_wave(practice_id, seqs)
+    groups: Dict[Tuple[str, str, str], List[Dict]] = {}
+    for header, entry in rows:
+        groups.setdefault((header["csv"], header["campaign"], header["touch"]), []).append(entry)
+    totals = {"rows": 0, "sent": 0, "errors": 0, "skipped": 0}
+    failed: List[Tuple[str, str, str]] = []
+    for (csv_path, campaign, touch), entries in groups.items():
+        header = {"csv": csv_path, "campaign": campaign, "touch": touch}
+        metrics = RunMetrics(practice=practice_id, wave=wave)
+        phones = set()
+        total, sent, errors, skipped, api_stats = twilio_send_script.commit_plan(
+            header, iter(entries), send_args, metrics, failed=phones)
+        failed.extend((campaign, touch, phone) for phone in phones)
+        twilio_send_script.print_summary(total, sent, errors, skipped, api_stats)
+        totals["rows"] += total
+        totals["sent"] += sent
+        totals["errors"] += errors
+        totals["skipped"] += sum(skipped.values())
+    if send_args.dry_run:
+        # nothing left the machine: put the rows back so a real run still sends them
+        sched.requeue_wave(wave)
+        sched.next_wave_at[practice_id] = next_wave_at
+    else:
+        sched.finish_wave(practice_id, wave, totals["sent"], totals["errors"], totals["skipped"], next_wave_at,
+                          failed)
+    return totals
+
+
+def run(sched: WaveScheduler, args, send_args, creds: Dict[str, Dict]) -> Dict[str, int]:
+    """Releases waves until every heap is empty (or, with --once, until nothing is due now)."""
+    totals = {"waves": 0, "rows": 0, "sent": 0, "errors": 0, "skipped": 0}
+    rate = send_args.rate
+    if not send_args.dry_run:
+        for pid, heap in sched.heaps.items():
+            if heap and missing_creds(creds, pid):
+                # same rule as orchestrator.plan_jobs; the rows stay queued for a later run
+                print(f"SKIP {pid}: Missing Twilio creds for practice {pid} in RB_TWILIO_CREDS_JSON "
+                      f"({len(heap)} rows left queued)")
+                heap.clear()
+    while any(sched.heaps.values()):
+        now = time.time()
+        starts = {}
+        for pid, heap in sched.heaps.items():
+            if not heap:
+                continue
+            opens, closes = sched.ready_at(pid, now)
+            n = wave_size(args.wave_size, rate, opens, closes)
+            if n == 0:
+                # not even one row fits before closing: wait for the next window
+                sched.next_wave_at[pid] = closes
+                opens, closes = sched.ready_at(pid, closes)
+                n = wave_size(args.wave_size, rate, opens, closes)
+            starts[pid] = (opens, n)
+        pid = min(starts, key=lambda p: starts[p][0])
+        opens, n = starts[pid]
+        window = sched.windows[pid]
+        if opens > now:
+            if args.once:
+                break
+            nap = min(opens - now, MAX_SLEEP_S)
+            print(f"Next wave: {pid} at {_local(opens, window)}; sleeping {nap:.0f}s")
+            sys.stdout.flush()
+            time.sleep(nap)
+            continue
+        seqs = sched.pop_wave(pid, n)
+        busy = len(seqs) / rate if rate > 0 else 0.0
+        mix = sched.queued_mix(pid)
+        print(f"\n=== WAVE {totals['waves'] + 1}: {pid} {len(seqs)} rows at {_local(now, window)} "
+              f"(queued past_due={mix.get(0, 0)} due_soon={mix.get(1, 0)} other={mix.get(OTHER_PRIORITY, 0)}) ===")
+        wave_totals = send_wave(sched, pid, seqs, send_args, creds, now + max(args.wave_interval, busy))
+        totals["waves"] += 1
+        for key in ("rows", "sent", "errors", "skipped"):
+            totals[key] += wave_totals[key]
+    return totals
+
+
+def print_status(sched: WaveScheduler, now: float) -> None:
+    print(f"=== WAVE SCHEDULE {sched.path} ===")
+    for pid, counts in sorted(sched.counts().items()):
+        window = sched.windows.get(pid)
+        line = (f"{pid}: queued={counts.get(QUEUED, 0)} in_wave={counts.get(WAVE, 0)} done={counts.get(DONE, 0)} "
+                f"failed={counts.get(FAILED, 0)}")
+        if window is not None:
+            opens, closes = sched.ready_at(pid, now)
+            state = "open until " + _local(closes, window) if opens <= now else "next window " + _local(opens, window)
+            line += f" | {window.tz.key} {window.start:%H:%M}-{window.end:%H:%M} | {state}"
+        print(line)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Release planned sends in priority waves inside local send windows.")
+    parser.add_argument("--state", default=DEFAULT_STATE, help="Scheduler state file (SQLite)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enq = sub.add_parser("enqueue", help="Queue the send entries of plan files")
+    p_enq.add_argument("plans", nargs="+", help="Plans written by twilio_send_script.py --plan")
+    p_enq.add_argument("--practice-id", required=True)
+    p_enq.add_argument("--tz", help=f"Practice time zone (00_Config.timezone; default {DEFAULT_TZ} for a new practice)")
+    p_enq.add_argument("--window", help=f"Allowed local send hours (default {DEFAULT_WINDOW})")
+    p_enq.add_argument("--days", help=f"Allowed weekdays, e.g. mon-fri or mon,wed,sat (default {DEFAULT_DAYS})")
+
+    for name, help_text in (("run", "Send queued rows in waves"), ("preview", "Print the wave timeline without sending")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--wave-size", type=int, default=DEFAULT_WAVE_SIZE, help="Most rows per wave")
+        p.add_argument("--wave-interval", type=float, default=DEFAULT_WAVE_INTERVAL_S,
+                       help="Seconds between wave starts for one practice")
+        p.add_argument("send_args", nargs=argparse.REMAINDER,
+                       help="After --: twilio_send_script.py options (--rate, --workers, --api-base, --dry-run, ...)")
+    p_run = sub.choices["run"]
+    p_run.add_argument("--once", action="store_true", help="Release the waves that are due now, then exit")
+    p_run.add_argument("--creds", help="RB_TWILIO_CREDS_JSON (JSON or file; default: env)")
+
+    sub.add_parser("status", help="Queued / in-flight / done / failed per practice")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    now = time.time()
+
+    with WaveScheduler(args.state) as sched:
+        if args.command == "enqueue":
+            prev = sched.practice(args.practice_id) or (DEFAULT_TZ, DEFAULT_WINDOW, DEFAULT_DAYS)
+            try:
+                sched.configure(args.practice_id, args.tz or prev[0], args.window or prev[1], args.days or prev[2])
+            except (ValueError, KeyError) as e:  # ZoneInfoNotFoundError is a KeyError
+                parser.error(str(e))
+            for plan in args.plans:
+                try:
+                    added, retried, dupes = sched.enqueue(args.practice_id, plan)
+                except ValueError as e:
+                    print(f"ERROR: {plan}: {e}")
+                    sys.exit(1)
+                print(f"Queued {added} sends from {plan} for {args.practice_id}"
+                      + (f", {retried} failed sends again" if retried else "")
+                      + (f" ({dupes} already queued)" if dupes else ""))
+            print_status(sched, now)
+            return
+
+        if args.command == "status":
+            print_status(sched, now)
+            return
+
+        send_argv = args.send_args[1:] if args.send_args[:1] == ["--"] else args.send_args
+        send_parser = twilio_send_script.build_parser()
+        send_args = send_parser.parse_args(send_argv)
+        send_args.commit = args.state  # ledger default comes from each plan's CSV; this is only a fallback
+        requeued = sched.load()
+        if requeued:
+            print(f"Requeued {requeued} rows from an interrupted wave (the ledger skips any already sent)")
+
+        if args.command == "preview":
+            print(f"=== WAVE PREVIEW (wave-size={args.wave_size}, interval={args.wave_interval:g}s, "
+                  f"rate={send_args.rate:g}/s) ===")
+            waves = 0
+            for pid, start, n in timeline(sched, args.wave_size, args.wave_interval, send_args.rate, now):
+                waves += 1
+                print(f"  {_local(start, sched.windows[pid])}  {pid}  {n} rows")
+            print(f"{waves} waves")
+            return
+
+        creds = load_json_source(args.creds, "RB_TWILIO_CREDS_JSON")
+        totals = run(sched, args, send_args, creds)
+        print("\n=== WAVE SUMMARY ===")
+        print(f"Waves: {totals['waves']}  Rows: {totals['rows']}  Sent: {totals['sent']}  "
+              f"Errors: {totals['errors']}  Skipped: {totals['skipped']}")
+        print_status(sched, time.time())
+
+
+if __name__ == "__main__":
+    main()
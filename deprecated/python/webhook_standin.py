@@ -0,0 +1,852 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Apps Script webhook (WebApp.js doPost) for offline load tests.
+
+Usage:
+    python3 webhook_standin.py --port 8080 --seed-patients 2000
+    python3 webhook_standin.py --port 8080 --store sqlite:/tmp/rb_standin.sqlite
+
+    # then, on the same machine:
+    python3 ../scripts/gs_test_client.py --exec http://127.0.0.1:8080/exec --load \\
+        --fixtures http://127.0.0.1:8080/__fixtures --rate 50
+    python3 twilio_send_script.py list.csv --api-base http://127.0.0.1:8080   # stand-in Twilio too
+    # Twilio Functions: GAS_EXEC_URL=http://127.0.0.1:8080/exec
+
+Routes and semantics follow WebApp.js: route/practice_id/token query parameters,
+X-RB-Proxy-Token header, RB_PRACTICE_REGISTRY_JSON practice lookup, one script lock
+(10s tryLock; a timeout answers with the Apps Script error page so the proxies retry),
+the status:/click:/inbound: dedupe keys checked against the last 500 70_EventLog rows,
+no downgrade from delivered/undelivered/failed, STOP/START/HELP handling on 30_Patients
+and 60_Touches, and errors logged then swallowed. Sheets are full-scanned per event
+exactly like getDataRange().getValues(), so the cost profile is the real one.
+`--dedupe index` swaps the EventLog scan for dedupe_store.py (time window, O(1) lookups)
+and `--lookup index` swaps the patient/touch scans for patient_index.py hash lookups.
+`--event-log PATH` also writes every 70_EventLog row to a durable event_log.py file
+(batched, one fsync per group commit); with `--dedupe index` the keys already in that
+file are loaded at startup, so the dedupe window survives a restart of the in-memory store.
+
+Tables mirror 30_Patients / 60_Touches / 70_EventLog with headers read from Schema.js,
+held in memory or in SQLite. GET /__stats returns per-route latency, lock wait and
+per-sheet scan/write counters; GET /__fixtures lists seeded SIDs and phones for
+gs_test_client.py. POST .../Messages.json accepts sends like the Twilio API and records
+each one as a 60_Touches row, so status/click/inbound callbacks find real rows.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote_plus, urlsplit
+
+from dedupe_store import DEFAULT_WINDOW_S, DedupeStore
+from event_log import EventLog, dedupe_items
+from fake_twilio_server import FakeTwilioState
+from patient_index import PatientIndex, normalize_phone
+from sheet_schema import header_map, load_schema
+from transport import LatencyHistogram
+
+RB_BUILD_ID = "2026-01-04T00:00:00Z"
+LOCK_TIMEOUT_S = 10.0
+PROXY_FAILURE_LOCK_TIMEOUT_S = 5.0
+DEDUPE_WINDOW_ROWS = 500
+TERMINAL_STATUSES = {"delivered", "undelivered", "failed"}
+STOP_WORDS = {"STOP", "STOPALL", "UNSUBSCRIBE", "CANCEL", "END", "QUIT"}
+START_WORDS = {"START", "UNSTOP"}
+STRIP_KEYS = ["route", "practice_id", "practiceId", "token", "X-Twilio-Signature", "x-twilio-signature"]
+GAS_ERROR_PAGE = ("<!DOCTYPE html><html><head><title>Error</title></head>"
+                  "<body>Exception: Lock timeout: Server busy, please retry.</body></html>")
+
+STANDIN_SHEETS = ("30_Patients", "60_Touches", "70_EventLog")
+
+
+def now_iso() -> str:
+    """new Date().toISOString()"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def sha256_hex(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _first(payload: Dict, *keys) -> str:
+    """JS `a || b || c || ""` over payload keys."""
+    for key in keys:
+        value = payload.get(key)
+        if value:
+            return value
+    return ""
+
+
+# ---------------------------------------------------------------------
+# Table store
+# ---------------------------------------------------------------------
+
+class SheetStats:
+    def __init__(self):
+        self.scans = 0
+        self.rows_scanned = 0
+        self.scan_seconds = 0.0
+        self.reads = 0
+        self.writes = 0
+        self.appends = 0
+
+    def snapshot(self) -> Dict[str, object]:
+        return {"scans": self.scans, "rows_scanned": self.rows_scanned, "scan_ms": round(self.scan_seconds * 1000.0, 3),
+                "row_reads": self.reads, "writes": self.writes, "appends": self.appends}
+
+
+class MemorySheet:
+    """One sheet as a header row plus data rows; row indexes match getValues() (0 = header)."""
+
+    def __init__(self, name: str, header: List[str]):
+        self.name = name
+        self.header = list(header)
+        self.hmap = header_map(self.header)
+        self.stats = SheetStats()
+        self.on_write: Optional[Callable[[int, list], None]] = None  # (row index, row) after each write
+        self._rows: List[list] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_values(self) -> List[list]:
+        """getDataRange().getValues(): a fresh copy of every row, header first."""
+        start = time.perf_counter()
+        values = [list(self.header)] + [list(r) for r in self._rows]
+        self._scanned(len(values), start)
+        return values
+
+    def get_row(self, idx: int) -> list:
+        """One row by getValues() index, e.g. getRange(idx + 1, 1, 1, n).getValues()[0]."""
+        self.stats.reads += 1
+        return list(self._rows[idx - 1])
+
+    def set_row(self, idx: int, row: list) -> None:
+        self._rows[idx - 1] = list(row)
+        self.stats.writes += 1
+        if self.on_write is not None:
+            self.on_write(idx, row)
+
+    def append_row(self, row: list) -> None:
+        self._rows.append(list(row))
+        self.stats.appends += 1
+        if self.on_write is not None:
+            self.on_write(len(self._rows), row)
+
+    def _scanned(self, n: int, start: float) -> None:
+        self.stats.scans += 1
+        self.stats.rows_scanned += n
+        self.stats.scan_seconds += time.perf_counter() - start
+
+
+class SqliteSheet(MemorySheet):
+    """Same interface backed by a SQLite table (rowid == data row index); values keep their types."""
+
+    def __init__(self, db: sqlite3.Connection, table: str, name: str, header: List[str]):
+        super().__init__(name, header)
+        self.db = db
+        self.table = table
+        cols = ", ".join(f"c{i}" for i in range(len(self.header)))
+        db.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (rid INTEGER PRIMARY KEY, {cols})')
+        self._count = db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_values(self) -> List[list]:
+        start = time.perf_counter()
+        values = [list(self.header)]
+        values.extend(list(r) for r in self.db.execute(f'SELECT * FROM "{self.table}" ORDER BY rid'))
+        for row in values[1:]:
+            del row[0]
+        self._scanned(len(values), start)
+        return values
+
+    def get_row(self, idx: int) -> list:
+        self.stats.reads += 1
+        return list(self.db.execute(f'SELECT * FROM "{self.table}" WHERE rid=?', (idx,)).fetchone()[1:])
+
+    def set_row(self, idx: int, row: list) -> None:
+        sets = ", ".join(f"c{i}=?" for i in range(len(self.header)))
+        with self.db:
+            self.db.execute(f'UPDATE "{self.table}" SET {sets} WHERE rid=?', list(row) + [idx])
+        self.stats.writes += 1
+        if self.on_write is not None:
+            self.on_write(idx, row)
+
+    def append_row(self, row: list) -> None:
+        marks = ", ".join("?" for _ in range(len(self.header) + 1))
+        with self.db:
+            self.db.execute(f'INSERT INTO "{self.table}" VALUES ({marks})', [self._count + 1] + list(row))
+        self._count += 1
+        self.stats.appends += 1
+        if self.on_write is not None:
+            self.on_write(self._count, row)
+
+
+class Spreadsheet:
+    """One practice's engine spreadsheet (the sheets the webhook touches)."""
+
+    def __init__(self, sheets: Dict[str, MemorySheet]):
+        self.sheets = sheets
+        self.dedupe_hits = 0
+        self.dedupe: Optional[DedupeStore] = None  # None: scan 70_EventLog like WebApp.js
+        self.index: Optional[PatientIndex] = None  # None: scan 30_Patients/60_Touches like WebApp.js
+        self.event_log: Optional[EventLog] = None  # durable copy of every 70_EventLog row
+
+    def use_patient_index(self) -> None:
+        """Switch patient/touch lookups to a PatientIndex kept current on every row write."""
+        p_sh, t_sh = self.sheet("30_Patients"), self.sheet("60_Touches")
+        self.index = PatientIndex.build(p_sh.get_values(), t_sh.get_values())
+        p_sh.on_write = self.index.put_patient
+        t_sh.on_write = self.index.put_touch
+
+    def use_dedupe_store(self, store: DedupeStore) -> None:
+        """Switch to an indexed dedupe store, primed with the keys already in 70_EventLog."""
+        data = self.sheet("70_EventLog").get_values()
+        h = header_map(data[0])
+        items = []
+        for row in data[1:]:
+            key = row[h["dedupe_key"]]
+            if key:
+                items.append((key, _epoch(row[h["occurred_at"]])))
+        store.load(items)
+        self.dedupe = store
+
+    @classmethod
+    def in_memory(cls) -> "Spreadsheet":
+        headers = load_schema().headers
+        return cls({name: MemorySheet(name, headers[name]) for name in STANDIN_SHEETS})
+
+    @classmethod
+    def sqlite(cls, db: sqlite3.Connection, practice_id: str) -> "Spreadsheet":
+        headers = load_schema().headers
+        return cls({name: SqliteSheet(db, f"{practice_id}:{name}", name, headers[name]) for name in STANDIN_SHEETS})
+
+    def sheet(self, name: str) -> MemorySheet:
+        sheet = self.sheets.get(name)
+        if sheet is None:
+            raise RuntimeError("Missing sheet: " + name)
+        return sheet
+
+    def blank_row(self, name: str) -> list:
+        return [""] * len(self.sheet(name).header)
+
+
+# ---------------------------------------------------------------------
+# WebApp.js port
+# ---------------------------------------------------------------------
+
+def log_event(ss: Spreadsheet, event_type: str, run_id: str, practice_id: str, notes: str,
+              payload: Optional[Dict], extras: Optional[Dict] = None) -> None:
+    sh = ss.sheet("70_EventLog")
+    h = sh.hmap
+    row = ss.blank_row("70_EventLog")
+    row[h["event_id"]] = str(uuid.uuid4())
+    row[h["event_type"]] = event_type
+    row[h["run_id"]] = run_id
+    row[h["occurred_at"]] = now_iso()
+    if "practice_id" in h:
+        row[h["practice_id"]] = practice_id or ""
+    if "notes" in h:
+        row[h["notes"]] = notes or ""
+    if "payload_json" in h:
+        row[h["payload_json"]] = json.dumps(payload, separators=(",", ":"), ensure_ascii=False) if payload else ""
+    for key, value in (extras or {}).items():
+        if key in h:
+            row[h[key]] = value
+    sh.append_row(row)
+    if ss.event_log is not None:
+        ss.event_log.append(dict(zip(sh.header, row)))
+    if ss.dedupe is not None and row[h["dedupe_key"]]:
+        ss.dedupe.add(row[h["dedupe_key"]])
+
+
+def is_duplicate_event(ss: Spreadsheet, dedupe_key: str) -> bool:
+    if not dedupe_key:
+        return False
+    if ss.dedupe is not None:
+        if ss.dedupe.seen(dedupe_key):
+            ss.dedupe_hits += 1
+            return True
+        return False
+    data = ss.sheet("70_EventLog").get_values()
+    h = header_map(data[0])
+    col = h.get("dedupe_key")
+    if col is None:
+        return False
+    for i in range(max(1, len(data) - DEDUPE_WINDOW_ROWS), len(data)):
+        if (data[i][col] or "") == dedupe_key:
+            ss.dedupe_hits += 1
+            return True
+    return False
+
+
+def find_row_by_value(data: List[list], col: Optional[int], value) -> int:
+    if col is None:
+        return -1
+    for i in range(1, len(data)):
+        if (data[i][col] or "") == value:
+            return i
+    return -1
+
+
+# Row lookups: a full getValues() scan as in WebApp.js, or one indexed row read.
+# Each returns (row index or -1, row or None, header map).
+
+def touch_by_sid(ss: Spreadsheet, sid: str) -> Tuple[int, Optional[list], Dict[str, int]]:
+    sh = ss.sheet("60_Touches")
+    if ss.index is not None:
+        idx = ss.index.touch_row_by_sid(sid)
+        return idx, (sh.get_row(idx) if idx > 0 else None), sh.hmap
+    data = sh.get_values()
+    h = header_map(data[0])
+    idx = find_row_by_value(data, h.get("msg_sid"), sid)
+    return idx, (data[idx] if idx > 0 else None), h
+
+
+def patient_by_phone(ss: Spreadsheet, phone: str) -> Tuple[int, Optional[list], Dict[str, int]]:
+    sh = ss.sheet("30_Patients")
+    if ss.index is not None:
+        idx = ss.index.patient_row(phone)
+        return idx, (sh.get_row(idx) if idx > 0 else None), sh.hmap
+    data = sh.get_values()
+    h = header_map(data[0])
+    idx = find_row_by_value(data, h["phone_e164"], phone)
+    return idx, (data[idx] if idx > 0 else None), h
+
+
+def latest_touch_by_phone(ss: Spreadsheet, phone: str) -> Tuple[int, Optional[list], Dict[str, int]]:
+    sh = ss.sheet("60_Touches")
+    if ss.index is not None:
+        idx = ss.index.latest_touch_row(phone)
+        return idx, (sh.get_row(idx) if idx > 0 else None), sh.hmap
+    data = sh.get_values()
+    h = header_map(data[0])
+    for i in range(len(data) - 1, 0, -1):
+        if (data[i][h["phone_e164"]] or "") == phone:
+            return i, data[i], h
+    return -1, None, h
+
+
+def handle_twilio_status(ss: Spreadsheet, practice_id: str, payload: Dict, event_types: Dict[str, str]) -> None:
+    sid = _first(payload, "MessageSid", "SmsSid", "sms_sid", "sid")
+    status = str(_first(payload, "MessageStatus", "message_status", "status") or "").lower()
+    error_code = _first(payload, "ErrorCode", "error_code", "error")
+    if not sid:
+        return
+    dedupe_key = f"status:{sid}:{status}:{error_code or ''}"
+    if is_duplicate_event(ss, dedupe_key):
+        return
+
+    t_sh = ss.sheet("60_Touches")
+    if len(t_sh) < 1:
+        log_event(ss, event_types["TWILIO_STATUS"], str(uuid.uuid4()), practice_id, "status no touches", payload,
+                  {"dedupe_key": dedupe_key, "twilio_message_sid": sid})
+        return
+    idx, row, h = touch_by_sid(ss, sid)
+    touch_id = ""
+    if idx > 0:
+        touch_id = row[h["touch_id"]] if "touch_id" in h else ""
+        cur = str(row[h["twilio_message_status"]] or "").lower() if "twilio_message_status" in h else ""
+        if not (cur and cur in TERMINAL_STATUSES and status not in TERMINAL_STATUSES):  # never downgrade terminal
+            if "twilio_message_status" in h:
+                row[h["twilio_message_status"]] = status
+            if "error_code" in h and error_code:
+                row[h["error_code"]] = error_code
+            now = now_iso()
+            for st, col in (("delivered", "delivered_at"), ("undelivered", "undelivered_at"), ("failed", "failed_at")):
+                if status == st and col in h and not row[h[col]]:
+                    row[h[col]] = now
+            if "send_state" in h and status == "delivered":
+                row[h["send_state"]] = "SENT"
+            if "send_status" in h and status == "delivered" and row[h["send_status"]] == "WOULD_SEND":
+                row[h["send_status"]] = "SENT"
+            row[h["updated_at"]] = now
+            t_sh.set_row(idx, row)
+    log_event(ss, event_types["TWILIO_STATUS"], str(uuid.uuid4()), practice_id, "status " + status, payload,
+              {"dedupe_key": dedupe_key, "twilio_message_sid": sid, "touch_id": touch_id})
+
+
+def handle_twilio_click(ss: Spreadsheet, practice_id: str, payload: Dict, event_types: Dict[str, str]) -> None:
+    sid = _first(payload, "sms_sid", "MessageSid", "SmsSid")
+    event_type = str(_first(payload, "event_type", "EventType")).lower()
+    click_time = _first(payload, "click_time", "ClickTime", "event_time")
+    if not sid:
+        return
+    dedupe_key = f"click:{sid}:{event_type}:{click_time or ''}"
+    if is_duplicate_event(ss, dedupe_key):
+        return
+
+    t_sh = ss.sheet("60_Touches")
+    touch_id = ""
+    if len(t_sh) >= 1:
+        idx, row, h = touch_by_sid(ss, sid)
+        if idx > 0:
+            touch_id = row[h["touch_id"]] if "touch_id" in h else ""
+            now = click_time or now_iso()
+            if event_type == "click":
+                if "click_count" in h:
+                    row[h["click_count"]] = _num(row[h["click_count"]]) + 1
+                if "first_clicked_at" in h and not row[h["first_clicked_at"]]:
+                    row[h["first_clicked_at"]] = now
+                if "last_clicked_at" in h:
+                    row[h["last_clicked_at"]] = now
+            elif event_type == "preview":
+                if "preview_count" in h:
+                    row[h["preview_count"]] = _num(row[h["preview_count"]]) + 1
+            row[h["updated_at"]] = now_iso()
+            t_sh.set_row(idx, row)
+    log_event(ss, event_types["TWILIO_CLICK"], str(uuid.uuid4()), practice_id, "click " + event_type, payload,
+              {"dedupe_key": dedupe_key, "twilio_message_sid": sid, "touch_id": touch_id})
+
+
+def handle_twilio_inbound(ss: Spreadsheet, practice_id: str, payload: Dict, event_types: Dict[str, str]) -> None:
+    body_raw = _first(payload, "Body", "body")
+    from_raw = _first(payload, "From", "from")
+    msg_sid = _first(payload, "MessageSid", "SmsSid")
+    dedupe_key = f"inbound:{msg_sid or ''}:{from_raw or ''}:{body_raw or ''}"
+    if is_duplicate_event(ss, dedupe_key):
+        return
+
+    body = str(body_raw or "").strip()
+    upper = body.upper()
+    is_stop = upper in STOP_WORDS
+    is_help = upper == "HELP"
+    is_start = upper in START_WORDS
+    phone = normalize_phone(from_raw) or from_raw
+
+    p_sh = ss.sheet("30_Patients")
+    patient_idx, row, p_map = patient_by_phone(ss, phone)
+    if patient_idx > 0:
+        if is_stop:
+            row[p_map["do_not_text"]] = True
+            if "do_not_text_source" in p_map:
+                row[p_map["do_not_text_source"]] = "STOP"
+            if "do_not_text_at" in p_map:
+                row[p_map["do_not_text_at"]] = now_iso()
+            row[p_map["updated_at"]] = now_iso()
+            p_sh.set_row(patient_idx, row)
+        elif is_start:
+            if "do_not_text" in p_map:
+                row[p_map["do_not_text"]] = False
+            if "do_not_text_source" in p_map:
+                row[p_map["do_not_text_source"]] = "START"
+            if "do_not_text_at" in p_map:
+                row[p_map["do_not_text_at"]] = ""
+            row[p_map["updated_at"]] = now_iso()
+            p_sh.set_row(patient_idx, row)
+        elif not is_help:
+            if "updated_at" in p_map:
+                row[p_map["updated_at"]] = now_iso()
+            p_sh.set_row(patient_idx, row)
+
+    # Update the most recent touch for reply/stop
+    t_sh = ss.sheet("60_Touches")
+    if len(t_sh) >= 1:
+        i, row, h = latest_touch_by_phone(ss, phone)
+        if i > 0:
+            if is_stop and "stop_at" in h and not row[h["stop_at"]]:
+                row[h["stop_at"]] = now_iso()
+            if (is_start or (not is_stop and not is_help)) and "reply_at" in h and not row[h["reply_at"]]:
+                row[h["reply_at"]] = now_iso()
+            if "last_inbound_body" in h:
+                row[h["last_inbound_body"]] = body[:160]
+            row[h["updated_at"]] = now_iso()
+            t_sh.set_row(i, row)
+
+    notes = "STOP" if is_stop else "HELP" if is_help else "START" if is_start else "REPLY"
+    log_event(ss, event_types["TWILIO_INBOUND"], str(uuid.uuid4()), practice_id, notes, payload,
+              {"dedupe_key": dedupe_key, "twilio_message_sid": msg_sid})
+
+
+def _epoch(iso: str) -> float:
+    try:
+        return datetime.fromisoformat(str(iso).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _num(value) -> float:
+    """Number(x || 0)"""
+    try:
+        n = float(value or 0)
+    except (TypeError, ValueError):
+        return float("nan")
+    return int(n) if n.is_integer() else n
+
+
+def parse_webhook_body(content_type: str, raw: str) -> Dict:
+    """parseWebhookBody_: JSON when declared, else form-encoded (first '=' splits, '+' is a space)."""
+    if "application/json" in (content_type or "").lower():
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            return {}
+        if not isinstance(obj, dict):
+            return {}
+    else:
+        obj = {}
+        for pair in (raw or "").split("&"):
+            if pair == "":
+                continue
+            k, _, v = pair.partition("=")
+            obj[unquote_plus(k)] = unquote_plus(v)
+    lowered = {k.lower() for k in STRIP_KEYS}
+    return {k: v for k, v in obj.items() if str(k).lower() not in lowered}
+
+
+HANDLERS: Dict[str, Callable] = {
+    "twilio_status": handle_twilio_status,
+    "twilio_click": handle_twilio_click,
+    "twilio_inbound": handle_twilio_inbound,
+}
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.lock_wait = LatencyHistogram()
+        self.outcomes: Dict[str, int] = {}
+
+    def snapshot(self) -> Dict[str, object]:
+        lat = self.latency.snapshot()
+        wait = self.lock_wait.snapshot()
+        lat.pop("buckets")
+        wait.pop("buckets")
+        return {"latency_ms": lat, "lock_wait_ms": wait, "outcomes": dict(self.outcomes)}
+
+
+class WebhookStandin:
+    """doPost() over a registry of practice spreadsheets, with per-route timing."""
+
+    def __init__(self, registry: Dict[str, str], webhook_token: str, proxy_token: str,
+                 store: str = "memory", lock_timeout: float = LOCK_TIMEOUT_S,
+                 dedupe_window: Optional[float] = None, patient_index: bool = False,
+                 event_log: Optional[str] = None):
+        self.registry = registry
+        self.webhook_token = webhook_token
+        self.proxy_token = proxy_token
+        self.lock_timeout = lock_timeout
+        self.event_types = load_schema().event_types
+        self.lock = threading.Lock()  # LockService.getScriptLock()
+        self.stats: Dict[str, RouteStats] = {}
+        self._stats_lock = threading.Lock()
+        self.db = None
+        if store.startswith("sqlite:"):
+            self.db = sqlite3.connect(store[len("sqlite:"):], check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.spreadsheets = {pid: Spreadsheet.sqlite(self.db, pid) for pid in registry}
+        else:
+            self.spreadsheets = {pid: Spreadsheet.in_memory() for pid in registry}
+        prior_events = event_log is not None and os.path.exists(event_log)
+        self.events = EventLog(event_log) if event_log else None
+        for pid, ss in self.spreadsheets.items():
+            ss.event_log = self.events
+            if dedupe_window:
+                ss.use_dedupe_store(DedupeStore(window_s=dedupe_window))
+                if prior_events:
+                    ss.dedupe.load(dedupe_items(event_log, pid))
+            if patient_index:
+                ss.use_patient_index()
+
+    def route_stats(self, route: str) -> RouteStats:
+        with self._stats_lock:
+            rs = self.stats.get(route)
+            if rs is None:
+                rs = self.stats[route] = RouteStats()
+            return rs
+
+    def do_post(self, query: Dict[str, str], headers: Dict[str, str], content_type: str,
+                raw: str) -> Tuple[int, str]:
+        route = (query.get("route") or "").lower()
+        start = time.perf_counter()
+        rs = self.route_stats(route or "<none>")
+        status, text = self._do_post(route, query, headers, content_type, raw, rs)
+        rs.latency.observe((time.perf_counter() - start) * 1000.0)
+        outcome = "error_page" if text.startswith("<!DOCTYPE") else text
+        with self._stats_lock:
+            rs.outcomes[outcome] = rs.outcomes.get(outcome, 0) + 1
+        return status, text
+
+    def _proxy_ok(self, headers: Dict[str, str]) -> bool:
+        token = headers.get("x-rb-proxy-token", "")
+        return bool(self.proxy_token) and bool(token) and token == self.proxy_token
+
+    def _acquire(self, timeout: float, rs: RouteStats) -> bool:
+        start = time.perf_counter()
+        ok = self.lock.acquire(timeout=timeout)
+        rs.lock_wait.observe((time.perf_counter() - start) * 1000.0)
+        return ok
+
+    def _do_post(self, route, query, headers, content_type, raw, rs) -> Tuple[int, str]:
+        practice_id = query.get("practice_id", "")
+        token = query.get("token", "")
+        if not route:
+            return 200, "missing route"
+        if route == "health":
+            if not self.webhook_token or token != self.webhook_token:
+                return 200, "forbidden"
+            return 200, "ok"
+
+        if route == "proxy_failure":
+            if not practice_id:
+                return 200, "missing practice_id"
+            if not self._proxy_ok(headers):
+                return 200, "forbidden"
+            ss = self.spreadsheets.get(practice_id)
+            if ss is None:
+                return 200, "unknown practice"
+            if self._acquire(PROXY_FAILURE_LOCK_TIMEOUT_S, rs):
+                try:
+                    payload = parse_webhook_body(content_type, raw)
+                    # Strip heavy PHI fields and truncate proxy_body defensively.
+                    for k in ("Body", "body", "From", "from", "To", "to"):
+                        payload.pop(k, None)
+                    for k in list(payload):
+                        low = k.lower()
+                        if low.startswith(("mediaurl", "mediacontenttype")) or low == "nummedia":
+                            del payload[k]
+                    if "from_redacted" not in payload and "fromRedacted" in payload:
+                        payload["from_redacted"] = payload["fromRedacted"]
+                    if "to_redacted" not in payload and "toRedacted" in payload:
+                        payload["to_redacted"] = payload["toRedacted"]
+                    if isinstance(payload.get("proxy_body"), str):
+                        payload["proxy_body"] = payload["proxy_body"][:1024]
+                    log_event(ss, "proxy_failure", str(uuid.uuid4()), practice_id, "proxy forward failed", payload,
+                              {"dedupe_key": "", "note": "proxy_forward_failed"})
+                except Exception:  # best effort, as in WebApp.js
+                    pass
+                finally:
+                    self.lock.release()
+            return 200, "ok"
+
+        if not practice_id:
+            return 200, "missing practice_id"
+        if not self.webhook_token or token != self.webhook_token:
+            return 200, "forbidden"
+        if not self._proxy_ok(headers):
+            return 200, "forbidden"
+        ss = self.spreadsheets.get(practice_id)
+        if ss is None:
+            return 200, "unknown practice"
+        payload = parse_webhook_body(content_type, raw)
+
+        if not self._acquire(self.lock_timeout, rs):
+            # doPost throws; Apps Script answers with its HTML error page and the proxy retries.
+            return 200, GAS_ERROR_PAGE
+        try:
+            handler = HANDLERS.get(route)
+            if handler is None:
+                return 200, "unknown route"
+            handler(ss, practice_id, payload, self.event_types)
+        except Exception as err:  # swallow to avoid Twilio retry storms
+            try:
+                log_event(ss, self.event_types["ERROR"], str(uuid.uuid4()), practice_id,
+                          f"webhook error: {err}", payload, {"error": f"{type(err).__name__}: {err}"})
+            except Exception:
+                pass
+        finally:
+            self.lock.release()
+        return 200, "ok"
+
+    # -- fixtures / stand-in Twilio ---------------------------------------
+
+    def seed(self, practice_id: str, patients: int, seed: int = 7, campaign: str = "standin") -> None:
+        """Adds `patients` patients, each with one sent T1 touch carrying a msg_sid."""
+        rng = random.Random(seed)
+        ss = self.spreadsheets[practice_id]
+        p_sh, t_sh = ss.sheet("30_Patients"), ss.sheet("60_Touches")
+        now = now_iso()
+        for n in range(patients):
+            phone = f"+1301{rng.randrange(10 ** 7):07d}"
+            pk = sha256_hex(f"{practice_id}:{n}")[:16]
+            p = ss.blank_row("30_Patients")
+            ph = p_sh.hmap
+            p[ph["patient_key"]], p[ph["first_name"]], p[ph["phone_e164"]] = pk, f"Pat{n}", phone
+            p[ph["has_sms_contact"]], p[ph["do_not_text"]], p[ph["updated_at"]] = True, False, now
+            p_sh.append_row(p)
+            self._append_touch(ss, practice_id, campaign, pk, phone, "SM" + uuid.UUID(int=rng.getrandbits(128)).hex)
+
+    def _append_touch(self, ss: Spreadsheet, practice_id: str, campaign: str, patient_key: str, phone: str,
+                      sid: str) -> None:
+        t_sh = ss.sheet("60_Touches")
+        th = t_sh.hmap
+        now = now_iso()
+        t = ss.blank_row("60_Touches")
+        t[th["touch_id"]] = sha256_hex(f"{practice_id}:{campaign}:{patient_key}:T1")
+        for col, value in (("practice_id", practice_id), ("campaign_id", campaign), ("touch_type", "T1"),
+                           ("patient_key", patient_key), ("phone_e164", phone), ("eligible", True),
+                           ("planned_at", now), ("send_status", "SENT"), ("send_state", "SENT"),
+                           ("dry_run", False), ("msg_sid", sid), ("twilio_message_status", "queued"),
+                           ("sent_at", now), ("click_count", 0), ("preview_count", 0),
+                           ("created_at", now), ("updated_at", now)):
+            t[th[col]] = value
+        t_sh.append_row(t)
+
+    def record_send(self, practice_id: str, to: str, sid: str) -> None:
+        """A send accepted by the stand-in Twilio API becomes a 60_Touches row (under the script lock)."""
+        ss = self.spreadsheets[practice_id]
+        phone = normalize_phone(to) or to
+        with self.lock:
+            idx, row, ph = patient_by_phone(ss, phone)
+            pk = (row[ph["patient_key"]] if idx > 0 else "") or "adhoc_" + phone
+            self._append_touch(ss, practice_id, "standin", pk, phone, sid)
+
+    def fixtures(self, practice_id: str, limit: int = 5000) -> Dict[str, List[str]]:
+        ss = self.spreadsheets[practice_id]
+        with self.lock:
+            data = ss.sheet("60_Touches").get_values()
+        h = header_map(data[0])
+        rows = data[1:][-limit:]
+        return {"sids": [r[h["msg_sid"]] for r in rows if r[h["msg_sid"]]],
+                "phones": sorted({r[h["phone_e164"]] for r in rows if r[h["phone_e164"]]})}
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._stats_lock:
+            routes = {route: rs.snapshot() for route, rs in sorted(self.stats.items())}
+        practices = {}
+        for pid, ss in self.spreadsheets.items():
+            practices[pid] = {"dedupe_hits": ss.dedupe_hits,
+                              "dedupe_store": ss.dedupe.stats() if ss.dedupe is not None else None,
+                              "patient_index": ss.index.stats() if ss.index is not None else None,
+                              "sheets": {name: {"rows": len(sh), **sh.stats.snapshot()} for name, sh in ss.sheets.items()}}
+        return {"build": RB_BUILD_ID, "routes": routes, "practices": practices,
+                "event_log": self.events.stats() if self.events is not None else None}
+
+    def close(self) -> None:
+        if self.events is not None:
+            self.events.close()
+
+
+def make_handler(app: WebhookStandin, twilio: FakeTwilioState, twilio_practice: str):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _reply(self, code: int, text: str, content_type: str = "text/plain") -> None:
+            data = text.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            if parts.path.endswith("/__stats"):
+                self._reply(200, json.dumps(app.snapshot(), indent=2), "application/json")
+            elif parts.path.endswith("/__fixtures"):
+                pid = query.get("practice_id") or twilio_practice
+                if pid not in app.spreadsheets:
+                    self._reply(404, json.dumps({"error": "unknown practice"}), "application/json")
+                    return
+                self._reply(200, json.dumps(app.fixtures(pid)), "application/json")
+            else:
+                self._reply(200, "ok " + RB_BUILD_ID)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length).decode("utf-8", errors="replace") if length else ""
+            parts = urlsplit(self.path)
+            if parts.path.endswith("/Messages.json"):
+                form = {k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()}
+                if not form.get("To") or not form.get("Body"):
+                    self._reply(400, json.dumps({"code": 21604, "message": "A 'To' phone number and 'Body' are required."}),
+                                "application/json")
+                    return
+                msg = twilio.record(form)
+                app.record_send(twilio_practice, form["To"], msg["sid"])
+                self._reply(201, json.dumps(msg), "application/json")
+                return
+            query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+            headers = {k.lower(): v for k, v in self.headers.items()}
+            status, text = app.do_post(query, headers, self.headers.get("Content-Type", ""), raw)
+            self._reply(status, text, "text/html" if text.startswith("<!DOCTYPE") else "text/plain")
+
+    return Handler
+
+
+def serve(app: WebhookStandin, host: str = "127.0.0.1", port: int = 8080,
+          twilio_practice: Optional[str] = None) -> ThreadingHTTPServer:
+    """Builds (but does not start) the HTTP server; call serve_forever() or run it in a thread."""
+    twilio_practice = twilio_practice or next(iter(app.registry))
+    server = ThreadingHTTPServer((host, port), make_handler(app, FakeTwilioState(), twilio_practice))
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    server.app = app
+    return server
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the RecallBridge Apps Script webhook.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--registry", default=os.getenv("RB_PRACTICE_REGISTRY_JSON", '{"test_practice": "local"}'),
+                        help="RB_PRACTICE_REGISTRY_JSON: {practice_id: sheet_id}")
+    parser.add_argument("--token", default=os.getenv("RB_WEBHOOK_TOKEN", "local-token"), help="RB_WEBHOOK_TOKEN")
+    parser.add_argument("--proxy-token", default=os.getenv("RB_PROXY_TOKEN", "local-proxy"), help="RB_PROXY_TOKEN")
+    parser.add_argument("--store", default="memory", help="memory or sqlite:PATH")
+    parser.add_argument("--dedupe", choices=["eventlog", "index"], default="eventlog",
+                        help="eventlog: scan the last 500 70_EventLog rows like WebApp.js; index: dedupe_store.py")
+    parser.add_argument("--dedupe-window", type=float, default=DEFAULT_WINDOW_S / 3600.0,
+                        help="Hours a dedupe key is remembered with --dedupe index")
+    parser.add_argument("--lookup", choices=["scan", "index"], default="scan",
+                        help="scan: full sheet reads per event like WebApp.js; index: patient_index.py hash lookups")
+    parser.add_argument("--seed-patients", type=int, default=0, help="Patients (each with a sent T1 touch) per practice")
+    parser.add_argument("--lock-timeout", type=float, default=LOCK_TIMEOUT_S, help="Script lock tryLock seconds")
+    parser.add_argument("--stats-out", metavar="PATH", help="Write the /__stats snapshot here on exit")
+    parser.add_argument("--event-log", metavar="PATH",
+                        help="Also write 70_EventLog rows here (JSONL, or SQLite for *.sqlite), batched")
+    args = parser.parse_args()
+
+    try:
+        registry = json.loads(args.registry)
+    except ValueError:
+        parser.error("--registry must be JSON")
+    if not registry:
+        parser.error("--registry is empty")
+    app = WebhookStandin(registry, args.token, args.proxy_token, store=args.store, lock_timeout=args.lock_timeout,
+                         dedupe_window=args.dedupe_window * 3600.0 if args.dedupe == "index" else None,
+                         patient_index=args.lookup == "index", event_log=args.event_log)
+    for pid in registry:
+        if args.seed_patients:
+            app.seed(pid, args.seed_patients)
+    server = serve(app, args.host, args.port)
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Webhook stand-in listening on {base}/exec (practices: {', '.join(registry)})")
+    print(f"  RB_WEBHOOK_TOKEN={args.token} RB_PROXY_TOKEN={args.proxy_token}")
+    print(f"  stats: {base}/__stats  fixtures: {base}/__fixtures  twilio api-base: {base}")
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        app.close()
+        if args.stats_out:
+            with open(args.stats_out, "w", encoding="utf-8") as f:
+                json.dump(app.snapshot(), f, indent=2)
+        print(json.dumps(app.snapshot()["routes"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
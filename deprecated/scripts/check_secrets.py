@@ -5,13 +5,30 @@ Lightweight pre-deploy secrets check for RecallBridge.
 Scans source files for tokens that look like Twilio credentials, X_RB_KEY literals,
 or long base64-ish blobs. Exits nonzero when potential secrets are found so you can
 fix before copy/paste deploys.
+
+Skipped directories are pruned during the walk, each file gets a single pass of one
+combined regex (only lines it flags are re-checked pattern by pattern), files are
+scanned on a process pool, and results are cached on disk keyed by path, mtime, size
+and content hash so unchanged files are not rescanned on the next run.
+
+Files over LARGE_FILE_BYTES (big CSV/JSON exports) are memory-mapped and scanned with
+the byte-level patterns chunk by chunk, never decoded or split whole, so memory stays
+bounded no matter how large the dump is. Line numbers are counted only up to each hit.
 """
 
 import argparse
+import bisect
+import hashlib
+import json
+import mmap
 import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 # Directories/files to skip to keep noise and PII exposure low.
 SKIP_DIRS = {
@@ -34,6 +51,7 @@ ALLOWED_EXTS = {
     ".tsx",
     ".py",
     ".json",
+    ".csv",
     ".md",
     ".mdx",
     ".sh",
@@ -65,6 +83,46 @@ PATTERNS: List[Pattern] = [
     ),
 ]
 
+Finding = Tuple[str, int, str, str]
+
+
+def _combine(patterns: List[Pattern]) -> str:
+    """
+    One zero-width alternation that stops wherever any pattern could start, so a file is
+    searched once instead of once per pattern per line. Matches never consume text, so
+    overlapping hits from different patterns are all kept; flagged lines are then checked
+    with the individual patterns, which keeps findings identical to the per-line scan.
+    """
+    alts = []
+    for _, regex, _ in patterns:
+        source = regex.pattern.replace("(", "(?:").replace("(?:?", "(?")  # drop capture groups
+        alts.append(f"(?i:{source})" if regex.flags & re.IGNORECASE else source)
+    return "(?=" + "|".join(alts) + ")"
+
+
+COMBINED = re.compile(_combine(PATTERNS))
+
+# Byte-level twins for the memory-mapped large-file path (ASCII classes behave identically).
+PATTERNS_BYTES = [(k, re.compile(r.pattern.encode("ascii"), r.flags & re.IGNORECASE), d) for k, r, d in PATTERNS]
+COMBINED_BYTES = re.compile(_combine(PATTERNS).encode("ascii"))
+HTTP_BYTES = re.compile(rb"(?i)http")
+
+# Files above this size are mmap-scanned in chunks instead of read whole.
+LARGE_FILE_BYTES = 2 * 1024 * 1024
+LARGE_CHUNK_BYTES = 8 * 1024 * 1024
+# How far past a chunk boundary to look for a newline to end the chunk on; on a line
+# longer than that, the next chunk instead starts this far back (overlapping chunks).
+LARGE_OVERLAP_BYTES = 64 * 1024
+
+# Bump when scan_text semantics change; PATTERNS are fingerprinted separately.
+CACHE_VERSION = 2
+PATTERNS_FINGERPRINT = hashlib.sha256(
+    json.dumps([CACHE_VERSION] + [[k, r.pattern, r.flags, d] for k, r, d in PATTERNS]).encode("utf-8")
+).hexdigest()[:16]
+
+# Below this many files a process pool costs more than it saves.
+MIN_FILES_FOR_POOL = 32
+
 
 def mask(token: str) -> str:
     if len(token) <= 12:
@@ -79,52 +137,260 @@ def looks_like_base64(token: str) -> bool:
 
 
 def iter_files(root: Path) -> Iterable[Path]:
-    for path in root.rglob("*"):
-        if path.is_dir():
-            if path.name in SKIP_DIRS:
+    """Walks `root`, pruning SKIP_DIRS before descending; yields files in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for name in sorted(filenames):
+            if name in SKIP_FILES:
                 continue
-            # Skip anything nested under a skipped directory name.
-            if any(part in SKIP_DIRS for part in path.parts):
-                continue
-            continue
-        if path.name in SKIP_FILES:
-            continue
-        if path.suffix not in ALLOWED_EXTS:
-            continue
-        if any(part in SKIP_DIRS for part in path.parts):
-            continue
-        try:
-            if path.stat().st_size > 2 * 1024 * 1024:
+            path = Path(dirpath, name)
+            if path.suffix not in ALLOWED_EXTS:
                 continue
-        except OSError:
-            continue
-        yield path
+            yield path
 
 
-def scan_file(path: Path) -> List[Tuple[str, int, str, str]]:
+def scan_line(path: str, lineno: int, line: str) -> List[Finding]:
     findings = []
+    for key, regex, desc in PATTERNS:
+        for match in regex.finditer(line):
+            token = match.group(1) if match.groups() else match.group(0)
+            if key == "base64_like":
+                if "http" in line.lower():
+                    continue
+                if len(token) < 48 or not looks_like_base64(token):
+                    continue
+            findings.append((path, lineno, desc, mask(token)))
+    return findings
+
+
+def scan_text(path: str, text: str) -> List[Finding]:
+    hits = [m.start() for m in COMBINED.finditer(text)]
+    if not hits:
+        return []
+    # Line numbers follow str.splitlines(), as the per-line scan always has; only
+    # computed for the rare file with a candidate hit.
+    lines = text.splitlines(keepends=True)
+    starts = list(accumulate((len(line) for line in lines), initial=0))
+    findings: List[Finding] = []
+    for lineno in sorted({bisect.bisect_right(starts, pos) for pos in hits}):
+        findings.extend(scan_line(path, lineno, lines[lineno - 1].splitlines()[0]))
+    return findings
+
+
+class _LineCounter:
+    """Lazily maps byte offsets (visited in increasing order) to 1-based line numbers."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.offset = 0
+        self.line = 1
+
+    def lineno(self, offset: int) -> int:
+        while self.offset < offset:
+            stop = min(offset, self.offset + LARGE_CHUNK_BYTES)
+            self.line += self.buf[self.offset:stop].count(b"\n")
+            self.offset = stop
+        return self.line
+
+
+def _scan_span(path: str, lineno: int, buf, start: int, end: int) -> List[Finding]:
+    """scan_line() over buf[start:end] without copying the line out of the mapping."""
+    findings = []
+    for key, regex, desc in PATTERNS_BYTES:
+        for match in regex.finditer(buf, start, end):
+            token = (match.group(1) if match.groups() else match.group(0)).decode("ascii")
+            if key == "base64_like":
+                if HTTP_BYTES.search(buf, start, end):
+                    continue
+                if len(token) < 48 or not looks_like_base64(token):
+                    continue
+            findings.append((path, lineno, desc, mask(token)))
+    return findings
+
+
+def scan_mapped(path: str, buf, size: int) -> List[Finding]:
+    """
+    Runs COMBINED_BYTES over buf chunk by chunk. Chunks end on a newline when one is near;
+    otherwise they overlap by LARGE_OVERLAP_BYTES so a token cut by the boundary is seen
+    whole by the next one. Each flagged line is verified once over its full extent.
+    """
+    lines = _LineCounter(buf)
+    findings: List[Finding] = []
+    line_end = -1
+    start = 0
+    while start < size:
+        end = next_start = min(size, start + LARGE_CHUNK_BYTES)
+        if end < size:
+            nl = buf.find(b"\n", end, end + LARGE_OVERLAP_BYTES)
+            if nl != -1:
+                end = next_start = nl + 1
+            else:
+                next_start = end - LARGE_OVERLAP_BYTES
+        for match in COMBINED_BYTES.finditer(buf, start, end):
+            pos = match.start()
+            if pos <= line_end:
+                continue  # line already verified
+            line_start = buf.rfind(b"\n", 0, pos) + 1
+            line_end = buf.find(b"\n", pos)
+            if line_end == -1:
+                line_end = size
+            stop = line_end - 1 if line_end > line_start and buf[line_end - 1] == 0x0D else line_end
+            findings.extend(_scan_span(path, lines.lineno(line_start), buf, line_start, stop))
+        start = next_start
+    return findings
+
+
+def scan_large(path: str, cached_hash: Optional[str] = None) -> Tuple[Optional[str], Optional[List[Finding]]]:
+    """Hashes then scans a file through mmap; findings is None when the hash matches cached_hash."""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return hashlib.sha256().hexdigest(), []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                digest = hashlib.sha256()
+                for off in range(0, size, LARGE_CHUNK_BYTES):
+                    digest.update(buf[off:off + LARGE_CHUNK_BYTES])
+                if digest.hexdigest() == cached_hash:
+                    return cached_hash, None
+                return digest.hexdigest(), scan_mapped(path, buf, size)
+    except (OSError, ValueError):
+        return None, []
+
+
+def _read(path: Path) -> Optional[bytes]:
     try:
-        text = path.read_text(encoding="utf-8", errors="ignore")
+        return path.read_bytes()
     except OSError:
-        return findings
-
-    for lineno, line in enumerate(text.splitlines(), start=1):
-        for key, regex, desc in PATTERNS:
-            for match in regex.finditer(line):
-                token = match.group(1) if match.groups() else match.group(0)
-                if key == "base64_like":
-                    if "http" in line.lower():
-                        continue
-                    if len(token) < 48 or not looks_like_base64(token):
-                        continue
-                findings.append((str(path), lineno, desc, mask(token)))
-    return findings
+        return None
+
+
+def _decode(data: bytes) -> str:
+    # Matches the old read_text(): undecodable bytes dropped, universal newlines.
+    return data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _is_large(path: str) -> bool:
+    try:
+        return os.path.getsize(path) > LARGE_FILE_BYTES
+    except OSError:
+        return False
+
+
+def scan_file(path: Path) -> List[Finding]:
+    if _is_large(str(path)):
+        return scan_large(str(path))[1] or []
+    data = _read(path)
+    return [] if data is None else scan_text(str(path), _decode(data))
+
+
+def _scan_job(job: Tuple[str, Optional[str]]) -> Tuple[str, Optional[str], Optional[List[Finding]]]:
+    """
+    Pool worker: returns (path, sha256, findings). findings is None when the content hash
+    still matches the cached one (file touched but unchanged) so the cached result stands.
+    """
+    path, cached_hash = job
+    if _is_large(path):
+        digest, findings = scan_large(path, cached_hash)
+        return path, digest, findings
+    data = _read(Path(path))
+    if data is None:
+        return path, None, []
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == cached_hash:
+        return path, digest, None
+    return path, digest, scan_text(path, _decode(data))
+
+
+class ScanCache:
+    """
+    JSON cache of findings per file: {rel_path: [mtime_ns, size, sha256, [[lineno, desc, token], ...]]}.
+    A file whose mtime and size are unchanged is trusted without being read; otherwise it
+    is rehashed and only rescanned when the hash differs. Invalidated when PATTERNS change.
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.entries: Dict[str, list] = {}
+        if path is None or not path.exists():
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("patterns") == PATTERNS_FINGERPRINT:
+            self.entries = data.get("files", {})
+
+    def save(self, entries: Dict[str, list]) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"patterns": PATTERNS_FINGERPRINT, "files": entries}, f)
+        os.replace(tmp, self.path)
+
+
+def default_cache_path(root: Path) -> Path:
+    """Inside .git when scanning a checkout (never committed, never scanned); else the user cache dir."""
+    if (root / ".git").is_dir():
+        return root / ".git" / "check_secrets_cache.json"
+    base = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "recallbridge" / f"check_secrets_{hashlib.sha256(str(root).encode()).hexdigest()[:12]}.json"
+
+
+def scan_tree(root: Path, cache: ScanCache, jobs: int) -> Tuple[List[Finding], Dict[str, int]]:
+    """Scans every file under root, reusing cached results; returns (findings, counters)."""
+    files: List[Tuple[Path, str, os.stat_result]] = []
+    for path in iter_files(root):
+        try:
+            files.append((path, path.relative_to(root).as_posix(), path.stat()))
+        except OSError:
+            continue
+
+    results: Dict[str, list] = {}
+    todo: List[Tuple[str, Optional[str]]] = []
+    for path, rel, st in files:
+        entry = cache.entries.get(rel)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            results[rel] = entry
+        else:
+            todo.append((str(path), entry[2] if entry else None))
+
+    counters = {"files": len(files), "cached": len(results), "rehashed": 0, "scanned": 0}
+    if jobs > 1 and len(todo) >= MIN_FILES_FOR_POOL:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            done = list(pool.map(_scan_job, todo, chunksize=max(1, len(todo) // (jobs * 4))))
+    else:
+        done = [_scan_job(job) for job in todo]
+
+    stats = {str(p): (rel, st) for p, rel, st in files}
+    for path, digest, findings in done:
+        rel, st = stats[path]
+        if findings is None:
+            counters["rehashed"] += 1
+            found = cache.entries[rel][3]
+        else:
+            counters["scanned"] += 1
+            found = [list(f[1:]) for f in findings]
+        results[rel] = [st.st_mtime_ns, st.st_size, digest, found]
+
+    cache.save(results)
+    all_findings: List[Finding] = []
+    for path, rel, _ in files:
+        all_findings.extend((str(path), lineno, desc, token) for lineno, desc, token in results[rel][3])
+    return all_findings, counters
 
 
 def main():
     default_root = Path(__file__).resolve().parents[2]
     parser = argparse.ArgumentParser(description="Scan for secrets before deploy.")
     parser.add_argument("--root", default=str(default_root), help="Root directory to scan (default: repo root).")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count; 1 = scan in-process).")
+    parser.add_argument("--cache", default="", help="Result cache path (default: .git/check_secrets_cache.json).")
+    parser.add_argument("--no-cache", action="store_true", help="Rescan everything and do not write a cache.")
     args = parser.parse_args()
 
     root_path = Path(args.root).resolve()
@@ -132,9 +398,14 @@ def main():
         print(f"ERROR: root path not found: {root_path}")
         raise SystemExit(2)
 
-    all_findings: List[Tuple[str, int, str, str]] = []
-    for file_path in iter_files(root_path):
-        all_findings.extend(scan_file(file_path))
+    cache_path = None if args.no_cache else Path(args.cache) if args.cache else default_cache_path(root_path)
+    start = time.perf_counter()
+    all_findings, counters = scan_tree(root_path, ScanCache(cache_path), max(1, args.jobs))
+    print(
+        f"Scanned {counters['files']} files in {time.perf_counter() - start:.2f}s "
+        f"({counters['scanned']} scanned, {counters['cached'] + counters['rehashed']} unchanged from cache)",
+        file=sys.stderr,
+    )
 
     if not all_findings:
         print(f"No obvious secrets found under {root_path}")
@@ -3,14 +3,38 @@
 Small test harness to POST sample payloads to an Apps Script exec URL.
 Set environment variable `EXEC_URL` or pass `--exec`.
 
+Modes:
+    gs_test_client.py --exec URL                      # the six hand-written samples, one at a time
+    gs_test_client.py --exec URL --load --rate 50 --concurrency 20 --count 5000
+    gs_test_client.py --exec URL --load --dup-rate 0.1 --dup-burst 4 --record run.jsonl
+    gs_test_client.py --exec URL --replay run.jsonl --speed 2
+    gs_test_client.py --exec URL --replay eventlog_export.csv
+
+--load generates Twilio-shaped status/click/inbound/STOP/START callbacks (form-encoded,
+route/practice_id/token in the query string, X-RB-Proxy-Token header, exactly as the
+Twilio Functions forward them) and fires them at a fixed rate over an asyncio pool.
+Duplicate bursts resend the same callback back to back, like Twilio retries, to exercise
+dedupe. --replay sends a recorded JSONL run or a 70_EventLog CSV export, optionally
+keeping the original spacing. Both report latency percentiles, error rates and
+throughput per route.
+
 This script is intentionally simple (no external deps beyond stdlib).
 """
 
 import os
 import sys
 import argparse
+import asyncio
+import csv
 import json
-from urllib import request
+import math
+import random
+import ssl
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib import parse, request
 
 
 def post_json(url, payload):
@@ -20,16 +44,7 @@ def post_json(url, payload):
         return resp.read().decode('utf-8')
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--exec', help='Apps Script exec URL (or use EXEC_URL env var)')
-    args = parser.parse_args()
-
-    exec_url = args.exec or os.getenv('EXEC_URL') or os.getenv('APPS_SCRIPT_EXEC_URL')
-    if not exec_url:
-        print('Provide --exec or set EXEC_URL / APPS_SCRIPT_EXEC_URL')
-        sys.exit(2)
-
+def run_samples(exec_url):
     # Known test number (example only)
     test_phone = '+15712455560'
 
@@ -85,5 +100,436 @@ def main():
             print('error posting:', e)
 
 
+# =====================================================================
+# Load generation / replay
+# =====================================================================
+
+# kind -> WebApp.js route
+ROUTES = {
+    'status': 'twilio_status',
+    'click': 'twilio_click',
+    'inbound': 'twilio_inbound',
+    'stop': 'twilio_inbound',
+    'start': 'twilio_inbound',
+}
+# 70_EventLog event_type (EVENT_TYPES in Schema.js) -> route
+EVENT_TYPE_ROUTES = {
+    'twilio.status_callback': 'twilio_status',
+    'twilio.click_event': 'twilio_click',
+    'twilio.inbound_message': 'twilio_inbound',
+}
+DEFAULT_MIX = 'status=70,click=8,inbound=14,stop=5,start=3'
+STOP_WORDS = ['STOP', 'STOPALL', 'UNSUBSCRIBE', 'CANCEL', 'END', 'QUIT']
+START_WORDS = ['START', 'UNSTOP']
+REPLIES = ['Yes', 'YES', 'Can I come Tuesday?', 'call me', 'CALL ME', 'HELP', 'Thanks!', 'who is this?']
+PRACTICE_NUMBER = '+13016522378'
+
+Event = namedtuple('Event', ['kind', 'route', 'payload', 'at'])
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition('=')
+        kind = kind.strip().lower()
+        if kind not in ROUTES:
+            raise ValueError(f'unknown event kind in --mix: {kind} (expected one of {", ".join(ROUTES)})')
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+class EventFactory:
+    """Twilio-shaped callback payloads over a fixed pool of phones and message SIDs."""
+
+    def __init__(self, mix, phones=200, seed=None):
+        self.rng = random.Random(seed)
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.phones = ['+1301555%04d' % self.rng.randrange(10000) for _ in range(max(1, phones))]
+        self.sids = ['SM' + uuid.UUID(int=self.rng.getrandbits(128)).hex for _ in range(max(1, phones))]
+
+    def use_fixtures(self, fixtures):
+        """Draw SIDs and phones from real rows (e.g. webhook_standin.py /__fixtures) instead of random ones."""
+        if fixtures.get('sids'):
+            self.sids = list(fixtures['sids'])
+        if fixtures.get('phones'):
+            self.phones = list(fixtures['phones'])
+
+    def _word(self, words):
+        w = self.rng.choice(words)
+        return self.rng.choice([w, w.lower(), w.title(), f' {w} '])
+
+    def next(self):
+        rng = self.rng
+        kind = rng.choices(self.kinds, weights=self.weights)[0]
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if kind == 'status':
+            status = rng.choices(['sent', 'delivered', 'undelivered', 'failed'], weights=[35, 55, 7, 3])[0]
+            payload = {'MessageSid': rng.choice(self.sids), 'MessageStatus': status,
+                       'AccountSid': 'ACtest', 'To': rng.choice(self.phones)}
+            if status in ('undelivered', 'failed'):
+                payload['ErrorCode'] = rng.choice(['30003', '30005', '30006', '30007'])
+        elif kind == 'click':
+            payload = {'sms_sid': rng.choice(self.sids), 'event_type': rng.choice(['click', 'click', 'preview']),
+                       'click_time': now, 'to': rng.choice(self.phones)}
+        else:
+            body = (self._word(STOP_WORDS) if kind == 'stop'
+                    else self._word(START_WORDS) if kind == 'start' else rng.choice(REPLIES))
+            payload = {'MessageSid': 'SM' + uuid.UUID(int=rng.getrandbits(128)).hex,
+                       'From': rng.choice(self.phones), 'To': PRACTICE_NUMBER, 'Body': body}
+        return Event(kind, ROUTES[kind], payload, None)
+
+
+def load_fixtures(source, practice_id):
+    """{'sids': [...], 'phones': [...]} from a JSON file or a URL such as the stand-in's /__fixtures."""
+    if source.startswith(('http://', 'https://')):
+        sep = '&' if '?' in source else '?'
+        url = source if 'practice_id=' in source else f'{source}{sep}practice_id={parse.quote(practice_id)}'
+        with request.urlopen(url, timeout=30) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+    with open(source, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _kind_for(route, payload):
+    if route != 'twilio_inbound':
+        return {'twilio_status': 'status', 'twilio_click': 'click'}.get(route, route)
+    body = str(payload.get('Body') or payload.get('body') or '').strip().upper()
+    return 'stop' if body in STOP_WORDS else 'start' if body in START_WORDS else 'inbound'
+
+
+def _epoch(value):
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def load_replay(path):
+    """
+    Reads a recorded run (.jsonl from --record: {"route", "payload", "at"}) or a
+    70_EventLog CSV export (event_type, occurred_at, payload_json). `at` is seconds from
+    the first event; rows that are not Twilio callbacks are skipped.
+    """
+    events = []
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                route = EVENT_TYPE_ROUTES.get((row.get('event_type') or '').strip())
+                if not route:
+                    continue
+                try:
+                    payload = json.loads(row.get('payload_json') or '{}')
+                except ValueError:
+                    continue
+                if not isinstance(payload, dict):
+                    continue
+                events.append(Event(_kind_for(route, payload), route, payload, _epoch(row.get('occurred_at'))))
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                route = rec.get('route') or ROUTES.get(rec.get('kind'), '')
+                payload = rec.get('payload') or {}
+                events.append(Event(rec.get('kind') or _kind_for(route, payload), route, payload, rec.get('at')))
+    stamps = [e.at for e in events if e.at is not None]
+    first = min(stamps) if stamps else 0.0
+    return [e._replace(at=None if e.at is None else e.at - first) for e in events]
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.rejected = {}
+        self.exceptions = {}
+        self.duplicates = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, route, ms, status, body):
+        self.latencies.setdefault(route, []).append(ms)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        text = (body or '').strip().lower()
+        if 200 <= status < 300 and not text.startswith('ok'):
+            # WebApp.js answers 200 with a reason ("forbidden", "unknown practice", ...)
+            key = f'{route}: {text[:40] or "<empty>"}'
+            self.rejected[key] = self.rejected.get(key, 0) + 1
+
+    def fail(self, route, exc):
+        key = f'{route}: {type(exc).__name__}'
+        self.exceptions[key] = self.exceptions.get(key, 0) + 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        routes = {}
+        for route, lat in sorted(self.latencies.items()):
+            lat = sorted(lat)
+            routes[route] = {'count': len(lat), **{f'p{q}_ms': round(_pct(lat, q), 1) for q in (50, 95, 99)},
+                             'max_ms': round(lat[-1], 1)}
+        total = sum(len(v) for v in self.latencies.values())
+        exceptions = sum(self.exceptions.values())
+        http_errors = sum(n for s, n in self.statuses.items() if s >= 400)
+        attempts = total + exceptions
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'requests': attempts,
+            'throughput_rps': round(attempts / elapsed, 1) if elapsed else 0.0,
+            'duplicates_sent': self.duplicates,
+            'http_status': dict(sorted(self.statuses.items())),
+            'http_error_rate': round(http_errors / attempts, 4) if attempts else 0.0,
+            'exception_rate': round(exceptions / attempts, 4) if attempts else 0.0,
+            'rejected': self.rejected,
+            'exceptions': self.exceptions,
+            'routes': routes,
+        }
+
+    def report(self):
+        s = self.summary()
+        print('\n=== LOAD SUMMARY ===')
+        print(f"Requests: {s['requests']} in {s['elapsed_s']}s ({s['throughput_rps']} req/s), "
+              f"duplicates sent: {s['duplicates_sent']}")
+        print(f"HTTP status: {s['http_status']}  error rate: {s['http_error_rate']:.2%}  "
+              f"exceptions: {s['exception_rate']:.2%}")
+        for route, r in s['routes'].items():
+            print(f"  {route:<15} n={r['count']:<6} p50={r['p50_ms']}ms p95={r['p95_ms']}ms "
+                  f"p99={r['p99_ms']}ms max={r['max_ms']}ms")
+        for title, counts in (('Rejected (200 with non-ok body)', s['rejected']), ('Exceptions', s['exceptions'])):
+            if counts:
+                print(f'{title}:')
+                for key, n in sorted(counts.items(), key=lambda x: x[1], reverse=True):
+                    print(f'  {n} -> {key}')
+        return s
+
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+class AsyncHttp:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams (one per worker; follows Apps Script redirects)."""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.conns = {}
+        self.ssl = ssl.create_default_context()
+
+    async def request(self, method, url, body=b'', headers=None, redirects=5):
+        parts = parse.urlsplit(url)
+        status, resp_headers, data = await asyncio.wait_for(
+            self._send(method, parts, body, headers or {}), self.timeout)
+        if status in (301, 302, 303, 307, 308) and redirects and resp_headers.get('location'):
+            nxt = parse.urljoin(url, resp_headers['location'])
+            if status in (307, 308):
+                return await self.request(method, nxt, body, headers, redirects - 1)
+            return await self.request('GET', nxt, b'', {}, redirects - 1)
+        return status, data.decode('utf-8', errors='replace')
+
+    async def _send(self, method, parts, body, headers):
+        https = parts.scheme == 'https'
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        for fresh in (False, True):
+            conn = None if fresh else self.conns.pop(key, None)
+            if conn is not None and (conn[0].at_eof() or conn[1].is_closing()):
+                conn[1].close()  # server already closed the idle keep-alive socket
+                conn = None
+            if conn is None:
+                fresh = True
+                conn = await asyncio.open_connection(key[1], key[2], ssl=self.ssl if https else None)
+            reader, writer = conn
+            head = [f'{method} {path} HTTP/1.1', f'Host: {parts.netloc}', f'Content-Length: {len(body)}',
+                    'Connection: keep-alive']
+            head += [f'{k}: {v}' for k, v in headers.items()]
+            try:
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+            except ConnectionError:
+                writer.close()
+                if fresh:
+                    raise
+                continue  # reused socket could not be written; nothing was delivered, retry once
+            try:
+                # the request is out: a failure from here on is never replayed (no duplicate webhook)
+                status, resp_headers, data = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                raise
+            if resp_headers.get('connection', '').lower() == 'close':
+                writer.close()
+            else:
+                self.conns[key] = conn
+            return status, resp_headers, data
+        raise ConnectionError('no connection')
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            k, _, v = line.decode('latin-1').partition(':')
+            headers[k.strip().lower()] = v.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readuntil(b'\r\n')
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            return status, headers, b''.join(chunks)
+        if 'content-length' in headers:
+            return status, headers, await reader.readexactly(int(headers['content-length']))
+        headers['connection'] = 'close'
+        return status, headers, await reader.read()
+
+    def close(self):
+        for _, writer in self.conns.values():
+            writer.close()
+        self.conns.clear()
+
+
+async def run_load(events, exec_url, practice_id, token, proxy_token, rate, concurrency, dup_rate, dup_burst,
+                   speed, timeout, seed=None, record=None):
+    """Paces `events` onto `concurrency` workers; returns LoadStats."""
+    stats = LoadStats()
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    rng = random.Random(seed)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    if proxy_token:
+        headers['X-RB-Proxy-Token'] = proxy_token
+
+    async def worker():
+        client = AsyncHttp(timeout)
+        try:
+            while True:
+                ev = await queue.get()
+                if ev is None:
+                    return
+                qs = parse.urlencode({'route': ev.route, 'practice_id': practice_id, 'token': token})
+                url = f"{exec_url}{'&' if '?' in exec_url else '?'}{qs}"
+                body = parse.urlencode(ev.payload).encode('utf-8')
+                start = time.perf_counter()
+                try:
+                    status, text = await client.request('POST', url, body, headers)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                    stats.fail(ev.route, e)
+                    continue
+                stats.record(ev.route, (time.perf_counter() - start) * 1000.0, status, text)
+        finally:
+            client.close()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    for i, ev in enumerate(events):
+        if speed and ev.at is not None:
+            due = t0 + ev.at / speed
+        else:
+            due = t0 + (i / rate if rate else 0)
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        copies = 1
+        if dup_rate and rng.random() < dup_rate:
+            copies = max(2, dup_burst)
+            stats.duplicates += copies - 1
+        for _ in range(copies):
+            await queue.put(ev)
+        if record is not None:
+            record.write(json.dumps({'kind': ev.kind, 'route': ev.route, 'payload': ev.payload,
+                                     'at': round(loop.time() - t0, 4)}) + '\n')
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    stats.finished = time.perf_counter()
+    return stats
+
+
+def _generated(factory, count, duration):
+    deadline = time.monotonic() + duration if duration else None
+    n = 0
+    while (not count or n < count) and (deadline is None or time.monotonic() < deadline):
+        yield factory.next()
+        n += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--exec', help='Apps Script exec URL (or use EXEC_URL env var)')
+    parser.add_argument('--load', action='store_true', help='Generate Twilio callbacks at --rate instead of the samples')
+    parser.add_argument('--replay', metavar='FILE', help='Replay a --record JSONL run or a 70_EventLog CSV export')
+    parser.add_argument('--record', metavar='FILE', help='Write every event sent (before duplicates) as JSONL')
+    parser.add_argument('--count', type=int, default=1000, help='Events to generate with --load (0 = until --duration)')
+    parser.add_argument('--duration', type=float, default=0, help='Stop generating after N seconds')
+    parser.add_argument('--rate', type=float, default=20.0, help='Events per second (0 = as fast as possible)')
+    parser.add_argument('--concurrency', type=int, default=10, help='Requests in flight')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Event weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--dup-rate', type=float, default=0.05, help='Fraction of events sent as a duplicate burst')
+    parser.add_argument('--dup-burst', type=int, default=3, help='Copies per duplicate burst')
+    parser.add_argument('--phones', type=int, default=200, help='Distinct phones / message SIDs generated')
+    parser.add_argument('--fixtures', metavar='URL_OR_FILE',
+                        help='Use these SIDs/phones with --load (JSON file or webhook_standin.py /__fixtures URL)')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='Replay at recorded spacing divided by this factor (0 = pace with --rate)')
+    parser.add_argument('--practice-id', default=os.getenv('RB_PRACTICE_ID', 'test_practice'))
+    parser.add_argument('--token', default=os.getenv('RB_WEBHOOK_TOKEN', ''), help='RB_WEBHOOK_TOKEN (query string)')
+    parser.add_argument('--proxy-token', default=os.getenv('RB_PROXY_TOKEN', ''), help='RB_PROXY_TOKEN header')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json-out', metavar='FILE', help='Also write the load summary as JSON')
+    args = parser.parse_args()
+
+    exec_url = args.exec or os.getenv('EXEC_URL') or os.getenv('APPS_SCRIPT_EXEC_URL')
+    if not exec_url:
+        print('Provide --exec or set EXEC_URL / APPS_SCRIPT_EXEC_URL')
+        sys.exit(2)
+
+    if not args.load and not args.replay:
+        run_samples(exec_url)
+        return
+
+    if args.replay:
+        events = load_replay(args.replay)
+        print(f'Replaying {len(events)} events from {args.replay}')
+    else:
+        try:
+            factory = EventFactory(parse_mix(args.mix), phones=args.phones, seed=args.seed)
+            if args.fixtures:
+                factory.use_fixtures(load_fixtures(args.fixtures, args.practice_id))
+        except (ValueError, OSError) as e:
+            print(f'ERROR: {e}')
+            sys.exit(2)
+        events = _generated(factory, args.count, args.duration)
+        print(f'Generating load: rate={args.rate}/s concurrency={args.concurrency} mix={args.mix} '
+              f'dup_rate={args.dup_rate} x{args.dup_burst}')
+
+    record = open(args.record, 'w', encoding='utf-8') if args.record else None
+    try:
+        stats = asyncio.run(run_load(
+            events, exec_url, args.practice_id, args.token, args.proxy_token, args.rate, args.concurrency,
+            args.dup_rate, args.dup_burst, args.speed, args.timeout, seed=args.seed, record=record))
+    finally:
+        if record is not None:
+            record.close()
+    summary = stats.report()
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    sys.exit(1 if summary['http_error_rate'] or summary['exception_rate'] else 0)
+
+
 if __name__ == '__main__':
     main()